@@ -16,6 +16,8 @@ from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
 
+import json_loader
+
 
 @dataclass
 class Entry:
@@ -127,7 +129,7 @@ def main() -> None:
 
 def load_export(input_path: Path | None) -> tuple[dict, str]:
     if input_path is not None:
-        return json.loads(input_path.read_text()), str(input_path)
+        return json_loader.load_path(input_path), str(input_path)
 
     if sys.stdin.isatty():
         raise SystemExit('No input path provided and stdin is empty. Pipe JSON in, e.g. `pbpaste | ...`')
@@ -136,7 +138,7 @@ def load_export(input_path: Path | None) -> tuple[dict, str]:
     if not raw:
         raise SystemExit('No JSON content received on stdin')
 
-    return json.loads(raw), 'stdin'
+    return json_loader.loads(raw), 'stdin'
 
 
 def resolve_output_path(output: Path | None, input_path: Path | None, export: dict) -> Path:
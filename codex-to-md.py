@@ -15,6 +15,8 @@ from dataclasses import dataclass, field
 from datetime import datetime
 from pathlib import Path
 
+import json_loader
+
 
 @dataclass
 class Message:
@@ -197,7 +199,7 @@ def session_meta_id_matches(path: Path, session_id: str) -> bool:
             if not line.strip():
                 continue
             try:
-                item = json.loads(line)
+                item = json_loader.loads(line)
             except json.JSONDecodeError:
                 return False
             if item.get('type') != 'session_meta':
@@ -218,7 +220,7 @@ def parse_jsonl(lines: list[str], source_label: str, source_path: Path | None) -
         if not line.strip():
             continue
         try:
-            item = json.loads(line)
+            item = json_loader.loads(line)
         except json.JSONDecodeError:
             continue
 
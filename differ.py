@@ -10,6 +10,8 @@ from tempfile import NamedTemporaryFile
 from contextlib import contextmanager, nullcontext
 from argparse import ArgumentParser
 
+from repl_engine import apply_repls
+
 
 #################################################
 # Arguments
@@ -38,11 +40,6 @@ def tmpfile(suffix=None):
     finally:
         file.unlink()
 
-def apply_repls(text, repls):
-    for r in repls:
-        text = re.sub(r[1], r[2], text) if r[0] else text.replace(r[1], r[2])
-    return text
-
 
 #################################################
 # Dependencies
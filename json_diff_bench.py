@@ -0,0 +1,369 @@
+#!/usr/bin/env python
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import platform
+import random
+import subprocess
+import sys
+import time
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from json_diff_html import (  # noqa: E402
+    ARRAY_ALGORITHMS,
+    DEFAULT_MATCH_KEYS,
+    DiffBuilder,
+    HtmlRenderer,
+    align_sequences,
+    count_changes,
+    peak_rss_bytes,
+)
+
+ARRAY_SHAPES: dict[str, Callable[[random.Random, int], tuple[list[int], list[int]]]] = {}
+DOCUMENT_SHAPES: dict[str, Callable[[random.Random, int], tuple[Any, Any]]] = {}
+WORDS = ('alpha', 'beta', 'gamma', 'delta', 'epsilon', 'zeta', 'theta', 'kappa', 'lambda', 'sigma')
+PHASES = ('build', 'count', 'render')
+
+
+def array_shape(name: str):
+    def register(func):
+        ARRAY_SHAPES[name] = func
+        return func
+    return register
+
+
+def distinct_tokens(rng: random.Random, size: int) -> list[int]:
+    return rng.sample(range(size * 10), size)
+
+
+@array_shape('few-edits')
+def few_edits(rng: random.Random, size: int) -> tuple[list[int], list[int]]:
+    old = distinct_tokens(rng, size)
+    new = list(old)
+    for _ in range(max(1, size // 1000)):
+        index = rng.randrange(len(new))
+        if rng.random() < 0.5:
+            del new[index]
+        else:
+            new.insert(index, -index)
+    return old, new
+
+
+@array_shape('many-edits')
+def many_edits(rng: random.Random, size: int) -> tuple[list[int], list[int]]:
+    old = distinct_tokens(rng, size)
+    new = [-item if rng.random() < 0.1 else item for item in old]
+    return old, new
+
+
+@array_shape('block-move')
+def block_move(rng: random.Random, size: int) -> tuple[list[int], list[int]]:
+    old = distinct_tokens(rng, size)
+    start = rng.randrange(size // 2)
+    block = old[start:start + size // 10]
+    rest = old[:start] + old[start + size // 10:]
+    target = rng.randrange(len(rest))
+    return old, rest[:target] + block + rest[target:]
+
+
+@array_shape('repetitive')
+def repetitive(rng: random.Random, size: int) -> tuple[list[int], list[int]]:
+    old = [rng.randrange(8) for _ in range(size)]
+    new = list(old)
+    for _ in range(max(1, size // 100)):
+        new[rng.randrange(size)] = rng.randrange(8)
+    return old, new
+
+
+@array_shape('front-insert')
+def front_insert(rng: random.Random, size: int) -> tuple[list[int], list[int]]:
+    old = distinct_tokens(rng, size)
+    return old, [-1, *old]
+
+
+def document_shape(name: str):
+    def register(func):
+        DOCUMENT_SHAPES[name] = func
+        return func
+    return register
+
+
+def sentence(rng: random.Random, words: int) -> str:
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def edit_scalar(rng: random.Random, value: Any) -> Any:
+    if isinstance(value, str):
+        return value + ' ' + rng.choice(WORDS)
+    if isinstance(value, bool):
+        return not value
+    if isinstance(value, (int, float)):
+        return value + 1
+    return rng.choice(WORDS)
+
+
+def record(rng: random.Random, index: int) -> dict[str, Any]:
+    return {
+        'id': index,
+        'name': sentence(rng, 3),
+        'price': round(rng.uniform(1, 500), 2),
+        'active': rng.random() < 0.8,
+        'tags': rng.sample(WORDS, 3),
+        'meta': {'created': f'2024-01-{rng.randrange(1, 29):02d}', 'rank': rng.randrange(100)},
+    }
+
+
+# Each document shape returns (old, new) with roughly `size` leaf values and ~1% of them edited.
+@document_shape('wide-dict')
+def wide_dict(rng: random.Random, size: int) -> tuple[Any, Any]:
+    old = {f'key_{index:07d}': rng.choice((sentence(rng, 4), rng.randrange(10**6), rng.random() < 0.5)) for index in range(size)}
+    new = dict(old)
+    for key in rng.sample(sorted(old), max(1, size // 100)):
+        new[key] = edit_scalar(rng, new[key])
+    for index in range(size, size + max(1, size // 200)):
+        new[f'key_{index:07d}'] = sentence(rng, 2)
+    return old, new
+
+
+@document_shape('deep-nesting')
+def deep_nesting(rng: random.Random, size: int) -> tuple[Any, Any]:
+    # A 4-way tree of dicts deep enough to hold `size` leaves.
+    depth = 1
+    while 4 ** depth < size:
+        depth += 1
+
+    def tree(level: int) -> Any:
+        if level == depth:
+            return rng.randrange(1000)
+        return {f'n{branch}': tree(level + 1) for branch in range(4)}
+
+    old = tree(0)
+    new = json.loads(json.dumps(old))
+    for _ in range(max(1, size // 100)):
+        node = new
+        for _ in range(depth - 1):
+            node = node[f'n{rng.randrange(4)}']
+        leaf = f'n{rng.randrange(4)}'
+        node[leaf] = edit_scalar(rng, node[leaf])
+    return old, new
+
+
+@document_shape('keyed-array')
+def keyed_array(rng: random.Random, size: int) -> tuple[Any, Any]:
+    old = [record(rng, index) for index in range(max(1, size // 10))]
+    new = json.loads(json.dumps(old))
+    for item in rng.sample(new, max(1, len(new) // 100)):
+        item['price'] = edit_scalar(rng, item['price'])
+    for index in sorted(rng.sample(range(len(new)), max(1, len(new) // 200)), reverse=True):
+        del new[index]
+    for offset in range(max(1, len(new) // 200)):
+        new.insert(rng.randrange(len(new) + 1), record(rng, len(old) + offset))
+    moved = new.pop(rng.randrange(len(new)))
+    new.insert(rng.randrange(len(new) + 1), moved)
+    return {'items': old}, {'items': new}
+
+
+@document_shape('unkeyed-array')
+def unkeyed_array(rng: random.Random, size: int) -> tuple[Any, Any]:
+    # Scalars and small objects without a unique column, so alignment stays positional.
+    def item() -> Any:
+        if rng.random() < 0.5:
+            return rng.randrange(1000)
+        return {'color': rng.choice(WORDS), 'size': rng.randrange(5)}
+
+    old = [item() for _ in range(size // 2)]
+    new = list(old)
+    for _ in range(max(1, len(new) // 100)):
+        index = rng.randrange(len(new))
+        roll = rng.random()
+        if roll < 0.4:
+            new[index] = item()
+        elif roll < 0.7:
+            del new[index]
+        else:
+            new.insert(index, item())
+    return {'rows': old}, {'rows': new}
+
+
+@document_shape('html-strings')
+def html_strings(rng: random.Random, size: int) -> tuple[Any, Any]:
+    # A translation catalog: long HTML paragraphs, many of them repeated verbatim.
+    paragraphs = [
+        ''.join(f'<p>{sentence(rng, 40)} <b>{rng.choice(WORDS)}</b> {sentence(rng, 20)}</p>' for _ in range(3))
+        for _ in range(50)
+    ]
+    old = {f'msg_{index:06d}': rng.choice(paragraphs) for index in range(max(1, size // 100))}
+    new = dict(old)
+    for key in rng.sample(sorted(old), max(1, len(old) // 20)):
+        new[key] = new[key].replace(' ', f' {rng.choice(WORDS)} ', 1)
+    return old, new
+
+
+def run_document_case(shape: str, size: int, seed: int, array_algorithm: str) -> dict[str, Any]:
+    old, new = DOCUMENT_SHAPES[shape](random.Random(seed), size)
+    timings: dict[str, float] = {}
+
+    started = time.perf_counter()
+    builder = DiffBuilder(
+        ignore_keys=set(),
+        ignore_paths=(),
+        match_keys=DEFAULT_MATCH_KEYS,
+        array_algorithm=array_algorithm,
+    )
+    root = builder.build(old, new)
+    timings['build'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    counts = count_changes(root)
+    timings['count'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    renderer = HtmlRenderer(
+        title=shape,
+        old_name='old.json',
+        new_name='new.json',
+        counts=counts,
+        strip_html_tags=shape == 'html-strings',
+        rtl=False,
+    )
+    document = renderer.render_document(root)
+    timings['render'] = time.perf_counter() - started
+
+    return {
+        'shape': shape,
+        'size': size,
+        'seconds': timings,
+        'changes': counts.total,
+        'html_bytes': len(document.encode('utf-8')),
+        'peak_rss_bytes': peak_rss_bytes(),
+    }
+
+
+def git_revision() -> str | None:
+    try:
+        result = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=Path(__file__).resolve().parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+def bench_documents(args: argparse.Namespace) -> None:
+    baseline = {}
+    if args.compare:
+        previous = json.loads(Path(args.compare).read_text())
+        baseline = {(case['shape'], case['size']): case for case in previous['results']}
+
+    # Every case runs in a freshly spawned interpreter, so its peak RSS is its own.
+    context = multiprocessing.get_context('spawn')
+    header = f'{"shape":<16}{"size":>10}' + ''.join(f'{phase:>10}' for phase in PHASES) + f'{"changes":>10}{"peak RSS":>11}'
+    if baseline:
+        header += f'{"vs base":>9}'
+    print(header)
+    print('-' * len(header))
+
+    results = []
+    for shape in args.shapes:
+        for size in args.sizes:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                case = pool.submit(run_document_case, shape, size, args.seed, args.array_algorithm).result()
+            results.append(case)
+            seconds = case['seconds']
+            line = (
+                f'{shape:<16}{size:>10,}'
+                + ''.join(f'{seconds[phase]:>9.3f}s' for phase in PHASES)
+                + f'{case["changes"]:>10,}{case["peak_rss_bytes"] / 2**20:>8.0f} MB'
+            )
+            previous_case = baseline.get((shape, size))
+            if previous_case:
+                before = sum(previous_case['seconds'].values())
+                line += f'{sum(seconds.values()) / before:>8.2f}x' if before else f'{"":>9}'
+            print(line)
+
+    if args.output:
+        report = {
+            'revision': git_revision(),
+            'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'array_algorithm': args.array_algorithm,
+            'results': results,
+        }
+        Path(args.output).write_text(json.dumps(report, indent=2) + '\n')
+        print(args.output)
+
+
+def bench_arrays(args: argparse.Namespace) -> None:
+    algorithms = list(ARRAY_ALGORITHMS)
+    # Each cell is wall time plus the number of elements reported as changed (lower is a tighter diff).
+    header = f'{"shape":<14}{"items":>10}' + ''.join(f'{name:>20}' for name in algorithms)
+    print(header)
+    print('-' * len(header))
+    for shape in args.shapes:
+        for size in args.sizes:
+            old, new = ARRAY_SHAPES[shape](random.Random(args.seed), size)
+            cells = []
+            for algorithm in algorithms:
+                if algorithm == 'difflib' and size > args.difflib_max:
+                    cells.append(f'{"skipped":>20}')
+                    continue
+                started = time.perf_counter()
+                opcodes = align_sequences(old, new, algorithm)
+                elapsed = time.perf_counter() - started
+                changed = sum(i2 - i1 + j2 - j1 for tag, i1, i2, j1, j2 in opcodes if tag != 'equal')
+                cells.append(f'{elapsed:.3f}s ({changed:,})'.rjust(20))
+            print(f'{shape:<14}{size:>10,}' + ''.join(cells))
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Benchmarks for json_diff_html.py.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    arrays = commands.add_parser('arrays', help='Time each --array-algorithm on synthetic token arrays.')
+    arrays.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    arrays.add_argument('--shapes', nargs='+', choices=sorted(ARRAY_SHAPES), default=list(ARRAY_SHAPES))
+    arrays.add_argument('--seed', type=int, default=0)
+    arrays.add_argument(
+        '--difflib-max',
+        type=int,
+        default=20_000,
+        help='Skip difflib above this many items; it is quadratic on some shapes.',
+    )
+    arrays.set_defaults(func=bench_arrays)
+
+    documents = commands.add_parser(
+        'documents',
+        help='Time build, count_changes and render_document on synthetic documents.',
+    )
+    documents.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000], help='Approximate leaf values per document.')
+    documents.add_argument('--shapes', nargs='+', choices=sorted(DOCUMENT_SHAPES), default=list(DOCUMENT_SHAPES))
+    documents.add_argument('--seed', type=int, default=0)
+    documents.add_argument('--array-algorithm', choices=ARRAY_ALGORITHMS, default='auto')
+    documents.add_argument('-o', '--output', help='Save the results as JSON, e.g. bench-$(git rev-parse --short HEAD).json.')
+    documents.add_argument('--compare', help='Results JSON from an earlier run; adds a total-time ratio column.')
+    documents.set_defaults(func=bench_documents)
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    args.func(args)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
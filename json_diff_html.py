@@ -2,21 +2,122 @@
 from __future__ import annotations
 
 import argparse
+import base64
+import bisect
+import codecs
+import cProfile
 import difflib
+import gzip
+import hashlib
+import heapq
 import html
 import json
+import math
+import mmap
+import multiprocessing
+import os
 import re
+import sqlite3
 import sys
+import tempfile
+import time
 import webbrowser
-from dataclasses import dataclass, field
-from itertools import count
+import zlib
+from array import array
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from collections.abc import Callable, Hashable, Iterable, Iterator, Mapping, Sequence
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache, partial, update_wrapper
+from itertools import count, islice
 from pathlib import Path
 from typing import Any
+from urllib.parse import quote
+
+import json_loader
 
 DEFAULT_MATCH_KEYS = ('id', '_id', 'slug', 'key')
+# Objects sampled from each side when inferring a match key for arrays none of the above fit.
+MATCH_KEY_SAMPLE = 64
 SIMPLE_KEY_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_-]*$')
 TOKEN_RE = re.compile(r'\s+|\w+|[^\w\s]+', re.UNICODE)
+# Catalog-style documents repeat the same strings many times; word diffs are memoised per (old, new),
+# keeping at most this many characters of arguments and results per cache.
+STRING_DIFF_CACHE_CHARS = 1 << 24
+# Word-level SequenceMatcher is quadratic on long strings; above this many tokens, diff by line.
+STRING_DIFF_MAX_TOKENS = 20_000
 TAG_RE = re.compile(r'<[^>]+>')
+GROUP_CLOSE_HTML = '</dl></div></dd>'
+LAZY_GROUP_CLOSE_HTML = '</dl><button type="button" class="load-more" hidden>Load more</button></div></dd>'
+PATH_SEGMENT_RE = re.compile(
+    r'\.\*\*|\.\*|\[\*\]'
+    r'|\.(?P<name>[A-Za-z_][A-Za-z0-9_-]*)'
+    r'|\[(?P<index>\d+)\]'
+    r'|\[(?P<quoted>"(?:[^"\\]|\\.)*")\]'
+    r'|\[(?P<match>[^\[\]=]+)='
+)
+
+# Inputs are compared, and cached reports inflated, this many bytes at a time.
+IO_CHUNK_SIZE = 1 << 20
+# Bump when the SubtreeHasher digest format changes, so --cache-dir entries are not reused.
+DIGEST_VERSION = 1
+
+# --watch polls the input files this often, and waits until they have been still this long.
+WATCH_INTERVAL = 0.5
+WATCH_DEBOUNCE = 0.3
+
+# Spans larger than this are walked member by member in --stream mode; smaller ones are parsed whole.
+STREAM_THRESHOLD = 1 << 20
+SPAN_STRING = rb'"[^"\\]*(?:\\.[^"\\]*)*"'
+SPAN_STRING_RE = re.compile(SPAN_STRING, re.DOTALL)
+SPAN_SCALAR_RE = re.compile(rb'[^\s,:\[\]{}"]+')
+SPAN_BRACKET_RE = re.compile(SPAN_STRING + rb'|[\[\]{}]', re.DOTALL)
+SPAN_WS_RE = re.compile(rb'[ \t\r\n]*')
+CONTAINER_TYPES = (dict, list)
+# Stands in for a key or array item that one side of a three-way merge does not have.
+ABSENT = object()
+
+ARRAY_ALGORITHMS = ('auto', 'difflib', 'myers', 'patience', 'histogram')
+# With --array-algorithm auto, arrays longer than this (both sides combined), or with
+# more equal-token pairs than this, skip SequenceMatcher, whose worst case is quadratic,
+# and use patience diff instead.
+AUTO_DIFFLIB_MAX_ITEMS = 20_000
+AUTO_DIFFLIB_MAX_PAIRS = 200_000
+HISTOGRAM_MAX_OCCURRENCES = 64
+MYERS_MIN_COST = 256
+
+OUTPUT_SUFFIXES = {
+    'html': '.diff.html',
+    'jsonpatch': '.patch.json',
+    'ndjson': '.diff.ndjson',
+    'summary': '.summary.json',
+}
+
+BATCH_STATUSES = ('changed', 'identical', 'added', 'deleted', 'error')
+BATCH_STATUS_LABELS = {
+    'changed': 'changed',
+    'identical': 'identical',
+    'added': 'only in new',
+    'deleted': 'only in old',
+    'error': 'failed',
+}
+
+# --stats lists this many of the largest arrays that were aligned.
+STATS_LARGEST_ARRAYS = 10
+
+LAZY_MODES = ('embed', 'sidecar')
+# With --lazy, nested groups with more changes than this are collapsed and loaded on demand
+# too, and a group's children are paged into chunks of roughly this many entries.
+LAZY_INLINE_MAX = 100
+LAZY_PAGE_ENTRIES = 500
+
+# With --jobs, an object or keyed array is split across worker processes once it has
+# at least this many children left to diff after the digest check.
+PARALLEL_MIN_CHILDREN = 32
+# Set in the parent just before a --jobs pool forks, so workers inherit the task (and the
+# hash index it closes over) without pickling. It also keeps workers from nesting pools.
+_parallel_task: Callable[[int], DiffNode | None] | None = None
 
 
 @dataclass
@@ -38,13 +139,68 @@ class Counts:
 
 
 @dataclass
+class DiffStats:
+    # --stats: wall time per phase of a run, plus what DiffBuilder saw of the arrays it aligned.
+    # Arrays handled in --jobs worker processes are not counted.
+    phases: dict[str, float] = field(default_factory=dict)
+    match_key_seconds: float = 0.0
+    alignment_seconds: float = 0.0
+    arrays: int = 0
+    shortcut: str | None = None
+    _largest: list[tuple[int, int, int, int, str, 'DiffNode | None']] = field(default_factory=list, repr=False)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - started
+
+    def note_array(self, old_size: int, new_size: int, aligned_by: str, node: 'DiffNode | None') -> None:
+        self.arrays += 1
+        entry = (old_size + new_size, self.arrays, old_size, new_size, aligned_by, node)
+        if len(self._largest) < STATS_LARGEST_ARRAYS:
+            heapq.heappush(self._largest, entry)
+        else:
+            heapq.heappushpop(self._largest, entry)
+
+    def report(self, root: 'DiffNode | None') -> dict[str, Any]:
+        largest = sorted(self._largest, reverse=True)
+        return {
+            'phases': {**self.phases, 'total': sum(self.phases.values())},
+            'shortcut': self.shortcut,
+            'arrays': {
+                'aligned': self.arrays,
+                'match_key_seconds': self.match_key_seconds,
+                'alignment_seconds': self.alignment_seconds,
+                'largest': [
+                    {
+                        'path': node.path if node is not None else None,
+                        'old_items': old_size,
+                        'new_items': new_size,
+                        'aligned_by': aligned_by,
+                    }
+                    for _, _, old_size, new_size, aligned_by, node in largest
+                ],
+            },
+            'nodes': dict(count_node_kinds(root)),
+            'string_diff_cache': string_diff_cache_stats(),
+            'peak_rss_bytes': peak_rss_bytes(),
+        }
+
+
+@dataclass(slots=True, eq=False)
 class DiffNode:
-    label: str
-    path: str
+    # Nodes only keep the step from their parent: a key (str), a position (int), or None for
+    # the root and for items of keyed arrays, which are addressed by match_key/match_value.
+    # Labels and JSONPath strings are rendered on demand from the parent chain.
     kind: str
+    step: str | int | None = None
     old: Any = None
     new: Any = None
-    children: list['DiffNode'] = field(default_factory=list)
+    children: Sequence['DiffNode'] = ()
+    parent: 'DiffNode | None' = None
     is_array: bool = False
     match_key: str | None = None
     match_value: Any = None
@@ -53,117 +209,828 @@ class DiffNode:
     moved: bool = False
     type_changed: bool = False
 
+    def __post_init__(self) -> None:
+        for child in self.children:
+            child.parent = self
+
+    @property
+    def label(self) -> str:
+        if self.parent is None:
+            return '$'
+        if isinstance(self.step, str):
+            return self.step
+        if isinstance(self.step, int):
+            return str(self.step + 1)
+        return str((self.old_index if self.new_index is None else self.new_index) + 1)
+
+    @property
+    def path(self) -> str:
+        chain = []
+        node = self
+        while node.parent is not None:
+            chain.append(node)
+            node = node.parent
+        path = '$'
+        for node in reversed(chain):
+            if isinstance(node.step, str):
+                path = add_key(path, node.step)
+            elif isinstance(node.step, int):
+                path = add_index(path, node.step)
+            else:
+                path = add_match(path, node.match_key, node.match_value)
+        return path
+
+
+class JsonSpanReader:
+    # Iterparse-style access to a memory-mapped JSON file: values are located by byte
+    # offsets and only parsed (json.loads on the slice) when something needs them.
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        try:
+            with path.open('rb') as fh:
+                self.data = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError as exc:
+            raise SystemExit(f'File not found: {path}') from exc
+        except ValueError as exc:
+            raise SystemExit(f'Invalid JSON in {path}: Expecting value (line 1, column 1)') from exc
+        start = SPAN_WS_RE.match(self.data, 0).end()
+        end = len(self.data)
+        while end > start and self.data[end - 1] in b' \t\r\n':
+            end -= 1
+        if start < end and self.data[start] in b'[{':
+            # The root container runs to the end of the file; no need to scan for it.
+            if self.data[end - 1] != (0x5D if self.data[start] == 0x5B else 0x7D):
+                self.fail('Unterminated container starting at', start)
+        else:
+            end = self.value_end(start)
+        self.root = JsonSpan(self, start, end)
+
+    def value_end(self, start: int) -> int:
+        data = self.data
+        if start >= len(data):
+            self.fail('Expecting value', start)
+        first = data[start]
+        if first == 0x22:
+            match = SPAN_STRING_RE.match(data, start)
+            if match is None:
+                self.fail('Unterminated string starting at', start)
+            return match.end()
+        if first not in b'[{':
+            match = SPAN_SCALAR_RE.match(data, start)
+            if match is None:
+                self.fail('Expecting value', start)
+            return match.end()
+
+        depth = 0
+        for match in SPAN_BRACKET_RE.finditer(data, start):
+            token = data[match.start()]
+            if token in b'[{':
+                depth += 1
+            elif token in b']}':
+                depth -= 1
+                if depth == 0:
+                    return match.end()
+        self.fail('Unterminated container starting at', start)
+
+    def children(self, span: JsonSpan) -> Iterator[tuple[str | None, JsonSpan]]:
+        data = self.data
+        is_object = data[span.start] == 0x7B
+        key: str | None = None
+        pos = SPAN_WS_RE.match(data, span.start + 1).end()
+        if data[pos] in b']}':
+            return
+        while True:
+            if is_object:
+                match = SPAN_STRING_RE.match(data, pos)
+                if match is None:
+                    self.fail('Expecting property name enclosed in double quotes', pos)
+                key = json.loads(match.group())
+                pos = SPAN_WS_RE.match(data, match.end()).end()
+                if data[pos] != 0x3A:
+                    self.fail("Expecting ':' delimiter", pos)
+                pos = SPAN_WS_RE.match(data, pos + 1).end()
+            end = self.value_end(pos)
+            yield key, JsonSpan(self, pos, end)
+            pos = SPAN_WS_RE.match(data, end).end()
+            if pos >= span.end or data[pos] in b']}':
+                return
+            if data[pos] != 0x2C:
+                self.fail("Expecting ',' delimiter", pos)
+            pos = SPAN_WS_RE.match(data, pos + 1).end()
+
+    def validate(self) -> None:
+        # Parse the whole file one top-level item at a time, raising SystemExit if it is not JSON.
+        if self.data[self.root.start] in b'[{':
+            for _, child in self.children(self.root):
+                self.load(child)
+        else:
+            self.load(self.root)
+
+    def load(self, span: JsonSpan) -> Any:
+        try:
+            return json_loader.loads(self.data[span.start:span.end])
+        except json.JSONDecodeError as exc:
+            self.fail(exc.msg, span.start + exc.pos)
+
+    def fail(self, message: str, offset: int) -> None:
+        line = column = 1
+        step = 1 << 20
+        for chunk_start in range(0, offset, step):
+            chunk = self.data[chunk_start:min(chunk_start + step, offset)]
+            newlines = chunk.count(b'\n')
+            if newlines:
+                line += newlines
+                column = len(chunk) - chunk.rfind(b'\n')
+            else:
+                column += len(chunk)
+        raise SystemExit(f'Invalid JSON in {self.path}: {message} (line {line}, column {column})')
+
+
+@dataclass(frozen=True)
+class JsonSpan:
+    reader: JsonSpanReader
+    start: int
+    end: int
+
+    @property
+    def size(self) -> int:
+        return self.end - self.start
+
+    @property
+    def kind(self) -> str:
+        first = self.reader.data[self.start]
+        if first == 0x7B:
+            return 'object'
+        if first == 0x5B:
+            return 'array'
+        return 'scalar'
+
+    def load(self) -> Any:
+        return self.reader.load(self)
+
+    def members(self) -> dict[str, JsonSpan]:
+        return {key: child for key, child in self.reader.children(self)}
+
+    def elements(self) -> SpanList:
+        starts = array('q')
+        ends = array('q')
+        for _, child in self.reader.children(self):
+            starts.append(child.start)
+            ends.append(child.end)
+        return SpanList(self.reader, starts, ends)
+
+    def same_bytes(self, other: JsonSpan) -> bool:
+        if self.size != other.size:
+            return False
+        step = 1 << 20
+        for offset in range(0, self.size, step):
+            end = min(offset + step, self.size)
+            left = self.reader.data[self.start + offset:self.start + end]
+            right = other.reader.data[other.start + offset:other.start + end]
+            if left != right:
+                return False
+        return True
+
+
+class SpanList(Sequence):
+    # The elements of a streamed array. Only offsets are kept; items are parsed on access.
+    def __init__(self, reader: JsonSpanReader, starts: array, ends: array) -> None:
+        self.reader = reader
+        self.starts = starts
+        self.ends = ends
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __getitem__(self, index: int) -> Any:
+        return self.reader.load(JsonSpan(self.reader, self.starts[index], self.ends[index]))
+
+    def __iter__(self) -> Iterator[Any]:
+        for index in range(len(self.starts)):
+            yield self[index]
+
+
+@dataclass(eq=False)
+class PathPatternNode:
+    literals: dict[Hashable, 'PathPatternNode'] = field(default_factory=dict)
+    any_key: 'PathPatternNode | None' = None
+    any_item: 'PathPatternNode | None' = None
+    any_depth: 'PathPatternNode | None' = None
+    loops: bool = False
+    terminal: bool = False
+
+
+class IgnorePaths:
+    # --ignore-path patterns compiled into one trie over path segments. DiffBuilder walks it
+    # as a lazily built DFA: an IgnoreState is the set of trie nodes the path so far can be
+    # at, and each state memoises its transitions, so descending costs a dict lookup.
+    def __init__(self, patterns: Iterable[str]) -> None:
+        self.patterns = tuple(patterns)
+        self._trie = PathPatternNode()
+        self._states: dict[frozenset[PathPatternNode], IgnoreState] = {}
+        for pattern in self.patterns:
+            node = self._trie
+            for kind, value in parse_path_pattern(pattern):
+                if kind == '*':
+                    node.any_key = node = node.any_key or PathPatternNode()
+                elif kind == '[*]':
+                    node.any_item = node = node.any_item or PathPatternNode()
+                elif kind == '**':
+                    node.any_depth = node = node.any_depth or PathPatternNode(loops=True)
+                else:
+                    node = node.literals.setdefault(value, PathPatternNode())
+            node.terminal = True
+        self.root = self.state({self._trie}) if self.patterns else None
+
+    def state(self, nodes: set[PathPatternNode]) -> IgnoreState | None:
+        pending = list(nodes)
+        while pending:
+            depth = pending.pop().any_depth
+            if depth is not None and depth not in nodes:
+                nodes.add(depth)
+                pending.append(depth)
+        if not nodes:
+            return None
+        key = frozenset(nodes)
+        state = self._states.get(key)
+        if state is None:
+            state = self._states[key] = IgnoreState(self, key)
+        return state
+
+
+class IgnoreState:
+    __slots__ = ('paths', 'nodes', 'matched', 'literals', 'match_literals', '_next')
+
+    def __init__(self, paths: IgnorePaths, nodes: frozenset[PathPatternNode]) -> None:
+        self.paths = paths
+        self.nodes = nodes
+        self.matched = any(node.terminal for node in nodes)
+        self.literals = {token for node in nodes for token in node.literals}
+        self.match_literals = any(isinstance(token, tuple) for token in self.literals)
+        self._next: dict[tuple[Hashable, bool], IgnoreState | None] = {}
+
+    def key(self, key: str) -> IgnoreState | None:
+        return self._advance(key, False)
+
+    def index(self, index: int) -> IgnoreState | None:
+        return self._advance(index, True)
+
+    def match(self, key: str, value: Any) -> IgnoreState | None:
+        # Only render the [key=value] token when some pattern spells one out here.
+        return self._advance((key, path_value(value)) if self.match_literals else None, True)
+
+    def item(self) -> IgnoreState | None:
+        # Any array item, whatever its position: only wildcards apply. Used while hashing,
+        # before arrays are aligned.
+        return self._advance(None, True)
+
+    def _advance(self, token: Hashable, is_item: bool) -> IgnoreState | None:
+        if token not in self.literals:
+            token = None
+        try:
+            return self._next[token, is_item]
+        except KeyError:
+            pass
+        nodes = set()
+        for node in self.nodes:
+            if node.loops:
+                nodes.add(node)
+            if token is not None and token in node.literals:
+                nodes.add(node.literals[token])
+            wildcard = node.any_item if is_item else node.any_key
+            if wildcard is not None:
+                nodes.add(wildcard)
+        state = self._next[token, is_item] = self.paths.state(nodes)
+        return state
+
+
+class SubtreeHasher:
+    # Merkle-style digests for every dict/list of the documents being diffed, keyed by id().
+    # Equal digests mean equal subtrees (ignoring ignore_keys), so _diff can skip them in O(1).
+    # Array items also get tokens, digests that keep 1, 1.0 and true apart, memoised on demand.
+    def __init__(self, ignore_keys: set[str]) -> None:
+        self.ignore_keys = ignore_keys
+        self._digests: dict[int, bytes] = {}
+        self._tokens: dict[int, bytes] = {}
+        self._roots: list[Any] = []
+
+    def index(self, root: Any, ignore: IgnoreState | None = None) -> bytes:
+        # Keeping the root alive keeps every indexed id() valid until clear().
+        self._roots.append(root)
+        if ignore is None:
+            return self._hash(root, self._digests)
+        return self._hash_pruned(root, self._digests, ignore)
+
+    def digest(self, value: Any) -> bytes | None:
+        return self._digests.get(id(value))
+
+    def token(self, value: Any, ignore: IgnoreState | None = None, *, memoise: bool = True) -> bytes:
+        # A compact stand-in for the canonical JSON of value, used as a SequenceMatcher element;
+        # ignore is the --ignore-path state of the array's items. Like the JSON text, and unlike
+        # digests, tokens tell 1, 1.0 and true apart.
+        if type(value) in CONTAINER_TYPES:
+            # Only containers of an indexed document are memoised: anything else (e.g. parsed
+            # from a --stream span) may free its id() for reuse once hashed.
+            tokens = self._tokens if memoise and id(value) in self._digests else {}
+            token = tokens.get(id(value))
+            if token is None:
+                self._hash_pruned(value, tokens, ignore, token_bytes)
+                token = tokens[id(value)]
+            return token
+        encoded = token_bytes(value)
+        if len(encoded) <= 32:
+            return encoded
+        return b'=' + hashlib.blake2b(encoded, digest_size=16).digest()
+
+    def key(self, value: Any) -> Hashable:
+        # Identity of a match-key value: 1, 1.0 and true stay distinct.
+        if type(value) in CONTAINER_TYPES:
+            return self.token(value, memoise=False)
+        return type(value), value
+
+    def clear(self) -> None:
+        self._digests.clear()
+        self._tokens.clear()
+        self._roots.clear()
+
+    def forget(self, root: Any) -> None:
+        # Drops one indexed document, so its id()s can be reused without stale digests.
+        stack = [root]
+        while stack:
+            value = stack.pop()
+            if type(value) in CONTAINER_TYPES and self._digests.pop(id(value), None) is not None:
+                self._tokens.pop(id(value), None)
+                stack.extend(value.values() if type(value) is dict else value)
+        self._roots = [indexed for indexed in self._roots if indexed is not root]
+
+    def _hash(self, value: Any, digests: dict[int, bytes], scalar: Callable[[Any], bytes] | None = None) -> bytes:
+        # scalar encodes the leaves: scalar_bytes for digests, token_bytes for tokens.
+        scalar = scalar or scalar_bytes
+        kind = type(value)
+        if kind in CONTAINER_TYPES and id(value) in digests:
+            # Shared with a document indexed earlier, as in a three-way merge result.
+            return b'#' + digests[id(value)]
+        if kind is dict:
+            ignore_keys = self.ignore_keys
+            parts = [b'{']
+            for key in sorted(value):
+                if key in ignore_keys:
+                    continue
+                item = value[key]
+                parts.append(scalar_bytes(key))
+                parts.append(self._hash(item, digests, scalar) if type(item) in CONTAINER_TYPES else scalar(item))
+        elif kind is list:
+            parts = [b'[']
+            parts.extend(
+                [self._hash(item, digests, scalar) if type(item) in CONTAINER_TYPES else scalar(item) for item in value]
+            )
+        else:
+            return scalar(value)
+
+        digest = hashlib.blake2b(b''.join(parts), digest_size=16).digest()
+        digests[id(value)] = digest
+        return b'#' + digest
+
+    def _hash_pruned(
+        self, value: Any, digests: dict[int, bytes], ignore: IgnoreState | None, scalar: Callable[[Any], bytes] | None = None
+    ) -> bytes:
+        # _hash under --ignore-path: subtrees the patterns ignore are left out of the digest,
+        # so documents that only differ there compare equal without being walked.
+        scalar = scalar or scalar_bytes
+        kind = type(value)
+        if kind not in CONTAINER_TYPES:
+            return scalar(value)
+        if ignore is None:
+            return self._hash(value, digests, scalar)
+
+        if kind is dict:
+            ignore_keys = self.ignore_keys
+            parts = [b'{']
+            for key in sorted(value):
+                if key in ignore_keys:
+                    continue
+                state = ignore.key(key)
+                if state and state.matched:
+                    continue
+                parts.append(scalar_bytes(key))
+                parts.append(self._hash_pruned(value[key], digests, state, scalar))
+        else:
+            state = ignore.item()
+            if state and state.matched:
+                parts = [b'[', b'~' * len(value)]
+            else:
+                parts = [b'[', *[self._hash_pruned(item, digests, state, scalar) for item in value]]
+
+        digest = hashlib.blake2b(b''.join(parts), digest_size=16).digest()
+        digests[id(value)] = digest
+        return b'#' + digest
+
 
 class DiffBuilder:
     def __init__(
         self,
         *,
         ignore_keys: set[str],
-        ignore_paths: set[str],
+        ignore_paths: Iterable[str],
         match_keys: tuple[str, ...],
+        stream_threshold: int = STREAM_THRESHOLD,
+        array_algorithm: str = 'auto',
+        jobs: int = 1,
+        infer_match_keys: bool = True,
+        stats: DiffStats | None = None,
     ) -> None:
         self.ignore_keys = ignore_keys
-        self.ignore_paths = ignore_paths
+        self.ignore_paths = IgnorePaths(ignore_paths)
         self.match_keys = match_keys
+        self.infer_match_keys = infer_match_keys
+        self.stats = stats
+        self.stream_threshold = stream_threshold
+        self.array_algorithm = array_algorithm
+        self.jobs = jobs
+        self.hasher = SubtreeHasher(ignore_keys)
+        # Canonical digests of the last two documents passed to build().
+        self.root_digests: tuple[bytes, bytes] | None = None
+
+    def digest_options(self) -> bytes:
+        # Everything besides the document itself that shapes a SubtreeHasher digest.
+        return json.dumps([DIGEST_VERSION, sorted(self.ignore_keys), sorted(self.ignore_paths.patterns)]).encode()
 
     def build(self, old: Any, new: Any) -> DiffNode | None:
-        return self._diff(old, new, label='$', path='$')
+        self.root_digests = (
+            self.hasher.index(old, self.ignore_paths.root),
+            self.hasher.index(new, self.ignore_paths.root),
+        )
+        try:
+            return self._diff(old, new, step=None, ignore=self.ignore_paths.root)
+        finally:
+            self.hasher.clear()
+
+    def build_streaming(self, old: JsonSpanReader, new: JsonSpanReader) -> DiffNode | None:
+        return self._diff(old.root, new.root, step=None, ignore=self.ignore_paths.root)
+
+    def reindex(self, previous: Any, document: Any) -> None:
+        # --watch: swap one side for a freshly parsed copy and keep the other side's digests,
+        # so diff_indexed() only descends into subtrees whose digests changed.
+        if previous is not None:
+            self.hasher.forget(previous)
+        self.hasher.index(document, self.ignore_paths.root)
+
+    def diff_indexed(self, old: Any, new: Any) -> DiffNode | None:
+        return self._diff(old, new, step=None, ignore=self.ignore_paths.root)
+
+    def merge(self, base: Any, ours: Any, theirs: Any) -> tuple[Any, list[MergeConflict], DiffNode | None]:
+        # Three-way merge over one shared digest index: the walk only descends where ours and
+        # theirs both changed a subtree, and takes the changed side whole everywhere else.
+        # Conflicts keep ours. Returns the merged document, the conflicts and the base→merged diff.
+        root_ignore = self.ignore_paths.root
+        for document in (base, ours, theirs):
+            self.hasher.index(document, root_ignore)
+        try:
+            conflicts: list[MergeConflict] = []
+            merged = self._merge(base, ours, theirs, path=lambda: '$', conflicts=conflicts)
+            # Only the containers the merge rebuilt are hashed here; the rest are shared.
+            self.hasher.index(merged, root_ignore)
+            return merged, conflicts, self._diff(base, merged, step=None, ignore=root_ignore)
+        finally:
+            self.hasher.clear()
+
+    def _merge(
+        self,
+        base: Any,
+        ours: Any,
+        theirs: Any,
+        *,
+        path: Callable[[], str],
+        conflicts: list[MergeConflict],
+    ) -> Any:
+        if self._same(ours, theirs) or self._same(base, theirs):
+            return ours
+        if self._same(base, ours):
+            return theirs
+
+        if isinstance(base, dict) and isinstance(ours, dict) and isinstance(theirs, dict):
+            return self._merge_dicts(base, ours, theirs, path=path, conflicts=conflicts)
+        if isinstance(base, list) and isinstance(ours, list) and isinstance(theirs, list):
+            match_key = find_match_key(ours, theirs, self.match_keys, self.hasher)
+            if match_key is not None and find_match_key(base, ours, (match_key,), self.hasher) is not None:
+                return self._merge_lists_by_key(base, ours, theirs, path=path, conflicts=conflicts, match_key=match_key)
+            return self._merge_lists_by_position(base, ours, theirs, path=path, conflicts=conflicts)
+
+        conflicts.append(MergeConflict(path(), base, ours, theirs))
+        return ours
+
+    def _merge_dicts(
+        self,
+        base: dict[str, Any],
+        ours: dict[str, Any],
+        theirs: dict[str, Any],
+        *,
+        path: Callable[[], str],
+        conflicts: list[MergeConflict],
+    ) -> dict[str, Any]:
+        merged: dict[str, Any] = {}
+        for key in [*ours, *(key for key in theirs if key not in ours)]:
+            value = self._merge(
+                base.get(key, ABSENT),
+                ours.get(key, ABSENT),
+                theirs.get(key, ABSENT),
+                path=lambda: add_key(path(), key),
+                conflicts=conflicts,
+            )
+            if value is not ABSENT:
+                merged[key] = value
+        return merged
+
+    def _merge_lists_by_key(
+        self,
+        base: Sequence[dict[str, Any]],
+        ours: Sequence[dict[str, Any]],
+        theirs: Sequence[dict[str, Any]],
+        *,
+        path: Callable[[], str],
+        conflicts: list[MergeConflict],
+        match_key: str,
+    ) -> list[Any]:
+        key_of = self.hasher.key
+        base_by_id, ours_by_id, theirs_by_id = (
+            {key_of(item[match_key]): item for item in items} for items in (base, ours, theirs)
+        )
+
+        def kept_base_order(side: dict[Hashable, Any]) -> bool:
+            return [item_id for item_id in side if item_id in base_by_id] == [
+                item_id for item_id in base_by_id if item_id in side
+            ]
+
+        # Items are laid out in ours' order, unless only theirs reordered them; items only the
+        # other side has go in after the item that precedes them there, in one pass: each run of
+        # them follows the last item before it that both sides have.
+        if kept_base_order(ours_by_id) and not kept_base_order(theirs_by_id):
+            laid_out, other = theirs_by_id, ours_by_id
+        else:
+            laid_out, other = ours_by_id, theirs_by_id
+        followers: dict[Hashable, list[Hashable]] = {}
+        anchor = None
+        for item_id in other:
+            if item_id in laid_out:
+                anchor = item_id
+            else:
+                followers.setdefault(anchor, []).append(item_id)
+        order = followers.get(None, [])
+        for item_id in laid_out:
+            order.append(item_id)
+            order += followers.get(item_id, ())
+
+        merged: list[Any] = []
+        for item_id in order:
+            old_item = base_by_id.get(item_id, ABSENT)
+            our_item = ours_by_id.get(item_id, ABSENT)
+            their_item = theirs_by_id.get(item_id, ABSENT)
+            raw_id = next(item for item in (our_item, their_item, old_item) if item is not ABSENT)[match_key]
+            value = self._merge(
+                old_item,
+                our_item,
+                their_item,
+                path=lambda: add_match(path(), match_key, raw_id),
+                conflicts=conflicts,
+            )
+            if value is not ABSENT:
+                merged.append(value)
+        return merged
 
-    def _diff(self, old: Any, new: Any, *, label: str, path: str) -> DiffNode | None:
-        if path in self.ignore_paths:
+    def _merge_lists_by_position(
+        self,
+        base: Sequence[Any],
+        ours: Sequence[Any],
+        theirs: Sequence[Any],
+        *,
+        path: Callable[[], str],
+        conflicts: list[MergeConflict],
+    ) -> list[Any]:
+        # diff3: items base shares with both sides split the arrays into stable runs, and
+        # the chunks between them are resolved as a whole.
+        base_tokens = self._tokens(base)
+        ours_tokens = self._tokens(ours)
+        theirs_tokens = self._tokens(theirs)
+        ours_at = equal_positions(base_tokens, ours_tokens, self.array_algorithm)
+        theirs_at = equal_positions(base_tokens, theirs_tokens, self.array_algorithm)
+        stable = [(index, ours_at[index], theirs_at[index]) for index in ours_at if index in theirs_at]
+
+        merged: list[Any] = []
+        b = o = t = 0
+        for next_b, next_o, next_t in [*stable, (len(base), len(ours), len(theirs))]:
+            start = len(merged)
+            if ours_tokens[o:next_o] == base_tokens[b:next_b]:
+                merged.extend(theirs[t:next_t])
+            elif theirs_tokens[t:next_t] == base_tokens[b:next_b] or ours_tokens[o:next_o] == theirs_tokens[t:next_t]:
+                merged.extend(ours[o:next_o])
+            elif next_b - b == next_o - o == next_t - t:
+                # Both sides edited the same items in place: merge them one by one.
+                for offset in range(next_b - b):
+                    merged.append(
+                        self._merge(
+                            base[b + offset],
+                            ours[o + offset],
+                            theirs[t + offset],
+                            path=lambda: add_index(path(), start + offset),
+                            conflicts=conflicts,
+                        )
+                    )
+            else:
+                end = start + next_o - o
+                conflicts.append(
+                    MergeConflict(f'{path()}[{start}:{end}]', list(base[b:next_b]), list(ours[o:next_o]), list(theirs[t:next_t]))
+                )
+                merged.extend(ours[o:next_o])
+            if next_b < len(base):
+                merged.append(ours[next_o])
+            b, o, t = next_b + 1, next_o + 1, next_t + 1
+        return merged
+
+    def _diff(self, old: Any, new: Any, *, step: str | int | None, ignore: IgnoreState | None) -> DiffNode | None:
+        if ignore and ignore.matched:
             return None
 
-        if old == new:
+        if isinstance(old, JsonSpan):
+            return self._diff_spans(old, new, step=step, ignore=ignore)
+
+        if self._same(old, new):
             return None
 
         if isinstance(old, dict) and isinstance(new, dict):
-            return self._diff_dicts(old, new, label=label, path=path)
+            return self._diff_dicts(old, new, step=step, ignore=ignore)
 
         if isinstance(old, list) and isinstance(new, list):
-            return self._diff_lists(old, new, label=label, path=path)
+            return self._diff_lists(old, new, step=step, ignore=ignore)
 
         return DiffNode(
-            label=label,
-            path=path,
             kind='modified',
+            step=step,
             old=old,
             new=new,
             type_changed=json_type(old) != json_type(new),
         )
 
+    def _settled(self, old: Any, new: Any) -> bool:
+        # Cheap pre-check before queueing a child; spans are compared by the task itself.
+        return not isinstance(old, JsonSpan) and self._same(old, new)
+
+    def _map_children(self, diff_child: Callable[[int], DiffNode | None], total: int) -> list[DiffNode | None]:
+        if self.jobs > 1 and total >= PARALLEL_MIN_CHILDREN and _parallel_task is None and can_fork():
+            return map_in_pool(diff_child, total, self.jobs)
+        return [diff_child(index) for index in range(total)]
+
+    def _same(self, old: Any, new: Any) -> bool:
+        old_digest = self.hasher.digest(old)
+        if old_digest is not None:
+            new_digest = self.hasher.digest(new)
+            if new_digest is not None:
+                return old_digest == new_digest
+        return old == new
+
+    def _diff_spans(self, old: JsonSpan, new: JsonSpan, *, step: str | int | None, ignore: IgnoreState | None) -> DiffNode | None:
+        if old.same_bytes(new):
+            return None
+
+        kind = old.kind
+        if kind != new.kind or kind == 'scalar' or max(old.size, new.size) <= self.stream_threshold:
+            return self._diff(old.load(), new.load(), step=step, ignore=ignore)
+
+        if kind == 'object':
+            return self._diff_dicts(old.members(), new.members(), step=step, ignore=ignore)
+        return self._diff_lists(old.elements(), new.elements(), step=step, ignore=ignore)
+
     def _diff_dicts(
         self,
-        old: dict[str, Any],
-        new: dict[str, Any],
+        old: Mapping[str, Any],
+        new: Mapping[str, Any],
         *,
-        label: str,
-        path: str,
+        step: str | int | None,
+        ignore: IgnoreState | None,
     ) -> DiffNode | None:
-        children: list[DiffNode] = []
+        # Slots hold finished nodes, or an int indexing the common keys that still need diffing.
+        slots: list[DiffNode | int] = []
+        common: list[tuple[str, IgnoreState | None]] = []
         ordered_keys = list(old.keys()) + [key for key in new.keys() if key not in old]
 
         for key in ordered_keys:
             if key in self.ignore_keys:
                 continue
-            child_path = add_key(path, key)
-            if child_path in self.ignore_paths:
+            child_ignore = ignore and ignore.key(key)
+            if child_ignore and child_ignore.matched:
                 continue
 
             if key not in new:
-                children.append(DiffNode(label=key, path=child_path, kind='deleted', old=old[key]))
+                slots.append(DiffNode(kind='deleted', step=key, old=materialize(old[key])))
             elif key not in old:
-                children.append(DiffNode(label=key, path=child_path, kind='added', new=new[key]))
-            else:
-                child = self._diff(old[key], new[key], label=key, path=child_path)
-                if child is not None:
-                    children.append(child)
+                slots.append(DiffNode(kind='added', step=key, new=materialize(new[key])))
+            elif not self._settled(old[key], new[key]):
+                slots.append(len(common))
+                common.append((key, child_ignore))
+
+        def diff_child(index: int) -> DiffNode | None:
+            key, child_ignore = common[index]
+            return self._diff(old[key], new[key], step=key, ignore=child_ignore)
+
+        results = self._map_children(diff_child, len(common))
+        children = [slot if isinstance(slot, DiffNode) else results[slot] for slot in slots]
+        children = [child for child in children if child is not None]
 
         if not children:
             return None
 
-        return DiffNode(label=label, path=path, kind='group', children=children)
+        return DiffNode(kind='group', step=step, children=children)
+
+    def _diff_lists(
+        self,
+        old: Sequence[Any],
+        new: Sequence[Any],
+        *,
+        step: str | int | None,
+        ignore: IgnoreState | None,
+    ) -> DiffNode | None:
+        started = time.perf_counter()
+        match_key = find_match_key(old, new, self.match_keys, self.hasher)
+        aligned_by = f'key {match_key}'
+        if match_key is None and self.infer_match_keys:
+            match_key = infer_match_key(old, new, self.ignore_keys, self.hasher)
+            aligned_by = f'inferred key {match_key}'
+        if self.stats is not None:
+            self.stats.match_key_seconds += time.perf_counter() - started
 
-    def _diff_lists(self, old: list[Any], new: list[Any], *, label: str, path: str) -> DiffNode | None:
-        match_key = find_match_key(old, new, self.match_keys)
         if match_key is not None:
-            return self._diff_lists_by_key(old, new, label=label, path=path, match_key=match_key)
-        return self._diff_lists_by_position(old, new, label=label, path=path)
+            node = self._diff_lists_by_key(old, new, step=step, ignore=ignore, match_key=match_key)
+        else:
+            node = self._diff_lists_by_position(old, new, step=step, ignore=ignore)
+            aligned_by = 'position'
+        if self.stats is not None:
+            self.stats.note_array(len(old), len(new), aligned_by, node)
+        return node
 
     def _diff_lists_by_key(
         self,
-        old: list[dict[str, Any]],
-        new: list[dict[str, Any]],
+        old: Sequence[dict[str, Any]],
+        new: Sequence[dict[str, Any]],
         *,
-        label: str,
-        path: str,
+        step: str | int | None,
+        ignore: IgnoreState | None,
         match_key: str,
     ) -> DiffNode | None:
-        old_by_id = {scalar_key(item[match_key]): item for item in old}
-        new_by_id = {scalar_key(item[match_key]): item for item in new}
-        old_index_by_id = {scalar_key(item[match_key]): index for index, item in enumerate(old)}
-        new_index_by_id = {scalar_key(item[match_key]): index for index, item in enumerate(new)}
+        # Items are looked up by index rather than held in id maps so that streamed
+        # arrays only keep their key values in memory.
+        key_of = self.hasher.key
+        old_keys = [item[match_key] for item in old]
+        new_keys = [item[match_key] for item in new]
+        old_index_by_id = {key_of(value): index for index, value in enumerate(old_keys)}
+        new_index_by_id = {key_of(value): index for index, value in enumerate(new_keys)}
         raw_value_by_id = {
-            **{scalar_key(item[match_key]): item[match_key] for item in old},
-            **{scalar_key(item[match_key]): item[match_key] for item in new},
+            **{key_of(value): value for value in old_keys},
+            **{key_of(value): value for value in new_keys},
         }
 
-        children: list[DiffNode] = []
+        def diff_matched(old_index: int, new_index: int, child_ignore: IgnoreState | None, raw_id: Any) -> DiffNode | None:
+            old_item = old[old_index]
+            item = new[new_index]
+            moved = old_index != new_index
+            child = self._diff(old_item, item, step=None, ignore=child_ignore)
+            if child is None:
+                if not moved:
+                    return None
+                return DiffNode(
+                    kind='moved',
+                    old=old_item,
+                    new=item,
+                    is_array=True,
+                    match_key=match_key,
+                    match_value=raw_id,
+                    old_index=old_index,
+                    new_index=new_index,
+                    moved=True,
+                )
 
-        for new_index, item in enumerate(new):
-            item_id = scalar_key(item[match_key])
+            child.is_array = True
+            child.match_key = match_key
+            child.match_value = raw_id
+            child.old_index = old_index
+            child.new_index = new_index
+            child.moved = moved
+            return child
+
+        # Same slot scheme as _diff_dicts: matched items left to diff are indexes into `matched`.
+        slots: list[DiffNode | int] = []
+        matched: list[tuple[int, int, IgnoreState | None, Any]] = []
+
+        for new_index in range(len(new)):
+            item_id = key_of(new_keys[new_index])
             raw_id = raw_value_by_id[item_id]
-            child_path = add_match(path, match_key, raw_id)
-            if child_path in self.ignore_paths:
+            child_ignore = ignore and ignore.match(match_key, raw_id)
+            if child_ignore and child_ignore.matched:
                 continue
 
-            label_text = str(new_index + 1)
-            if item_id not in old_by_id:
-                children.append(
+            if item_id not in old_index_by_id:
+                slots.append(
                     DiffNode(
-                        label=label_text,
-                        path=child_path,
                         kind='added',
-                        new=item,
+                        new=new[new_index],
                         is_array=True,
                         match_key=match_key,
                         match_value=raw_id,
@@ -172,51 +1039,28 @@ class DiffBuilder:
                 )
                 continue
 
-            old_item = old_by_id[item_id]
             old_index = old_index_by_id[item_id]
-            moved = old_index != new_index
-            child = self._diff(old_item, item, label=label_text, path=child_path)
-            if child is None:
-                if moved:
-                    children.append(
-                        DiffNode(
-                            label=label_text,
-                            path=child_path,
-                            kind='moved',
-                            old=old_item,
-                            new=item,
-                            is_array=True,
-                            match_key=match_key,
-                            match_value=raw_id,
-                            old_index=old_index,
-                            new_index=new_index,
-                            moved=True,
-                        )
-                    )
+            if old_index == new_index and self._settled(old[old_index], new[new_index]):
                 continue
+            slots.append(len(matched))
+            matched.append((old_index, new_index, child_ignore, raw_id))
 
-            child.is_array = True
-            child.match_key = match_key
-            child.match_value = raw_id
-            child.old_index = old_index
-            child.new_index = new_index
-            child.moved = moved
-            children.append(child)
+        results = self._map_children(lambda index: diff_matched(*matched[index]), len(matched))
+        children = [slot if isinstance(slot, DiffNode) else results[slot] for slot in slots]
+        children = [child for child in children if child is not None]
 
-        for old_index, item in enumerate(old):
-            item_id = scalar_key(item[match_key])
-            if item_id in new_by_id:
+        for old_index, value in enumerate(old_keys):
+            item_id = key_of(value)
+            if item_id in new_index_by_id:
                 continue
             raw_id = raw_value_by_id[item_id]
-            child_path = add_match(path, match_key, raw_id)
-            if child_path in self.ignore_paths:
+            child_ignore = ignore and ignore.match(match_key, raw_id)
+            if child_ignore and child_ignore.matched:
                 continue
             children.append(
                 DiffNode(
-                    label=str(old_index + 1),
-                    path=child_path,
                     kind='deleted',
-                    old=item,
+                    old=old[old_index],
                     is_array=True,
                     match_key=match_key,
                     match_value=raw_id,
@@ -228,120 +1072,97 @@ class DiffBuilder:
             return None
 
         return DiffNode(
-            label=label,
-            path=path,
             kind='group',
+            step=step,
             children=children,
             is_array=True,
             match_key=match_key,
         )
 
+    def _tokens(self, items: Sequence[Any], ignore: IgnoreState | None = None) -> list[bytes]:
+        state = ignore.item() if ignore else None
+        if state and state.matched:
+            # Every item is ignored, so tell them apart by value (_diff skips their changes anyway).
+            state = None
+        # A SpanList parses its items one at a time, so a streamed array is tokenised in
+        # constant memory and formatting differences between the files do not matter.
+        token = self.hasher.token
+        return [token(item, state) for item in items]
+
     def _diff_lists_by_position(
         self,
-        old: list[Any],
-        new: list[Any],
+        old: Sequence[Any],
+        new: Sequence[Any],
         *,
-        label: str,
-        path: str,
+        step: str | int | None,
+        ignore: IgnoreState | None,
     ) -> DiffNode | None:
-        old_tokens = [fingerprint(item) for item in old]
-        new_tokens = [fingerprint(item) for item in new]
-        matcher = difflib.SequenceMatcher(a=old_tokens, b=new_tokens, autojunk=False)
+        old_tokens = self._tokens(old, ignore)
+        new_tokens = self._tokens(new, ignore)
         children: list[DiffNode] = []
 
-        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
-            if tag == 'equal':
-                continue
+        started = time.perf_counter()
+        opcodes = align_sequences(old_tokens, new_tokens, self.array_algorithm)
+        if self.stats is not None:
+            self.stats.alignment_seconds += time.perf_counter() - started
 
-            if tag == 'delete':
-                for old_index in range(i1, i2):
-                    child_path = add_index(path, old_index)
-                    if child_path in self.ignore_paths:
-                        continue
-                    children.append(
-                        DiffNode(
-                            label=str(old_index + 1),
-                            path=child_path,
-                            kind='deleted',
-                            old=old[old_index],
-                            is_array=True,
-                            old_index=old_index,
-                        )
-                    )
+        for tag, i1, i2, j1, j2 in opcodes:
+            if tag == 'equal':
                 continue
 
-            if tag == 'insert':
-                for new_index in range(j1, j2):
-                    child_path = add_index(path, new_index)
-                    if child_path in self.ignore_paths:
-                        continue
-                    children.append(
-                        DiffNode(
-                            label=str(new_index + 1),
-                            path=child_path,
-                            kind='added',
-                            new=new[new_index],
-                            is_array=True,
-                            new_index=new_index,
-                        )
-                    )
-                continue
+            # Paired items are diffed in place; the rest of the run is deleted, then added.
+            overlap = min(i2 - i1, j2 - j1)
+
+            for offset in range(overlap):
+                old_index = i1 + offset
+                new_index = j1 + offset
+                child_ignore = ignore and ignore.index(new_index)
+                if child_ignore and child_ignore.matched:
+                    continue
+                child = self._diff(
+                    old[old_index],
+                    new[new_index],
+                    step=new_index,
+                    ignore=child_ignore,
+                )
+                if child is not None:
+                    child.is_array = True
+                    child.old_index = old_index
+                    child.new_index = new_index
+                    children.append(child)
 
-            if tag == 'replace':
-                overlap = min(i2 - i1, j2 - j1)
-
-                for offset in range(overlap):
-                    old_index = i1 + offset
-                    new_index = j1 + offset
-                    child_path = add_index(path, new_index)
-                    if child_path in self.ignore_paths:
-                        continue
-                    child = self._diff(
-                        old[old_index],
-                        new[new_index],
-                        label=str(new_index + 1),
-                        path=child_path,
-                    )
-                    if child is not None:
-                        child.is_array = True
-                        child.old_index = old_index
-                        child.new_index = new_index
-                        children.append(child)
-
-                for old_index in range(i1 + overlap, i2):
-                    child_path = add_index(path, old_index)
-                    if child_path in self.ignore_paths:
-                        continue
-                    children.append(
-                        DiffNode(
-                            label=str(old_index + 1),
-                            path=child_path,
-                            kind='deleted',
-                            old=old[old_index],
-                            is_array=True,
-                            old_index=old_index,
-                        )
+            for old_index in range(i1 + overlap, i2):
+                child_ignore = ignore and ignore.index(old_index)
+                if child_ignore and child_ignore.matched:
+                    continue
+                children.append(
+                    DiffNode(
+                        kind='deleted',
+                        step=old_index,
+                        old=old[old_index],
+                        is_array=True,
+                        old_index=old_index,
                     )
+                )
 
-                for new_index in range(j1 + overlap, j2):
-                    child_path = add_index(path, new_index)
-                    if child_path in self.ignore_paths:
-                        continue
-                    children.append(
-                        DiffNode(
-                            label=str(new_index + 1),
-                            path=child_path,
-                            kind='added',
-                            new=new[new_index],
-                            is_array=True,
-                            new_index=new_index,
-                        )
+            for new_index in range(j1 + overlap, j2):
+                child_ignore = ignore and ignore.index(new_index)
+                if child_ignore and child_ignore.matched:
+                    continue
+                children.append(
+                    DiffNode(
+                        kind='added',
+                        step=new_index,
+                        new=new[new_index],
+                        is_array=True,
+                        new_index=new_index,
                     )
+                )
 
         if not children:
             return None
 
-        return DiffNode(label=label, path=path, kind='group', children=children, is_array=True)
+        return DiffNode(kind='group', step=step, children=children, is_array=True)
 
 
 class HtmlRenderer:
@@ -354,6 +1175,7 @@ class HtmlRenderer:
         counts: Counts,
         strip_html_tags: bool,
         rtl: bool,
+        conflicts: Sequence[MergeConflict] = (),
     ) -> None:
         self.title = title
         self.old_name = old_name
@@ -361,28 +1183,27 @@ class HtmlRenderer:
         self.counts = counts
         self.strip_html_tags = strip_html_tags
         self.rtl = rtl
+        self.conflicts = conflicts
         self._ids = count(1)
 
     def render_document(self, root: DiffNode | None) -> str:
-        split_html = self.render_split(root)
+        return ''.join(self.render_chunks(root))
+
+    def render_chunks(self, root: DiffNode | None) -> Iterator[str]:
+        # The page as a stream of pieces (head, one per diff entry, tail), so main() can write
+        # a report of any size without holding it in memory.
         counts = self.counts
         title = html.escape(self.title)
         old_name = html.escape(self.old_name)
         new_name = html.escape(self.new_name)
         dir_attr = 'rtl' if self.rtl else 'ltr'
 
-        summary = []
-        if counts.added:
-            summary.append(f'<span class="badge added">+{counts.added} added</span>')
-        if counts.modified:
-            summary.append(f'<span class="badge modified">~{counts.modified} changed</span>')
-        if counts.deleted:
-            summary.append(f'<span class="badge deleted">-{counts.deleted} removed</span>')
-        if counts.moved:
-            summary.append(f'<span class="badge moved">↕ {counts.moved} moved</span>')
-        summary_html = ''.join(summary) or '<span class="badge muted">No changes</span>'
+        summary_html = render_counts_summary(counts)
+        if self.conflicts:
+            summary_html += f'<span class="badge conflict">⚠ {len(self.conflicts)} conflicts</span>'
+        conflicts_html = self._render_conflicts()
 
-        return f'''<!doctype html>
+        yield f'''<!doctype html>
 <html lang="en" dir="{dir_attr}">
 <head>
 <meta charset="utf-8">
@@ -425,6 +1246,17 @@ body {{ font: 14px/1.55 system-ui, -apple-system, BlinkMacSystemFont, "Segoe UI"
   font: inherit;
 }}
 .controls button:hover {{ background: #f9fafb; }}
+.load-more {{
+  margin: 6px 0 6px 1.5rem;
+  border: 1px solid var(--border);
+  background: #fff;
+  color: var(--muted);
+  padding: 3px 10px;
+  border-radius: 999px;
+  cursor: pointer;
+  font: inherit;
+  font-size: 12px;
+}}
 .diff-card {{ margin-top: 14px; padding: 18px; overflow: auto; }}
 .no-diff {{ color: var(--muted); text-align: center; padding: 24px 8px; }}
 .badge {{
@@ -442,6 +1274,7 @@ body {{ font: 14px/1.55 system-ui, -apple-system, BlinkMacSystemFont, "Segoe UI"
 .badge.modified {{ background: var(--yellow-bg); color: var(--yellow-fg); }}
 .badge.moved {{ background: var(--purple-bg); color: var(--purple-fg); }}
 .badge.muted {{ background: #f3f4f6; color: #4b5563; }}
+.badge.conflict {{ background: var(--red-fg); color: #fff; }}
 dl, dt, dd {{ display: block; }}
 dt {{ font-weight: 700; }}
 dd {{ margin: 0 0 0 1.5rem; }}
@@ -510,6 +1343,15 @@ ins, del {{
 .split-col.left {{ border-inline-end: 1px solid #eee; }}
 .empty {{ color: #999; }}
 .footer-note {{ margin-top: 14px; color: var(--muted); font-size: 12px; }}
+.conflict-title {{ margin: 0 0 10px; font-size: 1rem; }}
+.conflict-row {{
+  display: grid;
+  grid-template-columns: repeat(3, minmax(0, 1fr));
+  gap: 0.5rem;
+  margin-top: 0.15rem;
+}}
+.conflict-row > div {{ white-space: pre-wrap; word-break: break-word; min-width: 0; }}
+.conflict-head {{ color: var(--muted); font-size: 12px; font-weight: 700; }}
 @media (max-width: 860px) {{
   .container {{ padding: 12px; }}
   .split-row {{ grid-template-columns: 1fr; }}
@@ -532,71 +1374,138 @@ ins, del {{
         <button type="button" id="toggle-paths">Show paths</button>
       </div>
     </section>
-
+{conflicts_html}
     <section class="card diff-card diff-root">
-      {split_html}
+      '''
+        yield from self.iter_split(root)
+        yield '''
       <div class="footer-note">Generated by json_diff_html.py</div>
     </section>
   </div>
 
 <script>
-(() => {{
+(() => {
   const root = document.querySelector('.diff-root');
   const html = document.documentElement;
 
-  function toggleNode(button, expanded) {{
+  // Reports written with --lazy keep group bodies in gzip-compressed chunks: inline
+  // <script id="diff-chunk-N"> blocks, or N.js files in the directory named by #diff-chunk-dir.
+  const chunkDirNode = document.getElementById('diff-chunk-dir');
+  const chunkDir = chunkDirNode ? JSON.parse(chunkDirNode.textContent) : null;
+  const pendingChunks = new Map();
+  window.jsonDiffChunk = (id, data) => {
+    const resolve = pendingChunks.get(id);
+    pendingChunks.delete(id);
+    if (resolve) resolve(data);
+  };
+
+  function chunkText(id) {
+    const embedded = document.getElementById(`diff-chunk-${id}`);
+    if (embedded) return Promise.resolve(embedded.textContent);
+    return new Promise((resolve, reject) => {
+      pendingChunks.set(id, resolve);
+      const script = document.createElement('script');
+      script.src = `${chunkDir}/${id}.js`;
+      script.onload = () => script.remove();
+      script.onerror = reject;
+      document.head.appendChild(script);
+    });
+  }
+
+  async function loadChunk(id) {
+    const bytes = Uint8Array.from(atob(await chunkText(id)), c => c.charCodeAt(0));
+    const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('gzip'));
+    return JSON.parse(await new Response(stream).text()).html;
+  }
+
+  async function loadNextPage(target) {
+    const next = Number(target.dataset.next);
+    const end = Number(target.dataset.end);
+    const more = target.querySelector(':scope > .load-more');
+    if (target.dataset.loading || next >= end) return;
+    target.dataset.loading = 'true';
+    try {
+      target.querySelector(':scope > dl').insertAdjacentHTML('beforeend', await loadChunk(next));
+      target.dataset.next = next + 1;
+      more.hidden = next + 1 >= end;
+      more.textContent = `Load more (${end - next - 1} of ${end - Number(target.dataset.start)} pages left)`;
+    } catch (error) {
+      more.hidden = false;
+      more.textContent = 'Could not load this part of the report. Retry';
+    } finally {
+      delete target.dataset.loading;
+    }
+  }
+
+  function toggleNode(button, expanded) {
     const target = document.getElementById(button.dataset.target);
     if (!target) return;
     target.classList.toggle('collapsed', !expanded);
     button.setAttribute('aria-expanded', expanded ? 'true' : 'false');
     button.textContent = expanded ? '▾' : '▸';
-  }}
-
-  root.querySelectorAll('.toggle[data-target]').forEach(button => {{
-    button.addEventListener('click', () => {{
-      const expanded = button.getAttribute('aria-expanded') !== 'true';
-      toggleNode(button, expanded);
-    }});
-  }});
-
-  document.getElementById('expand-all').addEventListener('click', () => {{
+    // Only lazy reports page their children in; the first page loads on the first expand.
+    if (expanded && 'start' in target.dataset && target.dataset.next === target.dataset.start) loadNextPage(target);
+  }
+
+  // One delegated listener, so it also covers nodes inserted from lazy chunks.
+  root.addEventListener('click', event => {
+    const button = event.target.closest('.toggle[data-target], .load-more');
+    if (!button) return;
+    if (button.classList.contains('load-more')) {
+      loadNextPage(button.parentElement);
+    } else {
+      toggleNode(button, button.getAttribute('aria-expanded') !== 'true');
+    }
+  });
+
+  document.getElementById('expand-all').addEventListener('click', () => {
     root.querySelectorAll('.toggle[data-target]').forEach(button => toggleNode(button, true));
-  }});
+  });
 
-  document.getElementById('collapse-all').addEventListener('click', () => {{
+  document.getElementById('collapse-all').addEventListener('click', () => {
     root.querySelectorAll('.toggle[data-target]').forEach(button => toggleNode(button, false));
-  }});
+  });
 
   const pathsBtn = document.getElementById('toggle-paths');
   let pathsVisible = false;
-  pathsBtn.addEventListener('click', () => {{
+  pathsBtn.addEventListener('click', () => {
     pathsVisible = !pathsVisible;
     html.classList.toggle('show-paths', pathsVisible);
     pathsBtn.textContent = pathsVisible ? 'Hide paths' : 'Show paths';
-  }});
-}})();
+  });
+})();
 </script>
 </body>
 </html>
 '''
 
     def render_split(self, root: DiffNode | None) -> str:
-        if root is None:
-            return '<div class="no-diff">No diff</div>'
-        return self._render_split_node(root, root_level=True)
+        return ''.join(self.iter_split(root))
 
-    def _render_split_node(self, node: DiffNode, *, root_level: bool = False) -> str:
-        if node.kind == 'group':
-            inner = ''.join(self._render_split_entry(child) for child in node.children)
-            if root_level:
-                return f'<dl class="diff-tree">{inner}</dl>'
-            return self._render_group_entry(node, inner)
-        return self._render_split_entry(node)
-
-    def _render_group_entry(self, node: DiffNode, inner_html: str) -> str:
+    def iter_split(self, root: DiffNode | None) -> Iterator[str]:
+        if root is None:
+            yield '<div class="no-diff">No diff</div>'
+        elif root.kind == 'group':
+            yield '<dl class="diff-tree">'
+            for child in root.children:
+                yield from self._iter_split_entry(child)
+            yield '</dl>'
+        else:
+            yield from self._iter_split_entry(root)
+
+    def _render_group_open(self, node: DiffNode, *, chunks: range | None = None) -> str:
+        # With chunks, the group starts collapsed and its children are loaded from those chunks.
         node_id = f'node-{next(self._ids)}'
         counts = count_changes(node)
-        toggle = f'<button type="button" class="toggle" data-target="{node_id}" aria-expanded="true">▾</button>'
+        if chunks is None:
+            toggle = f'<button type="button" class="toggle" data-target="{node_id}" aria-expanded="true">▾</button>'
+            children_attrs = 'class="node-children"'
+        else:
+            toggle = f'<button type="button" class="toggle" data-target="{node_id}" aria-expanded="false">▸</button>'
+            children_attrs = (
+                f'class="node-children collapsed" data-start="{chunks.start}" '
+                f'data-next="{chunks.start}" data-end="{chunks.stop}"'
+            )
         badge_counts = Counts(counts.added, counts.modified, counts.deleted, counts.moved)
         if node.moved and badge_counts.moved:
             badge_counts.moved -= 1
@@ -608,18 +1517,21 @@ ins, del {{
         return (
             f'<dt class="type-node"><div class="keyline">{toggle}<span class="node-key">{label}</span>'
             f'{meta}{move}{badges}<span class="node-path">{path}</span></div></dt>'
-            f'<dd class="type-node"><div id="{node_id}" class="node-children"><dl class="diff-tree">{inner_html}</dl></div></dd>'
+            f'<dd class="type-node"><div id="{node_id}" {children_attrs}><dl class="diff-tree">'
         )
 
-    def _render_split_entry(self, node: DiffNode) -> str:
+    def _iter_split_entry(self, node: DiffNode) -> Iterator[str]:
         if node.kind == 'group':
-            inner = ''.join(self._render_split_entry(child) for child in node.children)
-            return self._render_group_entry(node, inner)
+            yield self._render_group_open(node)
+            for child in node.children:
+                yield from self._iter_split_entry(child)
+            yield GROUP_CLOSE_HTML
+            return
 
         label_row = self._render_label_row(node, has_children=False)
         body = self._render_split_body(node)
         css_kind = css_kind_for(node)
-        return f'<dt class="type-{css_kind}">{label_row}</dt><dd class="type-{css_kind}">{body}</dd>'
+        yield f'<dt class="type-{css_kind}">{label_row}</dt><dd class="type-{css_kind}">{body}</dd>'
 
     def _render_label_row(self, node: DiffNode, *, has_children: bool) -> str:
         toggle = '<span class="toggle spacer">▾</span>' if not has_children else ''
@@ -657,6 +1569,26 @@ ins, del {{
             )
         return split_row('', '')
 
+    def _render_conflicts(self) -> str:
+        if not self.conflicts:
+            return ''
+        rows = []
+        for conflict in self.conflicts:
+            cells = ''.join(
+                '<div><span class="empty">absent</span></div>'
+                if value is ABSENT
+                else f'<div>{format_value_html(value, strip_html_tags=self.strip_html_tags)}</div>'
+                for value in (conflict.base, conflict.ours, conflict.theirs)
+            )
+            rows.append(f'<dt>{html.escape(conflict.path)}</dt><dd class="conflict-row">{cells}</dd>')
+        return (
+            '    <section class="card diff-card conflict-card">\n'
+            f'      <h2 class="conflict-title">{len(self.conflicts)} conflicts (the merge kept ours)</h2>\n'
+            '      <div class="conflict-row conflict-head"><div>base</div><div>ours</div><div>theirs</div></div>\n'
+            f'      <dl>{"".join(rows)}</dl>\n'
+            '    </section>\n'
+        )
+
     def _render_meta(self, node: DiffNode) -> str:
         parts: list[str] = []
         if node.match_key is not None and node.match_value is not None:
@@ -682,6 +1614,152 @@ ins, del {{
         return f'<span class="badge moved">{display_index(node.old_index)} → {display_index(node.new_index)}</span>'
 
 
+class LazyHtmlRenderer(HtmlRenderer):
+    # --lazy: the page only carries the summary and collapsed top-level groups. Their
+    # children are paged into gzip-compressed JSON chunks that the page inflates on expand.
+    # Chunks are embedded as inert <script> blocks, or written to chunk_dir as JSONP files,
+    # which unlike fetch() also load from file:// URLs.
+    def __init__(self, *, chunk_dir: Path | None = None, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.chunk_dir = chunk_dir
+        self._chunk_ids = count()
+        self._pages: deque[tuple[int, list[DiffNode]]] = deque()
+
+    def iter_split(self, root: DiffNode | None) -> Iterator[str]:
+        if root is None or root.kind != 'group':
+            yield from super().iter_split(root)
+            return
+
+        yield '<dl class="diff-tree">'
+        for child in root.children:
+            if child.kind == 'group':
+                yield self._render_lazy_group(child)
+            else:
+                yield from self._iter_split_entry(child)
+        yield '</dl>'
+        if self.chunk_dir is not None:
+            chunk_dir = json.dumps(self.chunk_dir.name).replace('<', '\\u003c')
+            yield f'<script type="application/json" id="diff-chunk-dir">{chunk_dir}</script>'
+
+        # Rendering a page can queue pages of its own nested lazy groups.
+        while self._pages:
+            chunk_id, nodes = self._pages.popleft()
+            page_html = ''.join(part for node in nodes for part in self._iter_lazy_entry(node))
+            payload = gzip.compress(json.dumps({'html': page_html}).encode('ascii'), mtime=0)
+            encoded = base64.b64encode(payload).decode('ascii')
+            if self.chunk_dir is None:
+                yield f'<script type="text/plain" id="diff-chunk-{chunk_id}">{encoded}</script>'
+            else:
+                (self.chunk_dir / f'{chunk_id}.js').write_text(f'jsonDiffChunk({chunk_id}, "{encoded}");\n')
+
+    def _iter_lazy_entry(self, node: DiffNode) -> Iterator[str]:
+        if node.kind == 'group' and count_changes(node).total > LAZY_INLINE_MAX:
+            yield self._render_lazy_group(node)
+        else:
+            yield from self._iter_split_entry(node)
+
+    def _render_lazy_group(self, node: DiffNode) -> str:
+        pages: list[list[DiffNode]] = [[]]
+        weight = 0
+        for child in node.children:
+            if weight >= LAZY_PAGE_ENTRIES:
+                pages.append([])
+                weight = 0
+            pages[-1].append(child)
+            total = count_changes(child).total if child.kind == 'group' else 1
+            weight += total if total <= LAZY_INLINE_MAX else 1
+
+        first = next(self._chunk_ids)
+        for _ in pages[1:]:
+            next(self._chunk_ids)
+        self._pages.extend(zip(count(first), pages))
+        return self._render_group_open(node, chunks=range(first, first + len(pages))) + LAZY_GROUP_CLOSE_HTML
+
+
+class DiffCache:
+    # --cache-dir, one SQLite file shared by every run:
+    # - canonical: digests of documents seen before, keyed by a hash of the raw file bytes plus
+    #   DiffBuilder.digest_options(). Two inputs whose cached digests match are equal up to
+    #   whitespace and key order, so they are not parsed at all.
+    # - reports: zlib-compressed rendered output keyed by report_cache_key(), evicted least
+    #   recently used first once their total size passes --cache-max-mb.
+    def __init__(self, directory: Path) -> None:
+        directory.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(directory / 'cache.sqlite3', timeout=60)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS canonical ('
+            'content BLOB NOT NULL, options BLOB NOT NULL, digest BLOB NOT NULL, '
+            'PRIMARY KEY (content, options))'
+        )
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS reports ('
+            'key BLOB PRIMARY KEY, counts TEXT NOT NULL, size INTEGER NOT NULL, '
+            'used REAL NOT NULL, body BLOB NOT NULL)'
+        )
+
+    def get(self, content: bytes, options: bytes) -> bytes | None:
+        row = self.db.execute(
+            'SELECT digest FROM canonical WHERE content = ? AND options = ?',
+            (content, options),
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def put(self, content: bytes, options: bytes, digest: bytes) -> None:
+        with self.db:
+            self.db.execute(
+                'INSERT OR REPLACE INTO canonical (content, options, digest) VALUES (?, ?, ?)',
+                (content, options, digest),
+            )
+
+    def get_report(self, key: bytes) -> tuple[Counts, bytes] | None:
+        row = self.db.execute('SELECT counts, body FROM reports WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        with self.db:
+            self.db.execute('UPDATE reports SET used = ? WHERE key = ?', (time.time(), key))
+        return Counts(**json.loads(row[0])), row[1]
+
+    def put_report(self, key: bytes, counts: Counts, body: bytes, max_bytes: int) -> None:
+        with self.db:
+            self.db.execute(
+                'INSERT OR REPLACE INTO reports (key, counts, size, used, body) VALUES (?, ?, ?, ?, ?)',
+                (key, json.dumps(asdict(counts)), len(body), time.time(), body),
+            )
+            self.db.execute(
+                'DELETE FROM reports WHERE key IN ('
+                'SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY used DESC) AS running FROM reports) '
+                'WHERE running > ?)',
+                (max_bytes,),
+            )
+
+
+@dataclass
+class MergeConflict:
+    # A subtree ours and theirs both changed, differently; ABSENT marks a side without it.
+    path: str
+    base: Any
+    ours: Any
+    theirs: Any
+
+
+@dataclass
+class BatchPair:
+    name: str
+    stem: str
+    old: Path | None
+    new: Path | None
+
+
+@dataclass
+class BatchResult:
+    name: str
+    status: str
+    counts: Counts = field(default_factory=Counts)
+    report: str | None = None
+    error: str | None = None
+
+
 def json_type(value: Any) -> str:
     if value is None:
         return 'null'
@@ -700,7 +1778,7 @@ def json_type(value: Any) -> str:
 
 def load_json_from_file(path: Path) -> Any:
     try:
-        return json.loads(path.read_text())
+        return json_loader.load_path(path)
     except FileNotFoundError as exc:
         raise SystemExit(f'File not found: {path}') from exc
     except json.JSONDecodeError as exc:
@@ -708,6 +1786,30 @@ def load_json_from_file(path: Path) -> Any:
         raise SystemExit(f'Invalid JSON in {path}: {exc.msg} ({where})') from exc
 
 
+def same_file_bytes(old: Path, new: Path) -> bool:
+    try:
+        if old.stat().st_size != new.stat().st_size:
+            return False
+        with old.open('rb') as old_fh, new.open('rb') as new_fh:
+            while True:
+                chunk = old_fh.read(IO_CHUNK_SIZE)
+                if chunk != new_fh.read(IO_CHUNK_SIZE):
+                    return False
+                if not chunk:
+                    return True
+    except OSError:
+        # Let the loaders report missing or unreadable files.
+        return False
+
+
+def file_content_digest(path: Path) -> bytes:
+    try:
+        with path.open('rb') as fh:
+            return hashlib.file_digest(fh, 'blake2b').digest()
+    except FileNotFoundError as exc:
+        raise SystemExit(f'File not found: {path}') from exc
+
+
 def load_json_from_stdin(separator: str) -> tuple[Any, Any]:
     raw = sys.stdin.read()
     parts = raw.split(separator)
@@ -717,40 +1819,486 @@ def load_json_from_stdin(separator: str) -> tuple[Any, Any]:
             f'{separator!r}.'
         )
     try:
-        return json.loads(parts[0].strip()), json.loads(parts[1].strip())
+        return json_loader.loads(parts[0].strip()), json_loader.loads(parts[1].strip())
     except json.JSONDecodeError as exc:
         where = f'line {exc.lineno}, column {exc.colno}'
         raise SystemExit(f'Invalid JSON from stdin: {exc.msg} ({where})') from exc
 
 
-def find_match_key(old: list[Any], new: list[Any], match_keys: tuple[str, ...]) -> str | None:
-    items = [*old, *new]
-    if not items:
+def find_match_key(
+    old: Sequence[Any],
+    new: Sequence[Any],
+    match_keys: tuple[str, ...],
+    hasher: SubtreeHasher,
+) -> str | None:
+    if not old and not new:
+        return None
+
+    # A single pass over both sides, so streamed arrays are only parsed once here.
+    candidates = {key: (set(), set()) for key in match_keys}
+    for side, items in enumerate((old, new)):
+        for item in items:
+            if not isinstance(item, dict):
+                return None
+            for key, seen in list(candidates.items()):
+                value = hasher.key(item[key]) if key in item else None
+                if value is None or value in seen[side]:
+                    del candidates[key]
+                else:
+                    seen[side].add(value)
+            if not candidates:
+                return None
+    return next(iter(candidates), None)
+
+
+def infer_match_key(
+    old: Sequence[Any],
+    new: Sequence[Any],
+    ignore_keys: set[str],
+    hasher: SubtreeHasher,
+) -> str | None:
+    # For arrays of objects with none of the configured match keys: sample both sides for
+    # str/int columns present in every object and unique per side, rank them by how many
+    # values the two samples share, then confirm the best on the full arrays. The array is
+    # then diffed by that key like one given with --match-key, moves included.
+    if len(old) < 2 or len(new) < 2:
         return None
-    if not all(isinstance(item, dict) for item in items):
+    old_sample = list(islice(old, MATCH_KEY_SAMPLE))
+    new_sample = list(islice(new, MATCH_KEY_SAMPLE))
+    if not all(isinstance(item, dict) and len(item) > 1 for item in (*old_sample, *new_sample)):
         return None
 
-    for key in match_keys:
-        if not all(key in item for item in items):
-            continue
-        old_values = [scalar_key(item[key]) for item in old]
-        new_values = [scalar_key(item[key]) for item in new]
-        if len(set(old_values)) != len(old_values):
-            continue
-        if len(set(new_values)) != len(new_values):
+    shared_by_key: dict[str, int] = {}
+    for key, value in old_sample[0].items():
+        if key in ignore_keys or type(value) not in (str, int):
             continue
-        return key
-    return None
+        columns = []
+        for sample in (old_sample, new_sample):
+            values = [item.get(key) for item in sample]
+            if any(type(value) not in (str, int) for value in values) or len(set(values)) < len(values):
+                break
+            columns.append(set(values))
+        else:
+            shared_by_key[key] = len(columns[0] & columns[1])
+    ranked = sorted(shared_by_key, key=shared_by_key.__getitem__, reverse=True)
+    match_key = find_match_key(old, new, tuple(ranked), hasher)
+    if match_key is None:
+        return None
+
+    # Keying arrays whose items mostly changed identity would turn edits into add/delete pairs.
+    old_ids = {hasher.key(item[match_key]) for item in old}
+    shared = sum(hasher.key(item[match_key]) in old_ids for item in new)
+    if shared * 2 < min(len(old), len(new)):
+        return None
+    return match_key
+
+
+def equal_positions(old: Sequence[bytes], new: Sequence[bytes], algorithm: str) -> dict[int, int]:
+    positions: dict[int, int] = {}
+    for tag, i1, i2, j1, _ in align_sequences(old, new, algorithm):
+        if tag == 'equal':
+            positions.update(zip(range(i1, i2), count(j1)))
+    return positions
 
 
-def scalar_key(value: Any) -> str:
-    if isinstance(value, (str, int, float, bool)) or value is None:
-        return json.dumps(value, ensure_ascii=False, sort_keys=True)
-    return fingerprint(value)
+def can_fork() -> bool:
+    return 'fork' in multiprocessing.get_all_start_methods()
 
 
-def fingerprint(value: Any) -> str:
-    return json.dumps(value, ensure_ascii=False, separators=(',', ':'), sort_keys=True)
+def run_parallel_task(index: int) -> DiffNode | None:
+    return _parallel_task(index)
+
+
+def map_in_pool(task: Callable[[int], DiffNode | None], total: int, jobs: int) -> list[DiffNode | None]:
+    # Workers are forked, so they share the parsed inputs and hash index copy-on-write and only
+    # child indexes go over the pipe. map() yields in submission order, which keeps the merged
+    # children in the same order as a serial run.
+    global _parallel_task
+    _parallel_task = task
+    try:
+        with ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context('fork')) as pool:
+            return list(pool.map(run_parallel_task, range(total), chunksize=max(1, total // (jobs * 4))))
+    finally:
+        _parallel_task = None
+
+
+def scalar_bytes(value: Any) -> bytes:
+    # Canonical bytes for a JSON scalar. Numbers and booleans are normalised the way
+    # Python compares them (1 == 1.0 == True), matching the old `old == new` check.
+    kind = type(value)
+    if kind is str:
+        return b's%d:%s' % (len(value), value.encode('utf-8', 'surrogatepass'))
+    if kind is int:
+        return b'i%d;' % value
+    if value is None:
+        return b'n'
+    if kind is bool:
+        return b'i1;' if value else b'i0;'
+    if kind is float:
+        return b'i%d;' % value if value.is_integer() else b'f%r;' % value
+    return b'f%s;' % repr(value).encode()
+
+
+def token_bytes(value: Any) -> bytes:
+    # scalar_bytes with booleans and floats kept apart from integers, as they are in the JSON text.
+    kind = type(value)
+    if kind is bool:
+        return b'b1;' if value else b'b0;'
+    if kind is float:
+        return b'f%r;' % value
+    return scalar_bytes(value)
+
+
+def materialize(value: Any) -> Any:
+    return value.load() if isinstance(value, JsonSpan) else value
+
+
+def align_sequences(a: Sequence[Hashable], b: Sequence[Hashable], algorithm: str) -> list[tuple[str, int, int, int, int]]:
+    if algorithm == 'auto':
+        algorithm = 'difflib' if difflib_is_cheap(a, b) else 'patience'
+    if algorithm == 'difflib':
+        return difflib.SequenceMatcher(a=a, b=b, autojunk=False).get_opcodes()
+    if algorithm == 'myers':
+        blocks = myers_blocks(a, b)
+    elif algorithm == 'patience':
+        blocks = anchored_blocks(a, b, patience_anchors)
+    elif algorithm == 'histogram':
+        blocks = anchored_blocks(a, b, histogram_anchor)
+    else:
+        raise ValueError(f'Unknown array algorithm: {algorithm}')
+    return opcodes_from_blocks(blocks, len(a), len(b))
+
+
+def difflib_is_cheap(a: Sequence[Hashable], b: Sequence[Hashable]) -> bool:
+    if len(a) + len(b) > AUTO_DIFFLIB_MAX_ITEMS:
+        return False
+    # SequenceMatcher visits every (a, b) pair of equal tokens; repeated tokens make that quadratic.
+    counts = Counter(b)
+    return sum(counts.get(token, 0) for token in a) <= AUTO_DIFFLIB_MAX_PAIRS
+
+
+def opcodes_from_blocks(
+    blocks: list[tuple[int, int, int]],
+    len_a: int,
+    len_b: int,
+) -> list[tuple[str, int, int, int, int]]:
+    # Same shape as SequenceMatcher.get_opcodes(), from ordered (i, j, size) matching blocks.
+    opcodes: list[tuple[str, int, int, int, int]] = []
+    i = j = 0
+    for block_i, block_j, size in [*blocks, (len_a, len_b, 0)]:
+        if i < block_i and j < block_j:
+            opcodes.append(('replace', i, block_i, j, block_j))
+        elif i < block_i:
+            opcodes.append(('delete', i, block_i, j, block_j))
+        elif j < block_j:
+            opcodes.append(('insert', i, block_i, j, block_j))
+        if size:
+            if opcodes and opcodes[-1][0] == 'equal':
+                _, start_i, _, start_j, _ = opcodes.pop()
+                opcodes.append(('equal', start_i, block_i + size, start_j, block_j + size))
+            else:
+                opcodes.append(('equal', block_i, block_i + size, block_j, block_j + size))
+        i, j = block_i + size, block_j + size
+    return opcodes
+
+
+def trim_common(
+    a: Sequence[Hashable],
+    b: Sequence[Hashable],
+    a_lo: int,
+    a_hi: int,
+    b_lo: int,
+    b_hi: int,
+) -> tuple[int, int, int, int, int, int]:
+    prefix = 0
+    while a_lo + prefix < a_hi and b_lo + prefix < b_hi and a[a_lo + prefix] == b[b_lo + prefix]:
+        prefix += 1
+    suffix = 0
+    while a_hi - suffix > a_lo + prefix and b_hi - suffix > b_lo + prefix and a[a_hi - suffix - 1] == b[b_hi - suffix - 1]:
+        suffix += 1
+    return prefix, suffix, a_lo + prefix, a_hi - suffix, b_lo + prefix, b_hi - suffix
+
+
+def myers_blocks(
+    a: Sequence[Hashable],
+    b: Sequence[Hashable],
+    a_lo: int = 0,
+    a_hi: int | None = None,
+    b_lo: int = 0,
+    b_hi: int | None = None,
+) -> list[tuple[int, int, int]]:
+    # Myers' O(ND) diff in linear space: split each range at the middle snake and
+    # work through the halves with an explicit stack so deep inputs do not recurse.
+    blocks: list[tuple[int, int, int]] = []
+    stack: list[tuple[int, int, int, int] | tuple[int, int, int]] = [
+        (a_lo, len(a) if a_hi is None else a_hi, b_lo, len(b) if b_hi is None else b_hi)
+    ]
+    while stack:
+        item = stack.pop()
+        if len(item) == 3:
+            blocks.append(item)
+            continue
+        a_lo, a_hi, b_lo, b_hi = item
+        prefix, suffix, a_lo, a_hi, b_lo, b_hi = trim_common(a, b, a_lo, a_hi, b_lo, b_hi)
+        if prefix:
+            blocks.append((a_lo - prefix, b_lo - prefix, prefix))
+        if a_lo < a_hi and b_lo < b_hi:
+            split_a, split_b = myers_middle(a, b, a_lo, a_hi, b_lo, b_hi)
+            if suffix:
+                stack.append((a_hi, b_hi, suffix))
+            stack.append((split_a, a_hi, split_b, b_hi))
+            stack.append((a_lo, split_a, b_lo, split_b))
+        elif suffix:
+            blocks.append((a_hi, b_hi, suffix))
+    return blocks
+
+
+def myers_middle(
+    a: Sequence[Hashable],
+    b: Sequence[Hashable],
+    a_lo: int,
+    a_hi: int,
+    b_lo: int,
+    b_hi: int,
+) -> tuple[int, int]:
+    # Runs the forward and reverse searches until they overlap and returns the split point
+    # (the bisection step of diff-match-patch). Both ranges are non-empty and have no common
+    # prefix or suffix. Like GNU diff, it stops looking for an optimal split once the edit
+    # distance gets too large and cuts at the forward path that got furthest instead; the
+    # result is still a valid, if less minimal, diff.
+    len_a = a_hi - a_lo
+    len_b = b_hi - b_lo
+    max_d = (len_a + len_b + 1) // 2
+    too_expensive = max(MYERS_MIN_COST, math.isqrt(len_a + len_b) * 4)
+    offset = max_d + 1
+    forward = [-1] * (2 * offset + 2)
+    reverse = [-1] * (2 * offset + 2)
+    forward[offset + 1] = 0
+    reverse[offset + 1] = 0
+    delta = len_a - len_b
+    odd = delta % 2 != 0
+    # Diagonals that ran off the edit graph are trimmed from both ends of the k range.
+    forward_start = forward_end = reverse_start = reverse_end = 0
+    best_x = best_y = 0
+
+    for d in range(max_d):
+        if d > too_expensive and best_x + best_y:
+            return a_lo + best_x, b_lo + best_y
+
+        for k in range(-d + forward_start, d + 1 - forward_end, 2):
+            index = offset + k
+            if k == -d or (k != d and forward[index - 1] < forward[index + 1]):
+                x = forward[index + 1]
+            else:
+                x = forward[index - 1] + 1
+            y = x - k
+            while x < len_a and y < len_b and a[a_lo + x] == b[b_lo + y]:
+                x += 1
+                y += 1
+            forward[index] = x
+            if x > len_a:
+                forward_end += 2
+            elif y > len_b:
+                forward_start += 2
+            else:
+                if x + y > best_x + best_y:
+                    best_x, best_y = x, y
+                if odd:
+                    reverse_index = offset + delta - k
+                    if 0 <= reverse_index < len(reverse) and reverse[reverse_index] != -1:
+                        if x >= len_a - reverse[reverse_index]:
+                            return a_lo + x, b_lo + y
+
+        for k in range(-d + reverse_start, d + 1 - reverse_end, 2):
+            index = offset + k
+            if k == -d or (k != d and reverse[index - 1] < reverse[index + 1]):
+                x = reverse[index + 1]
+            else:
+                x = reverse[index - 1] + 1
+            y = x - k
+            while x < len_a and y < len_b and a[a_hi - x - 1] == b[b_hi - y - 1]:
+                x += 1
+                y += 1
+            reverse[index] = x
+            if x > len_a:
+                reverse_end += 2
+            elif y > len_b:
+                reverse_start += 2
+            elif not odd:
+                forward_index = offset + delta - k
+                if 0 <= forward_index < len(forward) and forward[forward_index] != -1:
+                    forward_x = forward[forward_index]
+                    if forward_x >= len_a - x:
+                        return a_lo + forward_x, b_lo + forward_x - (forward_index - offset)
+
+    return a_hi, b_lo
+
+
+def anchored_blocks(
+    a: Sequence[Hashable],
+    b: Sequence[Hashable],
+    find_anchors: Callable[..., list[tuple[int, int, int]]],
+) -> list[tuple[int, int, int]]:
+    # Shared driver for patience and histogram diff: pin the ranges together at the
+    # anchors the strategy picks, recurse between them, and hand any range without
+    # anchors to Myers.
+    blocks: list[tuple[int, int, int]] = []
+    stack: list[tuple[int, int, int, int] | tuple[int, int, int]] = [(0, len(a), 0, len(b))]
+    while stack:
+        item = stack.pop()
+        if len(item) == 3:
+            blocks.append(item)
+            continue
+        a_lo, a_hi, b_lo, b_hi = item
+        prefix, suffix, a_lo, a_hi, b_lo, b_hi = trim_common(a, b, a_lo, a_hi, b_lo, b_hi)
+        if prefix:
+            blocks.append((a_lo - prefix, b_lo - prefix, prefix))
+        pending: list[tuple[int, int, int, int] | tuple[int, int, int]] = []
+        if a_lo < a_hi and b_lo < b_hi:
+            anchors = find_anchors(a, b, a_lo, a_hi, b_lo, b_hi)
+            if anchors:
+                next_a, next_b = a_lo, b_lo
+                for anchor_a, anchor_b, size in anchors:
+                    pending.append((next_a, anchor_a, next_b, anchor_b))
+                    pending.append((anchor_a, anchor_b, size))
+                    next_a, next_b = anchor_a + size, anchor_b + size
+                pending.append((next_a, a_hi, next_b, b_hi))
+            else:
+                pending.extend(myers_blocks(a, b, a_lo, a_hi, b_lo, b_hi))
+        if suffix:
+            pending.append((a_hi, b_hi, suffix))
+        stack.extend(reversed(pending))
+    return blocks
+
+
+def patience_anchors(
+    a: Sequence[Hashable],
+    b: Sequence[Hashable],
+    a_lo: int,
+    a_hi: int,
+    b_lo: int,
+    b_hi: int,
+) -> list[tuple[int, int, int]]:
+    # Elements that occur exactly once on each side, reduced to their longest
+    # increasing subsequence (patience sorting).
+    counts: dict[Hashable, int] = {}
+    position_a: dict[Hashable, int] = {}
+    for index in range(a_lo, a_hi):
+        token = a[index]
+        counts[token] = counts.get(token, 0) + 1
+        position_a[token] = index
+    counts_b: dict[Hashable, int] = {}
+    position_b: dict[Hashable, int] = {}
+    for index in range(b_lo, b_hi):
+        token = b[index]
+        if counts.get(token) == 1:
+            counts_b[token] = counts_b.get(token, 0) + 1
+            position_b[token] = index
+    pairs = sorted((position_a[token], position_b[token]) for token, seen in counts_b.items() if seen == 1)
+    if not pairs:
+        return []
+
+    tails: list[int] = []
+    tail_index: list[int] = []
+    previous = [-1] * len(pairs)
+    for index, (_, position) in enumerate(pairs):
+        slot = bisect.bisect_left(tails, position)
+        if slot == len(tails):
+            tails.append(position)
+            tail_index.append(index)
+        else:
+            tails[slot] = position
+            tail_index[slot] = index
+        previous[index] = tail_index[slot - 1] if slot else -1
+
+    chain: list[tuple[int, int, int]] = []
+    index = tail_index[-1]
+    while index != -1:
+        chain.append((*pairs[index], 1))
+        index = previous[index]
+    chain.reverse()
+    return chain
+
+
+def histogram_anchor(
+    a: Sequence[Hashable],
+    b: Sequence[Hashable],
+    a_lo: int,
+    a_hi: int,
+    b_lo: int,
+    b_hi: int,
+) -> list[tuple[int, int, int]]:
+    # Git's histogram heuristic: anchor on the longest common run around the
+    # element that is rarest in `a`, ignoring elements seen more than
+    # HISTOGRAM_MAX_OCCURRENCES times.
+    positions: dict[Hashable, list[int]] = {}
+    for index in range(a_lo, a_hi):
+        positions.setdefault(a[index], []).append(index)
+
+    best: tuple[int, int, int, int] | None = None
+    best_count = HISTOGRAM_MAX_OCCURRENCES
+    j = b_lo
+    while j < b_hi:
+        candidates = positions.get(b[j])
+        next_j = j + 1
+        if candidates is not None and len(candidates) <= best_count:
+            for i in candidates:
+                start_i, start_j = i, j
+                while start_i > a_lo and start_j > b_lo and a[start_i - 1] == b[start_j - 1]:
+                    start_i -= 1
+                    start_j -= 1
+                end_i, end_j = i + 1, j + 1
+                while end_i < a_hi and end_j < b_hi and a[end_i] == b[end_j]:
+                    end_i += 1
+                    end_j += 1
+                count = min(len(positions[a[k]]) for k in range(start_i, end_i))
+                size = end_i - start_i
+                if best is None or count < best_count or (count == best_count and size > best[2]):
+                    best = (start_i, start_j, size, count)
+                    best_count = count
+                next_j = max(next_j, end_j)
+        j = next_j
+
+    if best is None:
+        return []
+    return [best[:3]]
+
+
+def parse_path_pattern(pattern: str) -> list[tuple[str, Hashable]]:
+    # Splits an --ignore-path pattern into (kind, token) segments. Literal tokens are the
+    # same ones DiffNode steps produce: a key, an index, or (match key, rendered value).
+    if not pattern.startswith('$'):
+        raise SystemExit(f'Invalid --ignore-path {pattern!r}: it must start with $.')
+    decoder = json.JSONDecoder()
+    segments: list[tuple[str, Hashable]] = []
+    position = 1
+    while position < len(pattern):
+        match = PATH_SEGMENT_RE.match(pattern, position)
+        if match is None:
+            raise SystemExit(f'Invalid --ignore-path {pattern!r}: unexpected {pattern[position:]!r}.')
+        position = match.end()
+        text = match.group()
+        if text in ('.*', '[*]', '.**'):
+            kind = text.lstrip('.')
+            if not (kind == '**' and segments and segments[-1][0] == '**'):
+                segments.append((kind, None))
+        elif match['name'] is not None:
+            segments.append(('key', match['name']))
+        elif match['index'] is not None:
+            segments.append(('index', int(match['index'])))
+        elif match['quoted'] is not None:
+            segments.append(('key', json.loads(match['quoted'])))
+        else:
+            try:
+                value, position = decoder.raw_decode(pattern, position)
+            except json.JSONDecodeError:
+                value = None
+                position = len(pattern) + 1
+            if not pattern.startswith(']', position):
+                raise SystemExit(f'Invalid --ignore-path {pattern!r}: bad value in [{match["match"]}=...].')
+            position += 1
+            segments.append(('match', (match['match'], path_value(value))))
+    return segments
 
 
 def add_key(path: str, key: str) -> str:
@@ -771,6 +2319,49 @@ def path_value(value: Any) -> str:
     return json.dumps(value, ensure_ascii=False, sort_keys=True)
 
 
+class StringLruCache:
+    # functools.lru_cache bounded by the total length of the strings it keeps rather than by
+    # entry count, so a run of long strings cannot pin gigabytes. Least recently used first out.
+    def __init__(self, function: Callable[..., Any], max_chars: int) -> None:
+        self.function = function
+        self.max_chars = max_chars
+        self.chars = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: dict[Hashable, tuple[Any, int]] = {}
+        update_wrapper(self, function)
+
+    def __call__(self, *args: Any, **kwargs: Any) -> Any:
+        key = (args, *kwargs.items())
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.hits += 1
+            self._entries[key] = entry
+            return entry[0]
+        self.misses += 1
+        result = self.function(*args, **kwargs)
+        parts = (*args, *result) if type(result) is tuple else (*args, result)
+        size = sum(len(part) for part in parts if type(part) is str)
+        if size <= self.max_chars:
+            self._entries[key] = result, size
+            self.chars += size
+            while self.chars > self.max_chars:
+                self.chars -= self._entries.pop(next(iter(self._entries)))[1]
+        return result
+
+    def cache_clear(self) -> None:
+        self._entries.clear()
+        self.chars = self.hits = self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def string_lru_cache(max_chars: int) -> Callable[[Callable[..., Any]], StringLruCache]:
+    return partial(StringLruCache, max_chars=max_chars)
+
+
+@string_lru_cache(STRING_DIFF_CACHE_CHARS)
 def strip_html_text(text: str) -> str:
     s = str(text).replace('\u00a0', ' ')
     s = s.replace('&nbsp;', ' ')
@@ -798,11 +2389,15 @@ def format_value_html(value: Any, *, strip_html_tags: bool) -> str:
     return f'<pre class="value-json">{html.escape(pretty)}</pre>'
 
 
+@string_lru_cache(STRING_DIFF_CACHE_CHARS)
 def diff_string_html(old: str, new: str, *, strip_html_tags: bool) -> tuple[str, str, str]:
     old_text = strip_html_text(old) if strip_html_tags else str(old)
     new_text = strip_html_text(new) if strip_html_tags else str(new)
     old_tokens = TOKEN_RE.findall(old_text)
     new_tokens = TOKEN_RE.findall(new_text)
+    if len(old_tokens) + len(new_tokens) > STRING_DIFF_MAX_TOKENS:
+        old_tokens = old_text.splitlines(keepends=True)
+        new_tokens = new_text.splitlines(keepends=True)
     matcher = difflib.SequenceMatcher(a=old_tokens, b=new_tokens, autojunk=False)
 
     inline_parts: list[str] = []
@@ -837,6 +2432,19 @@ def diff_string_html(old: str, new: str, *, strip_html_tags: bool) -> tuple[str,
     return ''.join(inline_parts), ''.join(left_parts), ''.join(right_parts)
 
 
+def string_diff_cache_stats() -> dict[str, Any]:
+    cache = diff_string_html
+    lookups = cache.hits + cache.misses
+    return {
+        'hits': cache.hits,
+        'misses': cache.misses,
+        'hit_rate': cache.hits / lookups if lookups else 0.0,
+        'size': len(cache),
+        'chars': cache.chars,
+        'max_chars': cache.max_chars,
+    }
+
+
 def split_row(left_html: str, right_html: str) -> str:
     empty = '<span class="empty">—</span>'
     left = left_html or empty
@@ -855,6 +2463,26 @@ def css_kind_for(node: DiffNode) -> str:
     return node.kind
 
 
+def count_node_kinds(root: DiffNode | None) -> Counter[str]:
+    kinds: Counter[str] = Counter()
+    stack = [root] if root is not None else []
+    while stack:
+        node = stack.pop()
+        kinds[node.kind] += 1
+        stack.extend(node.children)
+    return kinds
+
+
+def peak_rss_bytes() -> int | None:
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes.
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
 def count_changes(node: DiffNode | None) -> Counts:
     counts = Counts()
     if node is None:
@@ -878,6 +2506,127 @@ def count_changes(node: DiffNode | None) -> Counts:
     return counts
 
 
+def iter_json_patch(root: DiffNode | None) -> Iterator[str]:
+    # RFC 6902: applying the operations in order to the old document yields the new one.
+    first = True
+    for operation in json_patch_operations(root, ''):
+        yield ('[\n  ' if first else ',\n  ') + json.dumps(operation)
+        first = False
+    yield '[]\n' if first else '\n]\n'
+
+
+def json_patch_operations(node: DiffNode | None, pointer: str) -> Iterator[dict[str, Any]]:
+    if node is None:
+        return
+    if node.kind == 'modified':
+        yield {'op': 'replace', 'path': pointer, 'value': node.new}
+        return
+    if node.kind != 'group':
+        return
+    # Object members are reached by key; array items have int (positional) or None (keyed) steps.
+    if not isinstance(node.children[0].step, str):
+        yield from array_patch_operations(node, pointer)
+        return
+
+    for child in node.children:
+        child_pointer = f'{pointer}/{json_pointer_token(child.step)}'
+        if child.kind == 'added':
+            yield {'op': 'add', 'path': child_pointer, 'value': child.new}
+        elif child.kind == 'deleted':
+            yield {'op': 'remove', 'path': child_pointer}
+        else:
+            yield from json_patch_operations(child, child_pointer)
+
+
+def array_patch_operations(node: DiffNode, pointer: str) -> Iterator[dict[str, Any]]:
+    # Changes inside surviving items go first, while old positions are still valid. Then
+    # removals back to front, then additions (and, for keyed arrays, moves) front to back.
+    children = node.children
+    for child in children:
+        if child.kind in ('group', 'modified'):
+            yield from json_patch_operations(child, f'{pointer}/{child.old_index}')
+
+    deleted = sorted((child.old_index for child in children if child.kind == 'deleted'), reverse=True)
+    for old_index in deleted:
+        yield {'op': 'remove', 'path': f'{pointer}/{old_index}'}
+
+    added = {child.new_index: child for child in children if child.kind == 'added'}
+    if children[0].step is not None:
+        for new_index in sorted(added):
+            yield {'op': 'add', 'path': f'{pointer}/{new_index}', 'value': added[new_index].new}
+        return
+
+    # Keyed arrays report every item whose position changed, so an item missing from the
+    # children sits at the same index in both arrays. Items are identified by old index.
+    new_order = {child.new_index: child.old_index for child in children if child.kind in ('group', 'modified', 'moved')}
+    new_length = max([*new_order, *added], default=-1) + 1
+    old_known = {child.old_index for child in children if child.kind != 'added'}
+    old_length = max([*old_known, *(index for index in range(new_length) if index not in new_order and index not in added)], default=-1) + 1
+    skipped = set(deleted)
+    current: list[int | None] = [index for index in range(old_length) if index not in skipped]
+    for new_index in range(new_length):
+        if new_index in added:
+            yield {'op': 'add', 'path': f'{pointer}/{new_index}', 'value': added[new_index].new}
+            current.insert(new_index, None)
+            continue
+        wanted = new_order.get(new_index, new_index)
+        if current[new_index] != wanted:
+            position = current.index(wanted, new_index + 1)
+            yield {'op': 'move', 'from': f'{pointer}/{position}', 'path': f'{pointer}/{new_index}'}
+            current.insert(new_index, current.pop(position))
+
+
+def json_pointer_token(step: str | int) -> str:
+    return str(step).replace('~', '~0').replace('/', '~1')
+
+
+def iter_ndjson(root: DiffNode | None) -> Iterator[str]:
+    for record in change_records(root):
+        yield json.dumps(record) + '\n'
+
+
+def change_records(node: DiffNode | None) -> Iterator[dict[str, Any]]:
+    # One record per change, matching what count_changes() counts.
+    if node is None:
+        return
+    if node.moved and node.kind != 'moved':
+        yield {'op': 'moved', 'path': node.path, 'old_index': node.old_index, 'new_index': node.new_index}
+    if node.kind == 'group':
+        for child in node.children:
+            yield from change_records(child)
+        return
+
+    record: dict[str, Any] = {'op': node.kind, 'path': node.path}
+    if node.kind in ('deleted', 'modified'):
+        record['old'] = node.old
+    if node.kind in ('added', 'modified'):
+        record['new'] = node.new
+    if node.type_changed:
+        record['type_changed'] = True
+    if node.old_index is not None:
+        record['old_index'] = node.old_index
+    if node.new_index is not None:
+        record['new_index'] = node.new_index
+    yield record
+
+
+def render_summary(counts: Counts) -> str:
+    return json.dumps({**asdict(counts), 'total': counts.total}) + '\n'
+
+
+def render_counts_summary(counts: Counts) -> str:
+    summary = []
+    if counts.added:
+        summary.append(f'<span class="badge added">+{counts.added} added</span>')
+    if counts.modified:
+        summary.append(f'<span class="badge modified">~{counts.modified} changed</span>')
+    if counts.deleted:
+        summary.append(f'<span class="badge deleted">-{counts.deleted} removed</span>')
+    if counts.moved:
+        summary.append(f'<span class="badge moved">↕ {counts.moved} moved</span>')
+    return ''.join(summary) or '<span class="badge muted">No changes</span>'
+
+
 def display_index(index: int | None) -> str:
     if index is None:
         return '—'
@@ -893,12 +2642,15 @@ def sanitize_name_for_file(name: str) -> str:
 def derive_output_path(args: argparse.Namespace) -> Path:
     if args.out:
         return Path(args.out)
+    suffix = OUTPUT_SUFFIXES[args.format]
     if args.input:
-        return Path('json_diff.html')
+        return Path('json_diff.html' if args.format == 'html' else f'json_diff{suffix}')
 
     old_name = sanitize_name_for_file(Path(args.file_old).stem if args.file_old else 'old')
     new_name = sanitize_name_for_file(Path(args.file_new).stem if args.file_new else 'new')
-    return Path(f'{old_name}__vs__{new_name}.diff.html')
+    if args.base:
+        return Path(f'{old_name}__merge__{new_name}{suffix}')
+    return Path(f'{old_name}__vs__{new_name}{suffix}')
 
 
 def build_title(args: argparse.Namespace) -> tuple[str, str, str]:
@@ -909,17 +2661,565 @@ def build_title(args: argparse.Namespace) -> tuple[str, str, str]:
         old_name = Path(args.file_old).name if args.file_old else 'old'
         new_name = Path(args.file_new).name if args.file_new else 'new'
 
+    if args.base:
+        # The report shows what the merge does to base.
+        old_name, new_name = Path(args.base).name, f'merged ({old_name} + {new_name})'
+
     title = args.title or f'{old_name} → {new_name}'
     return title, old_name, new_name
 
 
+def build_renderer(
+    args: argparse.Namespace,
+    counts: Counts,
+    out_path: Path,
+    conflicts: Sequence[MergeConflict] = (),
+) -> HtmlRenderer:
+    title, old_name, new_name = build_title(args)
+
+    renderer_options = dict(
+        title=title,
+        old_name=old_name,
+        new_name=new_name,
+        counts=counts,
+        strip_html_tags=args.strip_html_tags,
+        rtl=args.rtl,
+        conflicts=conflicts,
+    )
+    if args.lazy is None:
+        return HtmlRenderer(**renderer_options)
+
+    chunk_dir = None
+    if args.lazy == 'sidecar':
+        chunk_dir = out_path.with_name(f'{out_path.stem}_chunks')
+        chunk_dir.mkdir(exist_ok=True)
+        for stale in chunk_dir.glob('*.js'):
+            stale.unlink()
+    return LazyHtmlRenderer(chunk_dir=chunk_dir, **renderer_options)
+
+
+def create_builder(args: argparse.Namespace, stats: DiffStats | None = None) -> DiffBuilder:
+    match_keys = tuple(args.match_keys) if args.match_keys else DEFAULT_MATCH_KEYS
+    return DiffBuilder(
+        ignore_keys=set(args.ignore_key),
+        ignore_paths=set(args.ignore_path),
+        match_keys=match_keys,
+        array_algorithm=args.array_algorithm,
+        jobs=args.jobs,
+        infer_match_keys=args.infer_match_keys,
+        stats=stats,
+    )
+
+
+def build_diff(
+    args: argparse.Namespace, stats: DiffStats | None = None, contents: tuple[bytes, bytes] | None = None
+) -> DiffNode | None:
+    # contents: input_digests(args), when the caller has already hashed the files for a cache key.
+    builder = create_builder(args, stats)
+    # Phases are timed into a throwaway DiffStats when --stats is off.
+    timer = stats if stats is not None else DiffStats()
+
+    if args.input:
+        with timer.phase('parse'):
+            old_data, new_data = load_json_from_stdin(args.separator)
+        with timer.phase('build'):
+            return builder.build(old_data, new_data)
+
+    old_path = Path(args.file_old)
+    new_path = Path(args.file_new)
+    cache = open_diff_cache(args.cache_dir, os.getpid()) if args.cache_dir else None
+    if cache is not None:
+        with timer.phase('cache'):
+            old_content, new_content = contents or input_digests(args)
+            options = builder.digest_options()
+            old_digest = cache.get(old_content, options)
+            new_digest = old_digest if new_content == old_content else cache.get(new_content, options)
+        if old_digest is not None and old_digest == new_digest:
+            # Only documents that parsed are cached, so these need no further checks.
+            timer.shortcut = 'canonical digest cache'
+            return None
+        identical = new_content == old_content
+    else:
+        with timer.phase('compare'):
+            identical = same_file_bytes(old_path, new_path)
+    if identical:
+        # Equal bytes are only equal documents if they are JSON at all; checking one side
+        # still parses a single file and skips the diff.
+        with timer.phase('parse'):
+            if args.stream:
+                JsonSpanReader(old_path).validate()
+            else:
+                load_json_from_file(old_path)
+        timer.shortcut = 'identical bytes'
+        return None
+    if args.stream:
+        # Spans are parsed while they are diffed, so streaming has no separate parse phase.
+        with timer.phase('build'):
+            return builder.build_streaming(JsonSpanReader(old_path), JsonSpanReader(new_path))
+
+    with timer.phase('parse'):
+        old_data = load_json_from_file(old_path)
+        new_data = load_json_from_file(new_path)
+    with timer.phase('build'):
+        root = builder.build(old_data, new_data)
+    if cache is not None:
+        old_digest, new_digest = builder.root_digests
+        cache.put(old_content, options, old_digest)
+        cache.put(new_content, options, new_digest)
+    return root
+
+
+def build_merge(args: argparse.Namespace, stats: DiffStats | None = None) -> tuple[DiffNode | None, list[MergeConflict]]:
+    builder = create_builder(args, stats)
+    timer = stats if stats is not None else DiffStats()
+    with timer.phase('parse'):
+        base, ours, theirs = (load_json_from_file(Path(name)) for name in (args.base, args.file_old, args.file_new))
+    with timer.phase('merge'):
+        merged, conflicts, root = builder.merge(base, ours, theirs)
+
+    if args.merged:
+        merged_path = Path(args.merged)
+    else:
+        ours_name = sanitize_name_for_file(Path(args.file_old).stem)
+        theirs_name = sanitize_name_for_file(Path(args.file_new).stem)
+        merged_path = Path(f'{ours_name}__merge__{theirs_name}.merged.json')
+    merged_path.write_text(json.dumps(merged, ensure_ascii=False, indent=2) + '\n')
+    print(merged_path)
+    for conflict in conflicts:
+        print(f'Conflict at {conflict.path}', file=sys.stderr)
+    return root, conflicts
+
+
+@lru_cache(maxsize=None)
+def open_diff_cache(directory: str, pid: int) -> DiffCache:
+    # Keyed by pid as well, so batch workers never share a connection forked from the parent.
+    return DiffCache(Path(directory))
+
+
+def input_digests(args: argparse.Namespace) -> tuple[bytes, bytes] | None:
+    # Hashes of both input files, shared by the report and canonical caches so a --cache-dir
+    # run reads each file once before parsing it.
+    if not args.cache_dir or args.input or args.base:
+        return None
+    return file_content_digest(Path(args.file_old)), file_content_digest(Path(args.file_new))
+
+
+def report_cache_key(args: argparse.Namespace, contents: tuple[bytes, bytes] | None) -> bytes | None:
+    # Everything the rendered output depends on. Merges, stdin input and sidecar chunk files
+    # are always rebuilt.
+    if contents is None or args.lazy == 'sidecar':
+        return None
+    options = {
+        'format': args.format,
+        'title': build_title(args),
+        'match_keys': args.match_keys or DEFAULT_MATCH_KEYS,
+        'infer_match_keys': args.infer_match_keys,
+        'ignore_keys': sorted(args.ignore_key),
+        'ignore_paths': sorted(args.ignore_path),
+        'strip_html_tags': args.strip_html_tags,
+        'rtl': args.rtl,
+        'array_algorithm': args.array_algorithm,
+        'lazy': args.lazy,
+    }
+    key = hashlib.blake2b(digest_size=32)
+    # The script itself is part of the key, so an upgraded json_diff_html never serves old reports.
+    key.update(tool_fingerprint())
+    key.update(contents[0])
+    key.update(contents[1])
+    key.update(json.dumps(options, sort_keys=True).encode())
+    return key.digest()
+
+
+@lru_cache(maxsize=None)
+def tool_fingerprint() -> bytes:
+    return hashlib.blake2b(Path(__file__).read_bytes()).digest()
+
+
+def record_report(
+    chunks: Iterable[str],
+    *,
+    cache: DiffCache,
+    key: bytes,
+    counts: Counts,
+    max_bytes: int,
+) -> Iterator[str]:
+    # Passes the output through while compressing a copy, stored once it is complete unless it
+    # alone would outgrow the cache.
+    compressor = zlib.compressobj()
+    parts: list[bytes] | None = []
+    size = 0
+    for chunk in chunks:
+        yield chunk
+        if parts is not None:
+            part = compressor.compress(chunk.encode('utf-8'))
+            size += len(part)
+            parts.append(part)
+            if size > max_bytes:
+                parts = None
+    if parts is not None:
+        parts.append(compressor.flush())
+        cache.put_report(key, counts, b''.join(parts), max_bytes)
+
+
+def iter_cached_report(body: bytes) -> Iterator[str]:
+    inflater = zlib.decompressobj()
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    for start in range(0, len(body), IO_CHUNK_SIZE):
+        yield decoder.decode(inflater.decompress(body[start:start + IO_CHUNK_SIZE]))
+    yield decoder.decode(inflater.flush(), final=True)
+
+
+def render_output(
+    args: argparse.Namespace,
+    root: DiffNode | None,
+    out_path: Path,
+    conflicts: Sequence[MergeConflict] = (),
+) -> Iterator[str]:
+    if args.format == 'jsonpatch':
+        return iter_json_patch(root)
+    if args.format == 'ndjson':
+        return iter_ndjson(root)
+    if args.format == 'summary':
+        return iter([render_summary(count_changes(root))])
+    return build_renderer(args, count_changes(root), out_path, conflicts).render_chunks(root)
+
+
+def write_output(chunks: Iterable[str], out_path: Path, *, atomic: bool = False) -> None:
+    if out_path == Path('-'):
+        sys.stdout.writelines(chunks)
+    elif not atomic:
+        with out_path.open('w') as fh:
+            fh.writelines(chunks)
+    else:
+        # Written next to the target and renamed over it, so a browser reloading the report
+        # never sees half of it.
+        fd, temp_name = tempfile.mkstemp(dir=out_path.resolve().parent, prefix=f'.{out_path.name}.', suffix='.tmp')
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(fd, 0o666 & ~umask)
+        try:
+            with open(fd, 'w') as fh:
+                fh.writelines(chunks)
+            os.replace(temp_name, out_path)
+        except BaseException:
+            os.unlink(temp_name)
+            raise
+
+
+def file_stamp(path: Path) -> tuple[int, int, int] | None:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        # Editors that save by rename briefly leave no file behind.
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+def run_watch(args: argparse.Namespace) -> int:
+    builder = create_builder(args)
+    paths = (Path(args.file_old), Path(args.file_new))
+    documents: list[Any] = [None, None]
+    loaded = [False, False]
+    stamps: list[tuple[int, int, int] | None] = [None, None]
+    out_path = derive_output_path(args)
+    opened = False
+    print(f'Watching {paths[0]} and {paths[1]}; press Ctrl+C to stop.', file=sys.stderr)
+
+    try:
+        while True:
+            current = [file_stamp(path) for path in paths]
+            changed = [side for side in (0, 1) if current[side] is not None and current[side] != stamps[side]]
+            if not changed:
+                time.sleep(WATCH_INTERVAL)
+                continue
+
+            # Debounce: wait until the files stop changing before reading them.
+            while True:
+                time.sleep(WATCH_DEBOUNCE)
+                settled = [file_stamp(path) for path in paths]
+                if settled == current:
+                    break
+                current = settled
+            reloaded = False
+            for side in changed:
+                stamps[side] = current[side]
+                try:
+                    document = load_json_from_file(paths[side])
+                except SystemExit as exc:
+                    # Keep showing the last good version while the file is mid-edit.
+                    print(exc, file=sys.stderr)
+                    continue
+                builder.reindex(documents[side], document)
+                documents[side] = document
+                loaded[side] = reloaded = True
+            if not reloaded or not all(loaded):
+                continue
+
+            root = builder.diff_indexed(documents[0], documents[1])
+            write_output(render_output(args, root, out_path), out_path, atomic=True)
+            print(f'{time.strftime("%H:%M:%S")} {out_path}: {count_changes(root).total} changes', file=sys.stderr)
+            if args.open and args.format == 'html' and not opened:
+                opened = True
+                try:
+                    webbrowser.open(out_path.resolve().as_uri())
+                except Exception:
+                    pass
+    except KeyboardInterrupt:
+        return 0
+
+
+def render_stats_text(report: Mapping[str, Any]) -> str:
+    lines = ['Phases:']
+    for name, seconds in report['phases'].items():
+        lines.append(f'  {name:<10}{seconds:>10.3f}s')
+    if report['shortcut']:
+        lines.append(f'  (no diff built: {report["shortcut"]})')
+    arrays = report['arrays']
+    lines.append(
+        f'Arrays: {arrays["aligned"]:,} aligned, {arrays["match_key_seconds"]:.3f}s choosing match keys, '
+        f'{arrays["alignment_seconds"]:.3f}s in alignment'
+    )
+    for entry in arrays['largest']:
+        path = entry['path'] or '(unchanged)'
+        lines.append(f'  {entry["old_items"]:>10,} -> {entry["new_items"]:<10,} {entry["aligned_by"]:<24} {path}')
+    nodes = report['nodes']
+    lines.append('Nodes: ' + (', '.join(f'{kind} {total:,}' for kind, total in sorted(nodes.items())) or 'none'))
+    cache = report['string_diff_cache']
+    lines.append(
+        f'String diff cache: {cache["hits"]:,} hits, {cache["misses"]:,} misses '
+        f'({cache["hit_rate"]:.1%} hit rate, {cache["size"]:,} entries, '
+        f'{cache["chars"]:,}/{cache["max_chars"]:,} characters)'
+    )
+    if report['peak_rss_bytes'] is not None:
+        lines.append(f'Peak RSS: {report["peak_rss_bytes"] / 2**20:,.1f} MB')
+    return '\n'.join(lines) + '\n'
+
+
+def collect_batch_pairs(args: argparse.Namespace) -> list[BatchPair]:
+    pairs: list[BatchPair] = []
+    if args.manifest:
+        manifest = Path(args.manifest)
+        try:
+            lines = manifest.read_text().splitlines()
+        except FileNotFoundError as exc:
+            raise SystemExit(f'File not found: {manifest}') from exc
+        stems: Counter[str] = Counter()
+        for number, line in enumerate(lines, 1):
+            if not line.strip() or line.lstrip().startswith('#'):
+                continue
+            fields = line.split('\t')
+            if len(fields) not in (2, 3):
+                raise SystemExit(f'{manifest}:{number}: expected old<TAB>new or old<TAB>new<TAB>name.')
+            old, new = (manifest.parent / value.strip() for value in fields[:2])
+            name = fields[2].strip() if len(fields) == 3 else f'{old.name} → {new.name}'
+            stem = sanitize_name_for_file(fields[2].strip() if len(fields) == 3 else f'{old.stem}__vs__{new.stem}')
+            stems[stem] += 1
+            if stems[stem] > 1:
+                stem = f'{stem}-{stems[stem]}'
+            pairs.append(BatchPair(name=name, stem=stem, old=old, new=new))
+        return pairs
+
+    # Two directories: pair up *.json files by their path relative to each root.
+    old_root = Path(args.file_old)
+    new_root = Path(args.file_new)
+    old_files = {path.relative_to(old_root) for path in old_root.rglob('*.json') if path.is_file()}
+    new_files = {path.relative_to(new_root) for path in new_root.rglob('*.json') if path.is_file()}
+    for relative in sorted(old_files | new_files):
+        pairs.append(
+            BatchPair(
+                name=relative.as_posix(),
+                stem=relative.with_suffix('').as_posix(),
+                old=old_root / relative if relative in old_files else None,
+                new=new_root / relative if relative in new_files else None,
+            )
+        )
+    return pairs
+
+
+def run_batch_pair(args: argparse.Namespace, pair: BatchPair, *, out_dir: Path) -> BatchResult:
+    if pair.old is None:
+        return BatchResult(pair.name, 'added')
+    if pair.new is None:
+        return BatchResult(pair.name, 'deleted')
+
+    # Every pair runs with the same options; only the inputs differ. Pairs are the unit of
+    # parallelism here, so each diff runs serially.
+    pair_args = argparse.Namespace(**{**vars(args), 'file_old': str(pair.old), 'file_new': str(pair.new), 'title': None, 'jobs': 1})
+    report = out_dir / f'{pair.stem}{OUTPUT_SUFFIXES[args.format]}'
+    # A pair that cannot be read, parsed or written is reported in its row, not allowed to
+    # abort the batch before summary.json and index.html are written.
+    try:
+        contents = input_digests(pair_args)
+        key = report_cache_key(pair_args, contents)
+        cached = open_diff_cache(args.cache_dir, os.getpid()).get_report(key) if key is not None else None
+        if cached is not None:
+            counts, body = cached
+            if not counts.total:
+                return BatchResult(pair.name, 'identical')
+            report.parent.mkdir(parents=True, exist_ok=True)
+            write_output(iter_cached_report(body), report)
+            return BatchResult(pair.name, 'changed', counts, report.relative_to(out_dir).as_posix())
+        root = build_diff(pair_args, contents=contents)
+        if root is None:
+            return BatchResult(pair.name, 'identical')
+
+        counts = count_changes(root)
+        chunks = render_output(pair_args, root, report)
+        if key is not None:
+            cache = open_diff_cache(args.cache_dir, os.getpid())
+            chunks = record_report(chunks, cache=cache, key=key, counts=counts, max_bytes=args.cache_max_mb << 20)
+        report.parent.mkdir(parents=True, exist_ok=True)
+        write_output(chunks, report)
+    except (SystemExit, ValueError, OSError) as exc:
+        return BatchResult(pair.name, 'error', error=str(exc))
+    return BatchResult(pair.name, 'changed', counts, report.relative_to(out_dir).as_posix())
+
+
+def run_batch(args: argparse.Namespace) -> int:
+    pairs = collect_batch_pairs(args)
+    out_dir = Path(args.out or 'json_diff_batch')
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    task = partial(run_batch_pair, args, out_dir=out_dir)
+    if args.jobs > 1 and len(pairs) > 1:
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            results = list(pool.map(task, pairs, chunksize=max(1, len(pairs) // (args.jobs * 8))))
+    else:
+        results = [task(pair) for pair in pairs]
+
+    totals = Counts()
+    for result in results:
+        totals.add(result.counts)
+    statuses = Counter(result.status for result in results)
+    rollup = {
+        **asdict(totals),
+        'total': totals.total,
+        'pairs': len(results),
+        'files': {status: statuses[status] for status in BATCH_STATUSES},
+    }
+    (out_dir / 'summary.json').write_text(json.dumps(rollup) + '\n')
+
+    index = out_dir / 'index.html'
+    title = args.title or f'{len(results)} JSON diffs'
+    index.write_text(render_batch_index(results, totals, statuses, title=title))
+    print(index)
+    if args.open:
+        try:
+            webbrowser.open(index.resolve().as_uri())
+        except Exception:
+            pass
+
+    return 0 if statuses['identical'] == len(results) else 1
+
+
+def render_batch_index(results: list[BatchResult], totals: Counts, statuses: Counter[str], *, title: str) -> str:
+    rows = []
+    for result in results:
+        name = html.escape(result.name)
+        if result.report is not None:
+            name = f'<a href="{html.escape(quote(result.report))}">{name}</a>'
+        if result.status == 'changed':
+            detail = render_counts_summary(result.counts)
+        elif result.status == 'error':
+            detail = f'<span class="error">{html.escape(result.error or "")}</span>'
+        else:
+            detail = ''
+        rows.append(
+            f'<tr class="status-{result.status}"><td>{name}</td>'
+            f'<td><span class="status">{BATCH_STATUS_LABELS[result.status]}</span></td><td>{detail}</td></tr>\n'
+        )
+    files = ' · '.join(
+        f'{statuses[status]} {BATCH_STATUS_LABELS[status]}' for status in BATCH_STATUSES if statuses[status]
+    )
+
+    return f'''<!doctype html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>{html.escape(title)}</title>
+<style>
+body {{ margin: 0; background: #fafafa; color: #111827; font: 14px/1.55 system-ui, -apple-system, BlinkMacSystemFont, "Segoe UI", sans-serif; }}
+.container {{ max-width: 1180px; margin: 0 auto; padding: 18px; }}
+.card {{ background: #fff; border: 1px solid #e5e7eb; border-radius: 12px; padding: 16px 18px; margin-bottom: 14px; }}
+h1 {{ margin: 0; font-size: 1.15rem; }}
+.subtitle {{ margin-top: 6px; color: #6b7280; }}
+.summary-row {{ display: flex; flex-wrap: wrap; gap: 8px; margin-top: 12px; }}
+.badge {{ display: inline-flex; padding: 3px 10px; border-radius: 999px; font-size: 12px; font-weight: 700; white-space: nowrap; margin-right: 4px; }}
+.badge.added {{ background: #e6ffe6; color: #166534; }}
+.badge.deleted {{ background: #ffe6e6; color: #991b1b; }}
+.badge.modified {{ background: #fef3c7; color: #92400e; }}
+.badge.moved {{ background: #ede9fe; color: #5b21b6; }}
+.badge.muted {{ background: #f3f4f6; color: #4b5563; }}
+table {{ width: 100%; border-collapse: collapse; }}
+td {{ padding: 6px 8px; border-top: 1px solid #e5e7eb; vertical-align: top; word-break: break-word; }}
+.status {{ color: #6b7280; font-size: 12px; white-space: nowrap; }}
+.status-identical {{ color: #6b7280; }}
+.status-error .error {{ color: #991b1b; font-size: 12px; }}
+</style>
+</head>
+<body>
+  <div class="container">
+    <section class="card">
+      <h1>{html.escape(title)}</h1>
+      <div class="subtitle">{files}</div>
+      <div class="summary-row">{render_counts_summary(totals)}</div>
+    </section>
+    <section class="card">
+      <table>
+{''.join(rows)}
+      </table>
+    </section>
+  </div>
+</body>
+</html>
+'''
+
+
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(
-        description='Generate a standalone HTML diff for two JSON files.',
+        description='Generate a standalone HTML diff for two JSON files. Given two directories, '
+        'diffs every *.json file pair with the same relative path and writes an index page.',
     )
-    parser.add_argument('file_old', nargs='?', help='The old JSON file')
+    parser.add_argument('file_old', nargs='?', help='The old JSON file (ours, with --base)')
     parser.add_argument('file_new', nargs='?', help='The new JSON file')
-    parser.add_argument('-o', '--out', help='Write the HTML diff to this file. Use - for stdout.')
+    parser.add_argument(
+        '-o',
+        '--out',
+        help='Write the diff to this file. Use - for stdout. In batch mode, the output directory '
+        '(default: json_diff_batch).',
+    )
+    parser.add_argument(
+        '--manifest',
+        help='Batch mode: diff every pair listed in this file, one "old<TAB>new" or "old<TAB>new<TAB>name" '
+        'per line, paths relative to the manifest. Reports for changed pairs, index.html and '
+        'summary.json go to the --out directory.',
+    )
+    parser.add_argument(
+        '-f',
+        '--format',
+        choices=tuple(OUTPUT_SUFFIXES),
+        default='html',
+        help='html is the interactive report; jsonpatch writes an RFC 6902 patch from old to new; '
+        'ndjson writes one JSON record per change; summary writes only the change counts. Default: html.',
+    )
+    parser.add_argument(
+        '--watch',
+        action='store_true',
+        help='Keep running and rewrite the report whenever either JSON file changes. Only the changed '
+        'file is parsed again, and unchanged subtrees are skipped by digest.',
+    )
+    parser.add_argument(
+        '--base',
+        help='Three-way merge: the common ancestor of the two JSON files, which are read as ours and '
+        'theirs. Writes the merged document and reports what the merge changed in base; conflicts keep '
+        'ours and are listed in the report. Exits 1 when there are conflicts.',
+    )
+    parser.add_argument(
+        '--merged',
+        metavar='FILE',
+        help='Where --base writes the merged document. Default: <ours>__merge__<theirs>.merged.json.',
+    )
     parser.add_argument(
         '-i',
         '--input',
@@ -939,7 +3239,17 @@ def parse_args() -> argparse.Namespace:
         '--match-key',
         action='append',
         dest='match_keys',
-        help='Array object key used to match items across lists. Repeat to add more keys.',
+        help='Array object key used to match items across lists. Repeat to add more keys. '
+        'Default: id, _id, slug, key, else a key column inferred from the data '
+        '(see --no-infer-match-key).',
+    )
+    parser.add_argument(
+        '--no-infer-match-key',
+        action='store_false',
+        dest='infer_match_keys',
+        help='Diff arrays of objects by position when none of the match keys fit. By default a '
+        'str/int column that is unique on both sides and mostly shared is used as their match key, '
+        'so moved, added and deleted items are reported as with --match-key.',
     )
     parser.add_argument(
         '--ignore-key',
@@ -951,60 +3261,168 @@ def parse_args() -> argparse.Namespace:
         '--ignore-path',
         action='append',
         default=[],
-        help='Ignore this exact JSON path. Example: $.meta.updated_at',
+        help='Ignore this JSON path and everything below it. Repeatable. * matches any key, [*] any '
+        'array item and ** any number of levels. Example: $.items[*].updated_at or $.**.etag',
     )
     parser.add_argument(
         '--strip-html-tags',
         action='store_true',
         help='Strip HTML tags from string values before diffing and rendering them.',
     )
+    parser.add_argument(
+        '--array-algorithm',
+        choices=ARRAY_ALGORITHMS,
+        default='auto',
+        help='How arrays without a match key are aligned. auto uses difflib for small arrays and '
+        'patience for large or highly repetitive ones. Default: auto.',
+    )
+    parser.add_argument(
+        '--stream',
+        action='store_true',
+        help='Walk both files incrementally from a memory map and only parse the subtrees that differ. '
+        'Keeps memory low for multi-GB inputs.',
+    )
+    parser.add_argument(
+        '--cache-dir',
+        help='Cache results in this directory (e.g. ~/.cache/json_diff_html). A pair of files rendered '
+        'before with the same options is written straight from the cache, and files that only differ in '
+        'whitespace or key order are reported equal without being parsed.',
+    )
+    parser.add_argument(
+        '--cache-max-mb',
+        type=int,
+        default=1024,
+        help='Size limit for reports kept in --cache-dir; the least recently used go first. Default: 1024.',
+    )
+    parser.add_argument(
+        '--lazy',
+        choices=LAZY_MODES,
+        help='Write a report that opens with collapsed top-level groups and loads group bodies on expand. '
+        'embed keeps the compressed chunks inside the HTML file; sidecar writes them to a '
+        '<output>_chunks directory next to it.',
+    )
+    parser.add_argument(
+        '--stats',
+        action='store_true',
+        help='Print per-phase wall time, node counts, the largest arrays aligned, cache hits and peak '
+        'memory to stderr.',
+    )
+    parser.add_argument(
+        '--stats-json',
+        metavar='FILE',
+        help='Write the --stats data to FILE as JSON (implies collecting it).',
+    )
+    parser.add_argument(
+        '--profile',
+        metavar='FILE',
+        help='Run under cProfile and write the pstats data to FILE.',
+    )
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        type=int,
+        default=1,
+        help='Diff the children of large objects and keyed arrays in this many worker processes, '
+        'or in batch mode, this many file pairs at a time. Output is identical to a serial run. Default: 1.',
+    )
     return parser.parse_args()
 
 
 def main() -> int:
     args = parse_args()
 
-    if args.input:
-        old_data, new_data = load_json_from_stdin(args.separator)
-    else:
-        if not args.file_old or not args.file_new:
-            raise SystemExit('Please provide both JSON files, or use --input.')
-        old_data = load_json_from_file(Path(args.file_old))
-        new_data = load_json_from_file(Path(args.file_new))
-
-    match_keys = tuple(args.match_keys) if args.match_keys else DEFAULT_MATCH_KEYS
-    builder = DiffBuilder(
-        ignore_keys=set(args.ignore_key),
-        ignore_paths=set(args.ignore_path),
-        match_keys=match_keys,
-    )
-    root = builder.build(old_data, new_data)
-    counts = count_changes(root)
+    if args.stream and args.input:
+        raise SystemExit('--stream needs two JSON files; it cannot be combined with --input.')
+    if args.manifest and (args.input or args.file_old or args.file_new):
+        raise SystemExit('--manifest replaces the JSON file arguments and --input.')
+    if not args.input and not args.manifest and (not args.file_old or not args.file_new):
+        raise SystemExit('Please provide both JSON files, or use --input.')
+    if args.jobs < 1:
+        raise SystemExit('--jobs must be at least 1.')
+    if args.base and (args.input or args.stream or args.manifest):
+        raise SystemExit('--base merges two JSON files; it cannot be combined with --input, --stream or --manifest.')
+    if args.watch and (args.input or args.stream or args.base or args.manifest or args.out == '-'):
+        raise SystemExit('--watch rewrites a report file from two JSON files; it cannot be combined with '
+                         '--input, --stream, --base, --manifest or stdout output.')
+    if args.merged and not args.base:
+        raise SystemExit('--merged only applies to a three-way merge with --base.')
+    if args.lazy and args.format != 'html':
+        raise SystemExit('--lazy only applies to --format html.')
+    if args.lazy == 'sidecar' and args.out == '-':
+        raise SystemExit('--lazy sidecar needs an output file; it cannot write to stdout.')
+
+    if args.manifest or (not args.input and Path(args.file_old).is_dir() and Path(args.file_new).is_dir()):
+        if args.out == '-':
+            raise SystemExit('Batch mode writes a directory of reports; it cannot write to stdout.')
+        if args.stats or args.stats_json or args.profile:
+            raise SystemExit('--stats and --profile apply to a single pair; they cannot be used in batch mode.')
+        if args.watch:
+            raise SystemExit('--watch follows a single pair of files; it cannot be used in batch mode.')
+        return run_batch(args)
+
+    if args.watch:
+        return run_watch(args)
+
+    stats = DiffStats() if args.stats or args.stats_json else None
+    if args.profile:
+        profiler = cProfile.Profile()
+        exit_code = profiler.runcall(run_single, args, stats)
+        profiler.dump_stats(args.profile)
+        print(f'Profile written to {args.profile} (view with: python -m pstats {args.profile})', file=sys.stderr)
+        return exit_code
+    return run_single(args, stats)
+
+
+def run_single(args: argparse.Namespace, stats: DiffStats | None) -> int:
     out_path = derive_output_path(args)
-    title, old_name, new_name = build_title(args)
-
-    renderer = HtmlRenderer(
-        title=title,
-        old_name=old_name,
-        new_name=new_name,
-        counts=counts,
-        strip_html_tags=args.strip_html_tags,
-        rtl=args.rtl,
-    )
-    document = renderer.render_document(root)
-
-    if out_path == Path('-'):
-        sys.stdout.write(document)
+    timer = stats if stats is not None else DiffStats()
+    root = None
+    conflicts: list[MergeConflict] = []
+
+    with timer.phase('cache'):
+        contents = input_digests(args)
+        key = report_cache_key(args, contents)
+        cache = open_diff_cache(args.cache_dir, os.getpid()) if key is not None else None
+        cached = cache.get_report(key) if cache is not None else None
+    if cached is not None:
+        timer.shortcut = 'report cache'
+        counts, body = cached
+        with timer.phase('render'):
+            write_output(iter_cached_report(body), out_path)
+        exit_code = 1 if counts.total else 0
     else:
-        out_path.write_text(document)
+        if args.base:
+            root, conflicts = build_merge(args, stats)
+            exit_code = 1 if conflicts else 0
+        else:
+            root = build_diff(args, stats, contents)
+            exit_code = 0 if root is None else 1
+        with timer.phase('render'):
+            chunks = render_output(args, root, out_path, conflicts)
+            if cache is not None:
+                chunks = record_report(
+                    chunks,
+                    cache=cache,
+                    key=key,
+                    counts=count_changes(root),
+                    max_bytes=args.cache_max_mb << 20,
+                )
+            write_output(chunks, out_path)
+    if out_path != Path('-'):
         print(out_path)
-        if args.open:
+        if args.open and args.format == 'html':
             try:
                 webbrowser.open(out_path.resolve().as_uri())
             except Exception:
                 pass
 
-    return 0 if root is None else 1
+    if stats is not None:
+        report = stats.report(root)
+        if args.stats_json:
+            Path(args.stats_json).write_text(json.dumps(report, indent=2) + '\n')
+        if args.stats:
+            sys.stderr.write(render_stats_text(report))
+    return exit_code
 
 
 if __name__ == '__main__':
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import json
+import mmap
+import os
+from pathlib import Path
+from typing import Any
+
+# Shared JSON parsing for the scripts in this directory. orjson, or failing that pysimdjson, is
+# used when installed. Anything the fast backend rejects is parsed again with the stdlib, so
+# results and errors (json.JSONDecodeError with lineno/colno) are the same as plain json.loads:
+# orjson refuses NaN, Infinity and lone surrogates, which json accepts. Integers beyond 64 bits
+# are not always refused (older orjson turns them into floats), so input holding a long integer
+# literal goes straight to the stdlib.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
+JSONDecodeError = json.JSONDecodeError
+
+# 2**64 has 20 digits; a literal that long may not fit. Digits are all mapped to 0 so one fast
+# find spots runs of them.
+LONG_INTEGER_DIGITS = 20
+_DIGITS_TO_ZERO = bytes.maketrans(b'123456789', b'000000000')
+# has_long_integer() reads the data this many bytes at a time.
+SCAN_CHUNK = 1 << 20
+
+if orjson is not None:
+    BACKEND = 'orjson'
+    _fast_loads = orjson.loads
+elif simdjson is not None:
+    BACKEND = 'simdjson'
+    _fast_loads = simdjson.loads
+else:
+    BACKEND = 'json'
+    _fast_loads = None
+
+
+def has_long_integer(data: str | bytes | memoryview | mmap.mmap) -> bool:
+    # Whether a run of LONG_INTEGER_DIGITS digits starts a number (not a fraction or exponent).
+    # Runs inside strings count too, which only costs a slower parse. The data is scanned a
+    # chunk at a time, so a memory map is never copied whole. Each chunk also takes in the two
+    # bytes before it (a sign and what precedes it) and a run's worth after it; a run that starts
+    # before the chunk was already judged with the chunk it starts in.
+    run = b'0' * LONG_INTEGER_DIGITS
+    for offset in range(0, len(data), SCAN_CHUNK):
+        first = max(0, offset - 2)
+        chunk = data[first:offset + SCAN_CHUNK + LONG_INTEGER_DIGITS]
+        digits = (chunk.encode() if isinstance(chunk, str) else bytes(chunk)).translate(_DIGITS_TO_ZERO)
+        pos = digits.find(run)
+        while pos >= 0:
+            start = pos
+            while start and digits[start - 1] == 0x30:
+                start -= 1
+            if first + start >= offset:
+                before = start - 1
+                if before >= 0 and digits[before] == 0x2D:  # a minus sign
+                    before -= 1
+                if before < 0 or digits[before] not in b'.eE+-':
+                    return True
+            end = pos + LONG_INTEGER_DIGITS
+            while end < len(digits) and digits[end] == 0x30:
+                end += 1
+            pos = digits.find(run, end)
+    return False
+
+
+def loads(data: str | bytes | memoryview) -> Any:
+    if _fast_loads is not None and not has_long_integer(data):
+        try:
+            return _fast_loads(data)
+        except (ValueError, RuntimeError):
+            pass
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    return json.loads(data)
+
+
+def load_path(path: Path) -> Any:
+    with Path(path).open('rb') as fh:
+        # orjson parses straight out of a read-only memory map; the others need a bytes copy.
+        if BACKEND != 'orjson' or os.fstat(fh.fileno()).st_size == 0:
+            return loads(fh.read())
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+            return loads(view)
@@ -4,20 +4,14 @@ import sys
 import sqlite3
 import tomli_w
 from pathlib import Path
-import json
-import regex as re
 
-to_toml = lambda s: tomli_w.dumps(s, multiline_strings=True)
+import json_loader
 
-def apply_repls(text, repls):
-    for r in repls:
-        text = re.sub(r[1], r[2], text) if r[0] else text.replace(r[1], r[2])
-    return text
+to_toml = lambda s: tomli_w.dumps(s, multiline_strings=True)
 
 is_file = len(sys.argv) > 1
 file = sys.argv[1] if is_file else sys.stdin
-data_str = open(file).read() if is_file else sys.stdin.read()
-data = json.loads(data_str)
+data = json_loader.load_path(Path(file)) if is_file else json_loader.loads(sys.stdin.buffer.read())
 if is_file:
     Path(f'{file[:file.rfind(".")]}.toml').write_text(to_toml({'data': data}))
 else:
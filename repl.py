@@ -1,16 +1,78 @@
 #!/usr/bin/env python3
 
 import sys
-import regex as re
+import time
+from argparse import ArgumentParser
+from pathlib import Path
 
-def apply_repls(text, repls):
-    for r in repls:
-        text = re.sub(r[1], r[2], text) if r[0] else text.replace(r[1], r[2])
-    return text
+from repl_engine import CHUNK_SIZE, OVERLAP, apply_repls, compile_repls, describe_rule, iter_chunks, load_rules, stream_repls
 
-repls = []
-for r in sys.argv[1:]:
-    r = r.split(',')
-    repls.append((int(r[0]), r[1], r[2]))
 
-sys.stdout.write(apply_repls(sys.stdin.read(), repls))
+def parse_args():
+    parser = ArgumentParser(description='Apply replacement rules to stdin and write the result to stdout.')
+    parser.add_argument('rules', nargs='*', help='Rules as is_regex,pattern,replacement, e.g. 0,foo,bar or 1,\\d+,N (applied after those from --rules)')
+    parser.add_argument('-r', '--rules', dest='rules_file', type=Path, help='TOML or JSON rules file, for rules whose pattern or replacement contains a comma')
+    parser.add_argument('--cache-dir', type=Path, help='Keep the compiled rules here (e.g. ~/.cache/repl), so later runs with the same rules start without compiling them')
+    parser.add_argument('--stats', action='store_true', help='Print replacements per rule and time per pass to stderr')
+    parser.add_argument('--stream', action='store_true', help='Write output as input arrives, in constant memory')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Characters read at a time with --stream')
+    parser.add_argument('--overlap', type=int, default=OVERLAP, help='How far a regex match may reach across a chunk boundary with --stream (not needed when every rule stays within a line)')
+    args = parser.parse_args()
+    if args.stats and args.stream:
+        parser.error('--stats counts replacements per pass and cannot be combined with --stream')
+    return args
+
+
+def apply_with_stats(repls, cache_dir, load_seconds):
+    # Like apply_repls, one pass at a time, then a per-rule and per-pass report on stderr.
+    timings = {'load rules': load_seconds}
+    phase = time.perf_counter()
+    steps = compile_repls(repls, cache_dir)
+    timings['compile'] = time.perf_counter() - phase
+    phase = time.perf_counter()
+    text = sys.stdin.read()
+    timings['read'] = time.perf_counter() - phase
+    counts = [0] * len(repls)
+    pass_times = []
+    for _, step in steps:
+        phase = time.perf_counter()
+        text = step(text, counts)
+        pass_times.append(time.perf_counter() - phase)
+    timings['replace'] = sum(pass_times)
+    phase = time.perf_counter()
+    sys.stdout.write(text)
+    sys.stdout.flush()
+    timings['write'] = time.perf_counter() - phase
+
+    pass_of = {rule.index: number for number, (rules, _) in enumerate(steps, 1) for rule in rules}
+    print(f'{"hits":>10}  {"pass":>4}  rule', file=sys.stderr)
+    for index, rule in enumerate(repls):
+        print(f'{counts[index]:>10,}  {pass_of[index]:>4}  {index + 1}: {describe_rule(rule)}', file=sys.stderr)
+    print(f'\n{"time":>10}  {"pass":>4}  rules', file=sys.stderr)
+    for number, ((rules, _), seconds) in enumerate(zip(steps, pass_times), 1):
+        first, last = rules[0].index + 1, rules[-1].index + 1
+        print(f'{seconds:>9.4f}s  {number:>4}  {first if first == last else f"{first}-{last}"}', file=sys.stderr)
+    print('\n' + ', '.join(f'{name} {seconds:.4f}s' for name, seconds in timings.items()), file=sys.stderr)
+
+
+def main():
+    args = parse_args()
+    started = time.perf_counter()
+    repls = load_rules(args.rules_file) if args.rules_file else []
+    for r in args.rules:
+        r = r.split(',')
+        repls.append((int(r[0]), r[1], r[2]))
+
+    if args.stream:
+        for chunk in stream_repls(iter_chunks(sys.stdin, args.chunk_size), repls, args.overlap, args.cache_dir):
+            sys.stdout.write(chunk)
+            sys.stdout.flush()
+    elif args.stats:
+        apply_with_stats(repls, args.cache_dir, time.perf_counter() - started)
+    else:
+        sys.stdout.write(apply_repls(sys.stdin.read(), repls, cache_dir=args.cache_dir))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+from __future__ import annotations
+
+import argparse
+import random
+import re
+import sys
+import time
+import unicodedata
+from collections.abc import Callable
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from repl_engine import apply_repls, apply_repls_sequential, compile_repls  # noqa: E402
+
+RULE_SETS: dict[str, Callable[[random.Random, int], list[tuple[int, str, str]]]] = {}
+LETTERS = 'abcdefghijklmnopqrstuvwxyz'
+
+
+def rule_set(name: str):
+    def register(func):
+        RULE_SETS[name] = func
+        return func
+    return register
+
+
+def make_word(rng: random.Random) -> str:
+    return ''.join(rng.choices(LETTERS, k=rng.randint(3, 9)))
+
+
+def make_text(rng: random.Random, vocabulary: list[str], size: int) -> str:
+    # Words from the vocabulary mixed with accented words, dates and punctuation the rules target.
+    extra = ['àéï', 'Ωμέγα', 'ŝŧřő', '2024-01-31', 'x', 'y', '...', '--', '!!', '?!', '«»']
+    parts, length = [], 0
+    while length < size:
+        part = rng.choice(vocabulary) if rng.random() < 0.9 else rng.choice(extra)
+        parts.append(part)
+        length += len(part) + 1
+    return ' '.join(parts)
+
+
+@rule_set('char-map')
+def char_map(rng: random.Random, count: int) -> list[tuple[int, str, str]]:
+    # Character normalisation tables: one single-character rule per code point.
+    sources = [chr(code) for code in range(0xC0, 0x250) if chr(code).isalpha()]
+    return [(0, char, chr(ord('A') + index % 26)) for index, char in enumerate(rng.sample(sources, min(count, len(sources))))]
+
+
+@rule_set('words')
+def words(rng: random.Random, count: int) -> list[tuple[int, str, str]]:
+    # Whole-word spelling fixes; the replacements use capitals so no rule feeds another.
+    return [(0, word, word.upper()) for word in dict.fromkeys(make_word(rng) for _ in range(count))]
+
+
+@rule_set('regex')
+def regexes(rng: random.Random, count: int) -> list[tuple[int, str, str]]:
+    # Regex clean-ups over disjoint alphabets: dates, quotes and runs of one punctuation mark.
+    marks = [chr(code) for code in range(0x21, 0x2E00) if unicodedata.category(chr(code)).startswith('P') and chr(code) not in '«»\\']
+    rules = [(1, r'\d{4}-\d\d-\d\d', 'DATE'), (1, '[«»]', '"')]
+    rules += [(1, f'{re.escape(mark)}{{2,}}', mark) for mark in marks]
+    return rules[:count]
+
+
+@rule_set('mixed')
+def mixed(rng: random.Random, count: int) -> list[tuple[int, str, str]]:
+    # A normalisation table, a chained pair (x -> y, then y -> z) that has to stay in order,
+    # word fixes and regex clean-ups, one after another.
+    return char_map(rng, count // 3) + [(0, 'x', 'y'), (0, 'y', 'z')] + words(rng, count // 3) + regexes(rng, count // 3)
+
+
+def bench(args: argparse.Namespace) -> None:
+    header = f'{"rules":<10}{"count":>8}{"passes":>8}{"sequential":>12}{"engine":>10}{"speedup":>9}'
+    print(header)
+    print('-' * len(header))
+    for name in args.rule_sets:
+        rng = random.Random(args.seed)
+        rules = RULE_SETS[name](rng, args.rules)
+        vocabulary = [rule[1] for rule in rules if not rule[0] and len(rule[1]) > 1] or [make_word(rng) for _ in range(100)]
+        vocabulary += [make_word(rng) for _ in range(len(vocabulary))]
+        text = make_text(rng, vocabulary, args.size)
+
+        started = time.perf_counter()
+        expected = apply_repls_sequential(text, rules)
+        sequential = time.perf_counter() - started
+        # Compiling is cached per rule set, as it is for a long-running caller.
+        passes = len(compile_repls(rules))
+        started = time.perf_counter()
+        result = apply_repls(text, rules)
+        engine = time.perf_counter() - started
+        if result != expected:
+            raise SystemExit(f'{name}: engine output differs from sequential application')
+        print(f'{name:<10}{len(rules):>8,}{passes:>8,}{sequential:>11.3f}s{engine:>9.3f}s{sequential / engine:>8.1f}x')
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Benchmark repl_engine.apply_repls against one pass per rule.')
+    parser.add_argument('--rule-sets', nargs='+', choices=sorted(RULE_SETS), default=list(RULE_SETS))
+    parser.add_argument('--rules', type=int, default=300, help='Rules per set (approximate).')
+    parser.add_argument('--size', type=int, default=5_000_000, help='Characters of input text.')
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+
+def main() -> int:
+    bench(parse_args())
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
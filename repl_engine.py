@@ -0,0 +1,989 @@
+from __future__ import annotations
+
+import codecs
+import hashlib
+import io
+import itertools
+import os
+import pickle
+import re
+import sys
+import tempfile
+import tomllib
+from array import array
+from collections import Counter
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Sequence, TextIO
+
+import regex
+
+import json_loader
+
+# Shared replacement engine for the repl scripts. A rule is (is_regex, pattern, replacement) and
+# rules apply one after another: regex.sub for regex rules, str.replace for literal ones.
+#
+# Consecutive rules that provably cannot see each other's output are folded into a single pass:
+# literal rules into one trie-shaped alternation, which the regex engine walks much like an
+# Aho-Corasick automaton, and regex rules into one scan dispatching on the first character of a
+# match. Rules that might interact start a new pass, so the result is always that of applying
+# them one by one.
+
+Repl = Sequence  # (is_regex, pattern, replacement)
+# A pass rewrites the text and, given a list with an entry per rule, adds its replacement counts.
+Pass = Callable[[str, 'list[int] | None'], str]
+
+# Character ranges wider than this make a regex's alphabet "anything".
+MAX_RANGE_CHARS = 256
+# Shorter runs stay separate str.replace or regex.sub calls: each of those finds its first
+# character with a fast search, so one combined scan only wins once there are about this many.
+MIN_AUTOMATON_RULES = 64
+MIN_DISPATCH_RULES = 3
+# Streaming: characters read at a time, and how far a regex match (with its lookarounds) may
+# reach past its start or before it, i.e. how much text is held back between chunks.
+CHUNK_SIZE = 1 << 20
+OVERLAP = 4096
+# Bump when Rule, Plan or the analysis behind them changes, so cached plans are not reused.
+PLAN_VERSION = 2
+# Plans kept in a cache directory; the least recently used go first.
+CACHE_ENTRIES = 64
+
+
+@dataclass(frozen=True)
+class Rule:
+    is_regex: bool
+    pattern: str
+    repl: str
+    # Characters a match can consume and a replacement can produce; None when unknown.
+    consumes: frozenset[str] | None
+    produces: frozenset[str] | None
+    # Anchors or lookarounds: the match depends on text around it.
+    contextual: bool
+    # Position in the rule list.
+    index: int = 0
+
+
+# Pattern analysis. Rules run under `regex`, whose syntax goes well beyond the stdlib's, so only
+# the part of it both engines read the same way is analysed, parsed into a small tree:
+#   ('set', negate, items)        one character; items are ('char', code), ('range', low, high)
+#                                 and ('category', letter) for \d \D \s \S \w \W
+#   ('any',)                      . (which takes a line break too under DOTALL)
+#   ('at', anchor)                ^ $ \A \Z \b \B
+#   ('group', on, off, items)     capturing, non-capturing, atomic or flag-scoped
+#   ('look', items)               lookahead or lookbehind, positive or negative
+#   ('repeat', low, high, items)  high is None when unbounded
+#   ('branch', alternatives)
+#   ('ref', number)
+# Anything else (POSIX classes, fuzzy matching, \p{..}, named groups, verbose mode, ...) raises
+# ValueError and the rule is treated as opaque: a pass of its own, whole-buffer streaming and no
+# byte prefilter.
+QUANTIFIER_RE = re.compile(r'\{(\d*)(?:(,)(\d*))?\}')
+GLOBAL_FLAGS_RE = re.compile(r'\(\?([ims]+)\)')
+SCOPED_FLAGS_RE = re.compile(r'\(\?([ims]*)(?:-([ims]+))?:')
+CHAR_ESCAPES = {'n': 10, 't': 9, 'r': 13, 'f': 12, 'v': 11, 'a': 7}
+HEX_ESCAPES = {'x': 2, 'u': 4, 'U': 8}
+HEX_DIGITS = frozenset('0123456789abcdefABCDEF')
+OCTAL_DIGITS = frozenset('01234567')
+
+
+def _parse_escape(pattern: str, pos: int, in_set: bool) -> tuple[tuple, int]:
+    # The escape starting at pattern[pos] as a node (a ('char', code) or ('category', letter)
+    # item inside a set), and the position after it.
+    if pos + 1 >= len(pattern):
+        raise ValueError('trailing backslash')
+    char = pattern[pos + 1]
+    if char in 'dDsSwW':
+        item = ('category', char)
+        return (item if in_set else ('set', False, (item,))), pos + 2
+    if char in CHAR_ESCAPES or char == 'b' and in_set:
+        code = 8 if char == 'b' else CHAR_ESCAPES[char]
+    elif char in HEX_ESCAPES:
+        digits = pattern[pos + 2:pos + 2 + HEX_ESCAPES[char]]
+        if len(digits) != HEX_ESCAPES[char] or not HEX_DIGITS.issuperset(digits):
+            raise ValueError(pattern[pos:])
+        return _char(int(digits, 16), in_set), pos + 2 + len(digits)
+    elif char == '0':
+        end = pos + 2
+        while end < min(pos + 4, len(pattern)) and pattern[end] in OCTAL_DIGITS:
+            end += 1
+        return _char(int(pattern[pos + 1:end], 8), in_set), end
+    elif char in 'bBAZ':
+        return ('at', '\\' + char), pos + 2
+    elif char in '123456789' and not in_set and not pattern[pos + 2:pos + 3].isdigit():
+        return ('ref', int(char)), pos + 2
+    elif char.isascii() and char.isalnum():
+        # Regex-only escapes (\p, \X, \G, \K, \m, ...) and octal or multi-digit references.
+        raise ValueError(pattern[pos:pos + 2])
+    else:
+        code = ord(char)
+    return _char(code, in_set), pos + 2
+
+
+def _char(code: int, in_set: bool) -> tuple:
+    return ('char', code) if in_set else ('set', False, (('char', code),))
+
+
+def _parse_set(pattern: str, pos: int) -> tuple[tuple, int]:
+    # The character set opening at pattern[pos] and the position after its closing bracket.
+    pos += 1
+    negate = pattern.startswith('^', pos)
+    pos += negate
+    items = []
+    first = True
+    while True:
+        if pos >= len(pattern):
+            raise ValueError('unterminated set')
+        char = pattern[pos]
+        if char == ']' and not first:
+            return ('set', negate, tuple(items)), pos + 1
+        if char == '[' or char in '&|~-' and pattern.startswith(char * 2, pos):
+            # POSIX classes, nested sets and set operations.
+            raise ValueError(pattern[pos:])
+        if char == '\\':
+            item, pos = _parse_escape(pattern, pos, True)
+        else:
+            item, pos = ('char', ord(char)), pos + 1
+        if pattern.startswith('-', pos) and not pattern.startswith('-]', pos) and pos + 1 < len(pattern):
+            if pattern[pos + 1] == '\\':
+                high, pos = _parse_escape(pattern, pos + 1, True)
+            else:
+                high, pos = ('char', ord(pattern[pos + 1])), pos + 2
+            if item[0] != 'char' or high[0] != 'char' or item[1] > high[1]:
+                raise ValueError('bad range')
+            item = ('range', item[1], high[1])
+        items.append(item)
+        first = False
+
+
+def _parse_group(pattern: str, pos: int) -> tuple[tuple, int]:
+    # The group opening at pattern[pos] and the position after its closing parenthesis.
+    on = off = ''
+    if pattern.startswith(('(?=', '(?!'), pos):
+        kind, pos = 'look', pos + 3
+    elif pattern.startswith(('(?<=', '(?<!'), pos):
+        kind, pos = 'look', pos + 4
+    elif pattern.startswith(('(?:', '(?>'), pos):
+        kind, pos = 'group', pos + 3
+    elif match := SCOPED_FLAGS_RE.match(pattern, pos):
+        kind, on, off, pos = 'group', match[1], match[2] or '', match.end()
+    elif pattern.startswith('(?', pos):
+        raise ValueError(pattern[pos:])
+    else:
+        kind, pos = 'group', pos + 1
+    items, pos = _parse_alternation(pattern, pos)
+    if not pattern.startswith(')', pos):
+        raise ValueError('unbalanced parenthesis')
+    return (('look', items) if kind == 'look' else ('group', on, off, items)), pos + 1
+
+
+def _parse_alternation(pattern: str, pos: int) -> tuple[tuple, int]:
+    alternatives = []
+    while True:
+        items: list[tuple] = []
+        while pos < len(pattern) and pattern[pos] not in '|)':
+            char = pattern[pos]
+            if char in '*+?{':
+                if char == '{':
+                    match = QUANTIFIER_RE.match(pattern, pos)
+                    # Fuzzy matching ({e<=1}) or a literal brace, which the engines may read differently.
+                    if match is None or not match[1] and not match[2]:
+                        raise ValueError(pattern[pos:])
+                    low = int(match[1] or 0)
+                    high = None if match[2] and not match[3] else int(match[3] or match[1])
+                    pos = match.end()
+                else:
+                    low, high = (0 if char in '*?' else 1), (1 if char == '?' else None)
+                    pos += 1
+                if not items or items[-1][0] in ('at', 'repeat'):
+                    raise ValueError('nothing to repeat')
+                items[-1] = ('repeat', low, high, (items[-1],))
+                # A lazy or possessive suffix does not change what can match.
+                pos += pattern.startswith(('?', '+'), pos)
+                continue
+            if char == '(':
+                node, pos = _parse_group(pattern, pos)
+            elif char == '[':
+                node, pos = _parse_set(pattern, pos)
+            elif char == '\\':
+                node, pos = _parse_escape(pattern, pos, False)
+            elif char == '.':
+                node, pos = ('any',), pos + 1
+            elif char in '^$':
+                node, pos = ('at', char), pos + 1
+            else:
+                node, pos = _char(ord(char), False), pos + 1
+            items.append(node)
+        alternatives.append(tuple(items))
+        if not pattern.startswith('|', pos):
+            break
+        pos += 1
+    if len(alternatives) == 1:
+        return alternatives[0], pos
+    return (('branch', tuple(alternatives)),), pos
+
+
+@lru_cache(maxsize=256)
+def parse_pattern(pattern: str) -> tuple[str, tuple]:
+    # The global flags (any of "ims", set by a leading (?...)) and tree of a regex rule's
+    # pattern; raises ValueError for anything outside the analysed subset.
+    flags = ''
+    pos = 0
+    if match := GLOBAL_FLAGS_RE.match(pattern):
+        flags, pos = match[1], match.end()
+    items, pos = _parse_alternation(pattern, pos)
+    if pos != len(pattern):
+        raise ValueError('unbalanced parenthesis')
+    return flags, items
+
+
+def _min_width(items: Sequence[tuple]) -> int:
+    width = 0
+    for node in items:
+        if node[0] in ('set', 'any'):
+            width += 1
+        elif node[0] == 'group':
+            width += _min_width(node[3])
+        elif node[0] == 'repeat':
+            width += node[1] and node[1] * _min_width(node[3])
+        elif node[0] == 'branch':
+            width += min(map(_min_width, node[1]))
+    return width
+
+
+def _alphabet(items: Sequence[tuple], chars: set[str]) -> bool:
+    # Adds every character the parsed pattern can consume to chars. Returns whether the pattern
+    # uses anchors or lookarounds; raises ValueError for anything that can match "any" character.
+    contextual = False
+    for node in items:
+        kind = node[0]
+        if kind == 'set':
+            if node[1]:
+                raise ValueError('negated set')
+            for item in node[2]:
+                if item[0] == 'char':
+                    chars.add(chr(item[1]))
+                elif item[0] == 'range' and item[2] - item[1] < MAX_RANGE_CHARS:
+                    chars.update(map(chr, range(item[1], item[2] + 1)))
+                else:
+                    raise ValueError(item)
+        elif kind == 'group':
+            if node[1] or node[2]:
+                raise ValueError('scoped flags')
+            contextual |= _alphabet(node[3], chars)
+        elif kind == 'repeat':
+            contextual |= _alphabet(node[3], chars)
+        elif kind == 'branch':
+            for branch in node[1]:
+                contextual |= _alphabet(branch, chars)
+        elif kind in ('at', 'look'):
+            contextual = True
+        else:
+            raise ValueError(kind)
+    return contextual
+
+
+def make_rule(repl: Repl, index: int = 0) -> Rule:
+    is_regex, pattern, replacement = bool(repl[0]), repl[1], repl[2]
+    if not is_regex:
+        consumes = frozenset(pattern) if pattern else None
+        return Rule(False, pattern, replacement, consumes, frozenset(replacement), False, index)
+    # Only patterns in the analysed subset, without flags, that always consume at least one
+    # character are analysed; anything else gets a pass of its own.
+    try:
+        flags, items = parse_pattern(pattern)
+        if flags or _min_width(items) == 0:
+            raise ValueError(pattern)
+        consumes: set[str] = set()
+        contextual = _alphabet(items, consumes)
+    except ValueError:
+        return Rule(True, pattern, replacement, None, None, True, index)
+    # Templates with escapes or group references can produce anything the match consumed and more.
+    produces = None if '\\' in replacement else frozenset(replacement)
+    return Rule(True, pattern, replacement, frozenset(consumes), produces, contextual, index)
+
+
+def _overlaps(pattern: str, text: str) -> bool:
+    # Whether an occurrence of pattern can share characters with an occurrence of text.
+    if pattern in text or text in pattern:
+        return True
+    return any(pattern[-size:] == text[:size] or pattern[:size] == text[-size:] for size in range(1, min(len(pattern), len(text))))
+
+
+def independent(earlier: Rule, later: Rule) -> bool:
+    # Whether `later` finds the same matches before and after `earlier` was applied, so the two
+    # can share a pass.
+    if earlier.is_regex != later.is_regex or earlier.consumes is None or later.consumes is None:
+        return False
+    if not earlier.is_regex:
+        # Neither pattern may start the other (one position, two rules), the earlier one must
+        # not sit inside the later one, and the replacement must not form (or, for a deletion,
+        # join text into) a later occurrence. Overlaps at the ends are checked per match.
+        return not (
+            earlier.pattern.startswith(later.pattern)
+            or later.pattern.startswith(earlier.pattern)
+            or earlier.pattern in later.pattern
+            or _overlaps(later.pattern, earlier.repl)
+        )
+    # Regex rules must not share a character with anything the earlier rule consumes or produces:
+    # then no later match overlaps an earlier one or its replacement. Deleting a match joins the
+    # text around it, and anchors and lookarounds look past the match, so those are excluded.
+    if later.contextual or earlier.produces is None or not earlier.repl:
+        return False
+    return later.consumes.isdisjoint(earlier.consumes) and later.consumes.isdisjoint(earlier.produces)
+
+
+def _trie_source(words: Iterable[str]) -> str:
+    # Alternation shaped like a trie, so the engine walks shared prefixes once. Where one word
+    # extends another the longer one is tried first.
+    trie: dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def emit(node: dict) -> str:
+        leaves = [re.escape(char) for char, child in sorted(node.items()) if char and list(child) == ['']]
+        branches = [re.escape(char) + emit(child) for char, child in sorted(node.items()) if char and list(child) != ['']]
+        if len(leaves) > 1:
+            branches.insert(0, f'[{"".join(leaves)}]')
+        elif leaves:
+            branches.insert(0, leaves[0])
+        source = branches[0] if len(branches) == 1 and '' not in node else f'(?:{"|".join(branches)})'
+        return f'{source}?' if '' in node else source
+
+    return emit(trie)
+
+
+def _rule_pass(rule: Rule, compiled: regex.Pattern | None = None) -> Pass:
+    if not rule.is_regex:
+        def replace_literal(text: str, counts: list[int] | None) -> str:
+            if counts is not None:
+                counts[rule.index] += text.count(rule.pattern)
+            return text.replace(rule.pattern, rule.repl)
+
+        return replace_literal
+
+    compiled = compiled or regex.compile(rule.pattern)
+
+    def replace_regex(text: str, counts: list[int] | None) -> str:
+        if counts is None:
+            return compiled.sub(rule.repl, text)
+        text, count = compiled.subn(rule.repl, text)
+        counts[rule.index] += count
+        return text
+
+    return replace_regex
+
+
+def _conflicts(rules: list[Rule]) -> set[str]:
+    # The automaton takes the leftmost match, the rules take the earliest rule. They only
+    # disagree where a match ends inside an occurrence of an earlier rule: the text has a pattern
+    # followed by the rest of an earlier pattern it runs into.
+    return {
+        later.pattern + earlier.pattern[size:]
+        for index, later in enumerate(rules)
+        for earlier in rules[:index]
+        for size in range(1, min(len(later.pattern), len(earlier.pattern)))
+        if later.pattern[-size:] == earlier.pattern[:size]
+    }
+
+
+def _literal_pass(rules: Sequence[Rule], source: str) -> Pass:
+    literals = {rule.pattern: rule.repl for rule in rules}
+    indexes = {rule.pattern: rule.index for rule in rules}
+    # The automaton also matches the conflicts; when one turns up, the text is rewritten one rule
+    # at a time instead. Escaped literals mean the same to both engines and the stdlib one scans
+    # them faster.
+    automaton = re.compile(f'({source})')
+    one_by_one = [_rule_pass(rule) for rule in rules]
+
+    def replace_literals(text: str, counts: list[int] | None) -> str:
+        # Splitting on a capturing group and joining avoids a Python callback per match.
+        parts = automaton.split(text)
+        try:
+            replacements = [literals[part] for part in parts[1::2]]
+        except KeyError:
+            for step in one_by_one:
+                text = step(text, counts)
+            return text
+        if counts is not None:
+            for pattern, count in Counter(parts[1::2]).items():
+                counts[indexes[pattern]] += count
+        parts[1::2] = replacements
+        return ''.join(parts)
+
+    return replace_literals
+
+
+def _regex_pass(rules: Sequence[Rule], patterns: dict[str, regex.Pattern]) -> Pass:
+    # Independent rules have disjoint alphabets, so the character a match starts with names the
+    # only rule that can match there. One scan finds those characters and each is tried against
+    # its rule, leftmost first like a single alternation (whose scan in `regex` costs as much as
+    # running every rule on its own).
+    owners = {char: rule for rule in rules for char in rule.consumes}
+    starts = re.compile(f'[{"".join(map(re.escape, sorted(owners)))}]')
+    compiled = {rule: patterns[rule.pattern] for rule in rules}
+
+    def replace_regexes(text: str, counts: list[int] | None) -> str:
+        parts: list[str] = []
+        end = 0
+        for start in starts.finditer(text):
+            position = start.start()
+            if position < end:
+                continue
+            rule = owners[text[position]]
+            match = compiled[rule].match(text, position)
+            if match is None:
+                continue
+            parts += (text[end:position], rule.repl if rule.produces is not None else match.expand(rule.repl))
+            end = match.end()
+            if counts is not None:
+                counts[rule.index] += 1
+        parts.append(text[end:])
+        return ''.join(parts)
+
+    return replace_regexes
+
+
+def _batches(repls: tuple[tuple, ...]) -> list[list[Rule]]:
+    # Runs of consecutive rules that can share a pass.
+    batches: list[list[Rule]] = []
+    for rule in map(make_rule, repls, itertools.count()):
+        if batches and all(independent(earlier, rule) for earlier in batches[-1]):
+            batches[-1].append(rule)
+        else:
+            batches.append([rule])
+    return batches
+
+
+@dataclass(frozen=True)
+class Plan:
+    # What compiling a rule set works out, as data that can be stored: the batches, the automaton
+    # source of each literal batch big enough for one (None otherwise) and whether it also
+    # matches conflicts, whether every rule is line-local, and the regexes compiled. `regex`
+    # patterns pickle with their compiled program; stdlib ones would only keep their source.
+    batches: tuple[tuple[Rule, ...], ...]
+    automata: tuple[str | None, ...]
+    conflicted: tuple[bool, ...]
+    line_local: bool
+    patterns: dict[str, regex.Pattern]
+
+
+def make_plan(repls: tuple[tuple, ...]) -> Plan:
+    patterns = {}
+    for number, (is_regex, pattern, _) in enumerate(repls, 1):
+        if is_regex and pattern not in patterns:
+            try:
+                patterns[pattern] = regex.compile(pattern)
+            except regex.error as exc:
+                raise SystemExit(f'Invalid regex in rule {number} ({pattern!r}): {exc}')
+    batches = tuple(map(tuple, _batches(repls)))
+    automata, conflicted = [], []
+    for batch in batches:
+        if batch[0].is_regex or len(batch) < MIN_AUTOMATON_RULES:
+            automata.append(None)
+            conflicted.append(False)
+            continue
+        conflicts = _conflicts(list(batch))
+        automata.append(_trie_source([*(rule.pattern for rule in batch), *conflicts]))
+        conflicted.append(bool(conflicts))
+    return Plan(batches, tuple(automata), tuple(conflicted), all(map(line_local, repls)), patterns)
+
+
+def cached_plan(repls: tuple[tuple, ...], cache_dir: Path) -> Plan:
+    # One pickle per rule set, named by its hash, so a script run over and over in a shell loop
+    # loads its plan instead of analysing and compiling the rules again.
+    key = repr((PLAN_VERSION, sys.version, regex.__version__, MIN_AUTOMATON_RULES, MIN_DISPATCH_RULES, MAX_RANGE_CHARS, repls))
+    path = cache_dir / f'{hashlib.sha256(key.encode()).hexdigest()}.plan'
+    try:
+        with path.open('rb') as fh:
+            plan = pickle.load(fh)
+        os.utime(path)
+        return plan
+    except FileNotFoundError:
+        pass
+    except Exception:
+        # Truncated, or left by an incompatible version: rebuilt and replaced below.
+        pass
+    plan = make_plan(repls)
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        fd, temp_name = tempfile.mkstemp(dir=cache_dir, prefix='.', suffix='.tmp')
+        try:
+            with open(fd, 'wb') as fh:
+                pickle.dump(plan, fh, pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_name, path)
+        except BaseException:
+            os.unlink(temp_name)
+            raise
+        for stale in sorted(cache_dir.glob('*.plan'), key=lambda entry: entry.stat().st_mtime)[:-CACHE_ENTRIES]:
+            stale.unlink(missing_ok=True)
+    except OSError:
+        # The cache only saves time; a directory that cannot be written to is not an error.
+        pass
+    return plan
+
+
+@lru_cache(maxsize=64)
+def _plan(repls: tuple[tuple, ...], cache_dir: Path | None) -> Plan:
+    return cached_plan(repls, cache_dir) if cache_dir else make_plan(repls)
+
+
+# A pass and the rules it applies.
+Step = tuple[tuple[Rule, ...], Pass]
+
+
+@lru_cache(maxsize=64)
+def _compile(repls: tuple[tuple, ...], cache_dir: Path | None) -> tuple[Step, ...]:
+    plan = _plan(repls, cache_dir)
+    steps: list[Step] = []
+    for batch, automaton in zip(plan.batches, plan.automata):
+        if automaton is not None:
+            steps.append((batch, _literal_pass(batch, automaton)))
+        elif batch[0].is_regex and len(batch) >= MIN_DISPATCH_RULES:
+            steps.append((batch, _regex_pass(batch, plan.patterns)))
+        else:
+            steps += [((rule,), _rule_pass(rule, plan.patterns.get(rule.pattern))) for rule in batch]
+    return tuple(steps)
+
+
+def _key(repls: Iterable[Repl]) -> tuple[tuple, ...]:
+    return tuple((bool(r[0]), r[1], r[2]) for r in repls)
+
+
+def compile_repls(repls: Iterable[Repl], cache_dir: str | Path | None = None) -> tuple[Step, ...]:
+    # With a cache directory the plan is kept there between runs (see cached_plan).
+    return _compile(_key(repls), Path(cache_dir) if cache_dir else None)
+
+
+def apply_repls(text: str, repls: Iterable[Repl], counts: list[int] | None = None, cache_dir: str | Path | None = None) -> str:
+    # counts, if given, has an entry per rule and gets the number of replacements each made.
+    for _, step in compile_repls(repls, cache_dir):
+        text = step(text, counts)
+    return text
+
+
+def load_rules(path: Path) -> list[tuple[int, str, str]]:
+    # TOML with [[rules]] tables, or JSON: a list of rules or {"rules": [...]}. A rule is a
+    # {pattern, replacement = '', regex = false} table or an [is_regex, pattern, replacement] list.
+    path = Path(path)
+    try:
+        if path.suffix == '.toml':
+            with path.open('rb') as fh:
+                data = tomllib.load(fh)
+        else:
+            data = json_loader.load_path(path)
+    except FileNotFoundError:
+        raise SystemExit(f'Rules file not found: {path}')
+    except (tomllib.TOMLDecodeError, json_loader.JSONDecodeError) as exc:
+        raise SystemExit(f'Invalid rules file {path}: {exc}')
+
+    rules = data.get('rules') if isinstance(data, dict) else data
+    if not isinstance(rules, list):
+        raise SystemExit(f'{path}: expected a list of rules')
+    loaded = []
+    for number, rule in enumerate(rules, 1):
+        if isinstance(rule, dict) and set(rule) <= {'pattern', 'replacement', 'regex'}:
+            is_regex, pattern, replacement = rule.get('regex', False), rule.get('pattern'), rule.get('replacement', '')
+        elif isinstance(rule, list) and len(rule) == 3:
+            is_regex, pattern, replacement = rule
+        else:
+            is_regex = pattern = replacement = None
+        if not isinstance(is_regex, (bool, int)) or not isinstance(pattern, str) or not isinstance(replacement, str):
+            raise SystemExit(f'{path}: rule {number} should be {{pattern, replacement, regex}} or [is_regex, pattern, replacement]')
+        loaded.append((int(is_regex), pattern, replacement))
+    # Regexes are checked when the rules are compiled (make_plan), which a cached plan skips.
+    return loaded
+
+
+def describe_rule(rule: Repl, width: int = 60) -> str:
+    text = f'{"re " if rule[0] else ""}{rule[1]!r} -> {rule[2]!r}'
+    return text if len(text) <= width else text[:width - 3] + '...'
+
+
+def apply_repls_sequential(text: str, repls: Iterable[Repl]) -> str:
+    # The reference semantics, one full pass per rule.
+    for r in repls:
+        text = regex.sub(r[1], r[2], text) if r[0] else text.replace(r[1], r[2])
+    return text
+
+
+# Streaming. When no rule can match across a line break the text is rewritten a block of whole
+# lines at a time. Otherwise every pass becomes a stage that rewrites what it has been fed up to
+# `overlap` characters from the end (further for a match that started before that) and holds
+# back the rest, plus `overlap` characters of context for lookbehinds, for the next chunk.
+
+# Anchors that mean the same in a block of lines as in the whole text (and ^ in MULTILINE mode).
+LINE_LOCAL_ANCHORS = {'\\b', '\\B'}
+# Categories whose characters include a line break.
+NEWLINE_CATEGORIES = {'s', 'D', 'W'}
+
+
+def _matches_newline(items: Sequence[tuple], dotall: bool, multiline: bool) -> bool:
+    # Whether the parsed pattern can consume a line break, or uses an anchor that depends on
+    # where the text ends.
+    for node in items:
+        kind = node[0]
+        if kind == 'set':
+            found = node[1] != any(
+                item[0] == 'char' and item[1] == 10
+                or item[0] == 'range' and item[1] <= 10 <= item[2]
+                or item[0] == 'category' and item[1] in NEWLINE_CATEGORIES
+                for item in node[2]
+            )
+        elif kind == 'any':
+            found = dotall
+        elif kind == 'group':
+            on, off = node[1], node[2]
+            found = _matches_newline(
+                node[3], (dotall or 's' in on) and 's' not in off, (multiline or 'm' in on) and 'm' not in off
+            )
+        elif kind in ('repeat', 'look'):
+            found = _matches_newline(node[-1], dotall, multiline)
+        elif kind == 'branch':
+            found = any(_matches_newline(branch, dotall, multiline) for branch in node[1])
+        elif kind == 'at':
+            found = node[1] not in LINE_LOCAL_ANCHORS and not (node[1] == '^' and multiline)
+        else:
+            found = False
+        if found:
+            return True
+    return False
+
+
+def line_local(repl: Repl) -> bool:
+    # Whether a rule's matches always lie within one line, so it can run on any block of whole
+    # lines. Empty matches are excluded: a block boundary would see them twice. Patterns outside
+    # the analysed subset count as whole-buffer.
+    if not repl[0]:
+        return bool(repl[1]) and '\n' not in repl[1]
+    try:
+        flags, items = parse_pattern(repl[1])
+    except ValueError:
+        return False
+    return _min_width(items) > 0 and not _matches_newline(items, 's' in flags, 'm' in flags)
+
+
+@dataclass(frozen=True)
+class Stage:
+    # Yields (start, end, replacement) for the matches at or after pos, as the pass would.
+    find: Callable[[str, int], Iterator[tuple[int, int, str]]]
+    # How far past its start a match decision may look, and how far before it.
+    horizon: int
+    context: int
+
+
+def _literal_stage(rules: Sequence[Rule], source: str | None = None) -> Stage:
+    literals = {rule.pattern: rule.repl for rule in rules}
+    automaton = re.compile(source if source is not None else re.escape(rules[0].pattern))
+    horizon = max(map(len, literals))
+
+    def find(text: str, pos: int) -> Iterator[tuple[int, int, str]]:
+        for match in automaton.finditer(text, pos):
+            yield match.start(), match.end(), literals[match.group()]
+
+    return Stage(find, horizon, 0)
+
+
+def _regex_stage(rules: Sequence[Rule], overlap: int, patterns: dict[str, regex.Pattern]) -> Stage:
+    compiled = {rule: patterns[rule.pattern] for rule in rules}
+
+    def expand(rule: Rule, match) -> tuple[int, int, str]:
+        return match.start(), match.end(), rule.repl if rule.produces is not None else match.expand(rule.repl)
+
+    if len(rules) == 1:
+        rule, pattern = rules[0], compiled[rules[0]]
+        return Stage(lambda text, pos: (expand(rule, match) for match in pattern.finditer(text, pos)), overlap, overlap)
+
+    owners = {char: rule for rule in rules for char in rule.consumes}
+    starts = re.compile(f'[{"".join(map(re.escape, sorted(owners)))}]')
+
+    def find(text: str, pos: int) -> Iterator[tuple[int, int, str]]:
+        end = pos
+        for start in starts.finditer(text, pos):
+            if start.start() < end:
+                continue
+            rule = owners[text[start.start()]]
+            match = compiled[rule].match(text, start.start())
+            if match is not None:
+                yield expand(rule, match)
+                end = match.end()
+
+    return Stage(find, overlap, overlap)
+
+
+def _stages(plan: Plan, overlap: int) -> list[Stage]:
+    stages = []
+    for batch, automaton, conflicted in zip(plan.batches, plan.automata, plan.conflicted):
+        # Batches the automaton may have to redo one rule at a time stream one rule at a time.
+        if batch[0].is_regex:
+            if len(batch) >= MIN_DISPATCH_RULES:
+                stages.append(_regex_stage(batch, overlap, plan.patterns))
+            else:
+                stages += [_regex_stage([rule], overlap, plan.patterns) for rule in batch]
+        elif automaton is not None and not conflicted:
+            stages.append(_literal_stage(batch, automaton))
+        else:
+            stages += [_literal_stage([rule]) for rule in batch]
+    return stages
+
+
+class _StageStream:
+    def __init__(self, stage: Stage) -> None:
+        self.stage = stage
+        self.buffer = ''
+        self.pos = 0  # start of the text not rewritten yet; before it is context
+
+    def feed(self, text: str, final: bool) -> str:
+        buffer = self.buffer + text
+        # Matches starting before the limit are settled: the scan cannot look past the buffer.
+        limit = len(buffer) if final else len(buffer) - self.stage.horizon
+        if limit <= self.pos and not final:
+            self.buffer = buffer
+            return ''
+        parts = []
+        end = self.pos
+        for start, stop, repl in self.stage.find(buffer, self.pos):
+            if start >= limit and not final:
+                break
+            parts += (buffer[end:start], repl)
+            end = stop
+        cut = max(end, limit)
+        parts.append(buffer[end:cut])
+        keep = max(0, cut - self.stage.context)
+        self.buffer, self.pos = buffer[keep:], cut - keep
+        return ''.join(parts)
+
+
+def stream_repls(chunks: Iterable[str], repls: Iterable[Repl], overlap: int = OVERLAP, cache_dir: str | Path | None = None) -> Iterator[str]:
+    # Rewrites text arriving in chunks, yielding output as soon as it is settled. A regex match
+    # must not reach more than `overlap` characters past its start (or before it, for
+    # lookbehinds) unless every rule is line-local.
+    repls = _key(repls)
+    cache_dir = Path(cache_dir) if cache_dir else None
+    plan = _plan(repls, cache_dir)
+    if plan.line_local:
+        pending = ''
+        for chunk in chunks:
+            pending += chunk
+            cut = pending.rfind('\n') + 1
+            if cut:
+                yield apply_repls(pending[:cut], repls, cache_dir=cache_dir)
+                pending = pending[cut:]
+        if pending:
+            yield apply_repls(pending, repls, cache_dir=cache_dir)
+        return
+
+    streams = [_StageStream(stage) for stage in _stages(plan, overlap)]
+    for chunk in chunks:
+        for stream in streams:
+            chunk = stream.feed(chunk, False)
+        if chunk:
+            yield chunk
+    chunk = ''
+    for stream in streams:
+        chunk = stream.feed(chunk, True)
+    if chunk:
+        yield chunk
+
+
+def iter_chunks(stream: TextIO, size: int = CHUNK_SIZE) -> Iterator[str]:
+    # Text from a stream as it arrives: read1 hands over whatever a pipe has ready rather than
+    # waiting for a full chunk. Line endings are translated like the stream's own reads do.
+    raw = getattr(stream, 'buffer', None)
+    if raw is None or not hasattr(raw, 'read1'):
+        while chunk := stream.read(size):
+            yield chunk
+        return
+    decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder(stream.encoding)(stream.errors), translate=True)
+    while data := raw.read1(size):
+        if chunk := decoder.decode(data):
+            yield chunk
+    if chunk := decoder.decode(b'', final=True):
+        yield chunk
+
+
+# Splicing UTF-8 data in place, a memory-mapped file say. With line-local rules a line in which
+# no rule can match the original text comes out unchanged, so only lines holding a possible
+# match are decoded and rewritten and the bytes between them are copied as they are. A
+# prefilter over the raw bytes finds those lines: the UTF-8 bytes of each literal rule, and for
+# regex rules the first byte of every character they can consume (any byte for a pattern that
+# cannot be analysed, so every line is rewritten). Rules that may match across lines rewrite the
+# whole data as one block.
+
+# Candidate lines closer than this are rewritten as one block: each block costs a call per pass,
+# decoding the lines in between costs less. Dense candidates make blocks of up to about
+# SPLICE_BLOCK bytes.
+SPLICE_GAP = 1 << 16
+SPLICE_BLOCK = 1 << 24
+# Up to this many byte strings to look for are found one by one with bytes.find; more with a
+# regex over all of them, which costs as much as a few dozen finds.
+MAX_SPLICE_NEEDLES = 64
+CATEGORY_ESCAPES = frozenset('dDsSwW')
+# Bytes that start a multi-byte UTF-8 character.
+NON_ASCII_LEADS = range(0xC2, 0xF5)
+
+
+def _lead_bytes(low: int, high: int) -> range:
+    # UTF-8 lead bytes grow with the code point, so a range of characters has a range of them.
+    return range(chr(low).encode()[0], chr(high).encode()[0] + 1)
+
+
+def _lead_range(lead: int) -> tuple[int, int]:
+    # The code points whose UTF-8 encoding starts with this byte.
+    if lead < 0xE0:
+        low = (lead & 0x1F) << 6
+        return low, low + 0x3F
+    if lead < 0xF0:
+        low = (lead & 0x0F) << 12
+        return max(low, 0x800), low + 0xFFF
+    low = (lead & 0x07) << 18
+    return max(low, 0x10000), min(low + 0x3FFFF, sys.maxunicode)
+
+
+@lru_cache(maxsize=1)
+def _code_points() -> str:
+    # Every code point in order, built without a Python call per character.
+    return array('I', range(sys.maxunicode + 1)).tobytes().decode(f'utf-32-{sys.byteorder[0]}e', 'surrogatepass')
+
+
+@lru_cache(maxsize=None)
+def _category_bytes(category: str) -> frozenset[int]:
+    # The ASCII characters in a class like \d or \w and the lead bytes of its other characters.
+    members = regex.compile('\\' + category)
+    characters = _code_points()
+    found = {code for code in range(0x80) if members.match(characters, code)}
+    found.update(lead for lead in NON_ASCII_LEADS if members.search(characters, _lead_range(lead)[0], _lead_range(lead)[1] + 1))
+    return frozenset(found)
+
+
+def _byte_alphabet(items: Sequence[tuple], found: set[int]) -> None:
+    # Adds the first byte of every character the parsed pattern can consume to found; raises
+    # ValueError where that could be any byte. Lookarounds consume nothing and are skipped.
+    for node in items:
+        kind = node[0]
+        if kind == 'set':
+            if node[1]:
+                raise ValueError('negated set')
+            for item in node[2]:
+                if item[0] == 'char':
+                    found.update(_lead_bytes(item[1], item[1]))
+                elif item[0] == 'range':
+                    found.update(_lead_bytes(item[1], item[2]))
+                elif item[1] in CATEGORY_ESCAPES:
+                    found.update(_category_bytes(item[1]))
+                else:
+                    raise ValueError(item)
+        elif kind == 'group':
+            if 'i' in node[1]:
+                raise ValueError('ignorecase')
+            _byte_alphabet(node[3], found)
+        elif kind == 'repeat':
+            _byte_alphabet(node[3], found)
+        elif kind == 'branch':
+            for branch in node[1]:
+                _byte_alphabet(branch, found)
+        elif kind not in ('at', 'look', 'ref'):
+            raise ValueError(kind)
+
+
+@lru_cache(maxsize=64)
+def _splice_needles(repls: tuple[tuple, ...]) -> tuple[bytes, ...] | None:
+    # Byte strings at least one of which occurs in every line a rule can match: each literal
+    # rule's UTF-8 bytes, and single bytes for regex rules. Literals holding one of the single
+    # bytes are left to it. None when a rule may match across lines.
+    if not all(map(line_local, repls)):
+        return None
+    leads: set[int] = set()
+    for repl in repls:
+        if not repl[0]:
+            continue
+        try:
+            flags, items = parse_pattern(repl[1])
+            if 'i' in flags:
+                raise ValueError('ignorecase')
+            _byte_alphabet(items, leads)
+        except ValueError:
+            leads.update(range(0x100))
+    words = dict.fromkeys(repl[1].encode() for repl in repls if not repl[0] and leads.isdisjoint(repl[1].encode()))
+    return (*words, *(bytes([code]) for code in sorted(leads)))
+
+
+@lru_cache(maxsize=64)
+def _needle_pattern(needles: tuple[bytes, ...]) -> re.Pattern[bytes]:
+    # Built over the bytes as Latin-1 characters, so each byte stands for itself in the pattern.
+    words = [needle.decode('latin-1') for needle in needles if len(needle) > 1]
+    single = ''.join(re.escape(needle.decode('latin-1')) for needle in needles if len(needle) == 1)
+    alternatives = [_trie_source(words)] if words else []
+    if single:
+        alternatives.append(f'[{single}]')
+    return re.compile('|'.join(alternatives).encode('latin-1'))
+
+
+def compile_splice(repls: Iterable[Repl]) -> tuple[bytes, ...] | None:
+    # What splice_edits looks for, or None when it rewrites the whole data.
+    needles = _splice_needles(_key(repls))
+    if needles is not None and len(needles) > MAX_SPLICE_NEEDLES:
+        _needle_pattern(needles)
+    return needles
+
+
+def _scanner(data, needles: tuple[bytes, ...]) -> Callable[[int], int]:
+    # Returns the first position at or after pos where a needle starts, or -1. A few needles are
+    # found with one fast find each, many with one regex scan.
+    if len(needles) > MAX_SPLICE_NEEDLES:
+        pattern = _needle_pattern(needles)
+
+        def search(pos: int) -> int:
+            match = pattern.search(data, pos)
+            return -1 if match is None else match.start()
+
+        return search
+
+    # Where each needle occurs next; a needle seen before pos is looked for again from there.
+    upcoming = dict.fromkeys(needles, -1)
+
+    def find(pos: int) -> int:
+        for needle, at in list(upcoming.items()):
+            if at < pos:
+                at = data.find(needle, pos)
+                if at < 0:
+                    del upcoming[needle]
+                else:
+                    upcoming[needle] = at
+        return min(upcoming.values(), default=-1)
+
+    return find
+
+
+def _line_end(data, pos: int) -> int:
+    end = data.find(b'\n', pos)
+    return len(data) if end < 0 else end + 1
+
+
+def splice_edits(data, repls: Iterable[Repl], counts: list[int] | None = None, cache_dir: str | Path | None = None) -> Iterator[tuple[int, int, bytes]]:
+    # The rewrite of UTF-8 bytes (anything with find, rfind and slicing, such as an mmap) as
+    # (start, end, replacement) edits in order; the bytes outside them stay as they are. Lines
+    # that are rewritten must decode; raises UnicodeDecodeError otherwise.
+    repls = _key(repls)
+    needles = compile_splice(repls)
+    if needles is None:
+        whole = data[:].decode()
+        text = apply_repls(whole, repls, counts, cache_dir)
+        if text != whole:
+            yield 0, len(data), text.encode()
+        return
+    candidate = _scanner(data, needles)
+    pos = candidate(0)
+    while pos >= 0:
+        start = data.rfind(b'\n', 0, pos) + 1
+        end = _line_end(data, pos)
+        while 0 <= (pos := candidate(end)) < end + SPLICE_GAP and end - start < SPLICE_BLOCK:
+            # Taking in a gap's worth at a time keeps dense candidates from costing a find a line.
+            end = _line_end(data, end + SPLICE_GAP)
+        block = data[start:end].decode()
+        text = apply_repls(block, repls, counts, cache_dir)
+        if text != block:
+            yield start, end, text.encode()
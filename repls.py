@@ -1,26 +1,198 @@
-from pathlib import Path
-import regex as re
+import glob
+import itertools
+import mmap
+import os
 import sys
+import tempfile
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+from repl_engine import CHUNK_SIZE, OVERLAP, apply_repls, compile_repls, compile_splice, describe_rule, iter_chunks, load_rules, splice_edits, stream_repls
+
+repls = [
+]
+
+# Rules in use by --files workers and whether they splice, set once per process.
+active_rules = []
+active_mmap = False
+
+
+def parse_args():
+    parser = ArgumentParser(description='Apply the replacement rules above (or a rules file) to a file, a set of files, or stdin.')
+    parser.add_argument('file', nargs='?', help='Input file; without it stdin is rewritten to stdout')
+    parser.add_argument('out', nargs='?', help='Output file (default: the input file)')
+    parser.add_argument('-r', '--rules', type=Path, help='TOML or JSON rules file to use instead of the list in this script')
+    parser.add_argument('-f', '--files', action='append', metavar='GLOB_OR_DIR', help='Rewrite in place every file matching a glob (** recurses) or under a directory, skipping hidden ones; repeatable. Exits 1 if any file had to be skipped')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='Worker processes for --files')
+    parser.add_argument('--stream', action='store_true', help='Rewrite in chunks, writing output as it is produced, in constant memory')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Characters read at a time with --stream')
+    parser.add_argument('--overlap', type=int, default=OVERLAP, help='How far a regex match may reach across a chunk boundary with --stream (not needed when every rule stays within a line)')
+    parser.add_argument('--mmap', action='store_true', help='Memory-map UTF-8 input and rewrite only the lines a rule may match, copying the rest straight from the mapping (with rules that can match across lines, the whole file is rewritten)')
+    args = parser.parse_args()
+    if args.files and (args.file or args.stream):
+        parser.error('--files rewrites the matched files in place and cannot be combined with FILE, OUT or --stream')
+    if args.mmap and (args.stream or not (args.file or args.files)):
+        parser.error('--mmap needs FILE or --files and cannot be combined with --stream')
+    if args.jobs < 1:
+        parser.error('--jobs must be at least 1')
+    return args
+
+
+@contextmanager
+def atomic_output(path, newline=None, mode='w'):
+    # Written next to the target and renamed over it, so nobody sees a half-written file and
+    # rewriting a file in place never reads back its own output. Keeps the target's permissions.
+    fd, temp_name = tempfile.mkstemp(dir=path.resolve().parent, prefix=f'.{path.name}.', suffix='.tmp')
+    if path.exists():
+        os.chmod(fd, path.stat().st_mode & 0o7777)
+    else:
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(fd, 0o666 & ~umask)
+    try:
+        with open(fd, mode, newline=newline) as fh:
+            yield fh
+        os.replace(temp_name, path)
+    except BaseException:
+        os.unlink(temp_name)
+        raise
+
+
+def expand_targets(targets):
+    files = {}
+    for target in targets:
+        if os.path.isdir(target):
+            root = Path(target)
+            found = (path for path in sorted(root.rglob('*')) if not any(part.startswith('.') for part in path.relative_to(root).parts))
+        else:
+            found = map(Path, sorted(glob.glob(target, recursive=True)))
+        # Replacing a symlink would turn it into a copy of its target.
+        files.update(dict.fromkeys(path for path in found if path.is_file() and not path.is_symlink()))
+    return list(files)
+
+
+def init_worker(rules, use_mmap=False):
+    global active_rules, active_mmap
+    active_rules, active_mmap = rules, use_mmap
+    compile_repls(rules)
+    if use_mmap:
+        compile_splice(rules)
+
+
+def splice_file(path, out, rules, counts=None):
+    # Rewrites the lines a rule may match and copies the bytes around them from a memory map of
+    # the input, so the unchanged bulk of a large file is neither decoded nor copied in Python.
+    # Returns whether the output differs from the input; an unchanged file is not rewritten.
+    with path.open('rb') as src:
+        # An empty file cannot be mapped.
+        size = os.fstat(src.fileno()).st_size
+        with mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) if size else nullcontext(b'') as data:
+            edits = splice_edits(data, rules, counts)
+            first = next(edits, None)
+            if first is None and out == path:
+                return False
+            with atomic_output(out, mode='wb') as dst, memoryview(data) as view:
+                end = 0
+                for start, stop, replacement in itertools.chain([first] if first else [], edits):
+                    dst.write(view[end:start])
+                    dst.write(replacement)
+                    end = stop
+                dst.write(view[end:])
+    return first is not None
+
+
+def rewrite_file(path):
+    # Returns (path, replacements per rule, changed, error). Line endings are kept as they are.
+    if active_mmap:
+        counts = [0] * len(active_rules)
+        try:
+            return path, counts, splice_file(path, path, active_rules, counts), None
+        except UnicodeDecodeError:
+            return path, None, False, 'not UTF-8 text'
+        except OSError as exc:
+            return path, None, False, exc.strerror
+    try:
+        with path.open(newline='') as fh:
+            text = fh.read()
+    except UnicodeDecodeError:
+        return path, None, False, 'not text'
+    except OSError as exc:
+        return path, None, False, exc.strerror
+    counts = [0] * len(active_rules)
+    new_text = apply_repls(text, active_rules, counts)
+    if new_text == text:
+        return path, counts, False, None
+    try:
+        with atomic_output(path, newline='') as fh:
+            fh.write(new_text)
+    except OSError as exc:
+        return path, counts, False, exc.strerror
+    return path, counts, True, None
+
+
+def rewrite_files(args, rules):
+    files = expand_targets(args.files)
+    if not files:
+        raise SystemExit(f'No files match {", ".join(args.files)}')
+    jobs = min(args.jobs, len(files))
+    if jobs == 1:
+        init_worker(rules, args.mmap)
+        results = list(map(rewrite_file, files))
+    else:
+        # Compiled here first so a bad rule fails once, before any worker starts.
+        init_worker(rules, args.mmap)
+        with ProcessPoolExecutor(jobs, initializer=init_worker, initargs=(rules, args.mmap)) as pool:
+            results = list(pool.map(rewrite_file, files, chunksize=max(1, len(files) // (jobs * 8))))
+
+    totals = [0] * len(rules)
+    changed = skipped = 0
+    print(f'{"replacements":>12}  file')
+    for path, counts, was_changed, error in results:
+        if error:
+            skipped += 1
+            print(f'{path}: skipped ({error})', file=sys.stderr)
+            continue
+        totals = [total + count for total, count in zip(totals, counts)]
+        if was_changed:
+            changed += 1
+            print(f'{sum(counts):>12,}  {path}')
+    print(f'\n{"replacements":>12}  rule')
+    for number, (rule, total) in enumerate(zip(rules, totals), 1):
+        print(f'{total:>12,}  {number}: {describe_rule(rule)}')
+    print(f'\n{changed} changed, {len(results) - changed - skipped} unchanged, {skipped} skipped')
+    return 1 if skipped else 0
+
+
+def main():
+    args = parse_args()
+    rules = load_rules(args.rules) if args.rules else repls
+    if args.files:
+        return rewrite_files(args, rules)
+
+    if args.mmap:
+        compile_splice(rules)
+        try:
+            splice_file(Path(args.file), Path(args.out or args.file), rules)
+        except UnicodeDecodeError as exc:
+            raise SystemExit(f'{args.file}: not UTF-8 text ({exc})')
+    elif not args.stream:
+        text = sys.stdin.read() if args.file is None else Path(args.file).read_text()
+        text = apply_repls(text, rules)
+        if args.file is None:
+            sys.stdout.write(text)
+        else:
+            Path(args.out or args.file).write_text(text)
+    elif args.file is None:
+        for chunk in stream_repls(iter_chunks(sys.stdin, args.chunk_size), rules, args.overlap):
+            sys.stdout.write(chunk)
+            sys.stdout.flush()
+    else:
+        with open(args.file) as src, atomic_output(Path(args.out or args.file)) as dst:
+            dst.writelines(stream_repls(iter_chunks(src, args.chunk_size), rules, args.overlap))
+    return 0
+
 
-def apply_repls(text, repls):
-    for r in repls:
-        text = re.sub(r[1], r[2], text) if r[0] else text.replace(r[1], r[2])
-    return text
-
-text = ''
-write_stdout = False
-if len(sys.argv) == 1:
-    text = sys.stdin.read()
-    write_stdout = True
-else:
-    text = Path(sys.argv[1]).read_text()
-    if len(sys.argv) == 2:
-        sys.argv.append(sys.argv[1])
-
-text = apply_repls(text, [
-])
-
-if write_stdout:
-    sys.stdout.write(text)
-else:
-    Path(sys.argv[2]).write_text(text)
+if __name__ == '__main__':
+    raise SystemExit(main())
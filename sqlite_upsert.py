@@ -4,13 +4,15 @@ import json
 import sys
 from argparse import ArgumentParser
 
+import json_loader
+
 
 #####################################################################
 # Arguments
 #####################################################################
 parser = ArgumentParser()
 parser.add_argument('db', help='The database file', type=Path)
-parser.add_argument('file', nargs='?', help='The json file to insert. If not provided, stdin is used')
+parser.add_argument('file', nargs='?', help='The json file to insert. If not provided, stdin is used', type=Path)
 parser.add_argument('-l', '--lines', help='jsonl format', action='store_true')
 args = parser.parse_args()
 
@@ -30,9 +32,9 @@ row_changed = 0
 try:
     db = sqlite3.connect(args.db)
     if args.lines:
-        data = (json.loads(line) for line in data_source)
+        data = (json_loader.loads(line) for line in data_source)
     else:
-        data = json.load(data_source)
+        data = json_loader.load_path(args.file) if args.file else json_loader.loads(data_source.read())
         if isinstance(data, dict):
             # The json file is an object, but data needs to be a list
             data = [data]
@@ -0,0 +1,634 @@
+import base64
+import copy
+import gzip
+import html
+import importlib.util
+import json
+import pstats
+import random
+import re
+import signal
+import subprocess
+import sys
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+import pytest
+
+import json_diff_bench
+import json_diff_html
+from json_diff_html import (
+    ARRAY_ALGORITHMS,
+    Counts,
+    DEFAULT_MATCH_KEYS,
+    DiffBuilder,
+    HtmlRenderer,
+    JsonSpanReader,
+    StringLruCache,
+    SubtreeHasher,
+    align_sequences,
+    count_changes,
+    diff_string_html,
+    iter_json_patch,
+    iter_ndjson,
+)
+
+# Seeded document pairs with the leaves json_diff_html.py produced for them before the diff
+# engine was rewritten for speed (commit b904e09). Regenerate with:
+#   git show b904e09:json_diff_html.py > /tmp/baseline.py && python test_json_diff_html.py /tmp/baseline.py
+BASELINE = Path(__file__).with_name('testdata') / 'json_diff_baseline.json'
+CASES = json.loads(BASELINE.read_text())
+
+
+def build(old: object, new: object, module=None, **options) -> object:
+    module = module or json_diff_html
+    return module.DiffBuilder(ignore_keys=set(), ignore_paths=set(), match_keys=module.DEFAULT_MATCH_KEYS, **options).build(old, new)
+
+
+def leaves(node, out: list | None = None) -> list:
+    out = [] if out is None else out
+    if node is None:
+        return out
+    if node.kind == 'group':
+        for child in node.children:
+            leaves(child, out)
+    else:
+        out.append([node.path, node.kind, json.dumps(node.old, sort_keys=True), json.dumps(node.new, sort_keys=True), node.moved])
+    return out
+
+
+@pytest.mark.parametrize('case', CASES, ids=lambda case: f'seed{case["seed"]}')
+def test_diff_tree_matches_baseline(case):
+    # The baseline predates key inference, so it is compared with inference off.
+    assert leaves(build(case['old'], case['new'], infer_match_keys=False)) == case['leaves']
+
+
+@pytest.mark.parametrize('case', CASES, ids=lambda case: f'seed{case["seed"]}')
+def test_stream_matches_in_memory(case, tmp_path):
+    # Different formatting on each side, and a front insertion so the root array has to be aligned.
+    old = [{'a': [1, 2]}, case['old'], 1, 'x']
+    new = [0, {'a': [1, 2]}, case['new'], 1.0, 'x']
+    (tmp_path / 'old.json').write_text(json.dumps(old, indent=2))
+    (tmp_path / 'new.json').write_text(json.dumps(new, separators=(',', ':')))
+    builder = DiffBuilder(ignore_keys=set(), ignore_paths=set(), match_keys=DEFAULT_MATCH_KEYS, stream_threshold=0)
+    streamed = builder.build_streaming(JsonSpanReader(tmp_path / 'old.json'), JsonSpanReader(tmp_path / 'new.json'))
+    assert leaves(streamed) == leaves(builder.build(old, new))
+
+
+@pytest.mark.skipif(not json_diff_html.can_fork(), reason='--jobs needs fork')
+def test_jobs_match_serial(monkeypatch):
+    monkeypatch.setattr(json_diff_html, 'PARALLEL_MIN_CHILDREN', 2)
+    pools = []
+    map_in_pool = json_diff_html.map_in_pool
+    monkeypatch.setattr(json_diff_html, 'map_in_pool', lambda *args: pools.append(args[1]) or map_in_pool(*args))
+    for case in CASES[:20]:
+        serial = leaves(build(case['old'], case['new']))
+        assert leaves(build(case['old'], case['new'], jobs=2)) == serial
+    assert pools
+
+
+def walk(node) -> list:
+    return [node, *(descendant for child in node.children for descendant in walk(child))]
+
+
+def test_paths_and_labels_come_from_the_parent_chain():
+    old = {'a b': {'rows': [{'id': 'x', 'v': [1, 2]}]}, 'k': [0]}
+    new = {'a b': {'rows': [{'id': 'y'}, {'id': 'x', 'v': [1, 3]}]}, 'k': [0, 1]}
+    root = build(old, new)
+    assert [(node.path, node.label) for node in walk(root)] == [
+        ('$', '$'),
+        ('$["a b"]', 'a b'),
+        ('$["a b"].rows', 'rows'),
+        ('$["a b"].rows[id="y"]', '1'),
+        ('$["a b"].rows[id="x"]', '2'),
+        ('$["a b"].rows[id="x"].v', 'v'),
+        ('$["a b"].rows[id="x"].v[1]', '2'),
+        ('$.k', 'k'),
+        ('$.k[1]', '2'),
+    ]
+    assert not hasattr(root, '__dict__')
+
+
+IGNORE_OLD = {
+    'meta': {'etag': '1', 'n': {'etag': 'a', 'x': 1}},
+    'items': [{'id': 1, 'updated_at': 't1', 'v': 1}, {'id': 2, 'updated_at': 't1', 'v': 2}],
+    'list': [{'etag': 1}, {'etag': 2, 'y': 1}],
+}
+IGNORE_NEW = {
+    'meta': {'etag': '2', 'n': {'etag': 'b', 'x': 2}},
+    'items': [{'id': 1, 'updated_at': 't2', 'v': 1}, {'id': 2, 'updated_at': 't2', 'v': 3}],
+    'list': [{'etag': 3}, {'etag': 4, 'y': 1}],
+}
+IGNORE_ALL = [
+    '$.meta.etag', '$.meta.n.etag', '$.meta.n.x', '$.items[id=1].updated_at', '$.items[id=2].updated_at',
+    '$.items[id=2].v', '$.list[0].etag', '$.list[1].etag',
+]
+
+
+@pytest.mark.parametrize(
+    ('patterns', 'ignored'),
+    [
+        ([], []),
+        (['$.meta'], ['$.meta.etag', '$.meta.n.etag', '$.meta.n.x']),
+        (['$.*.etag'], ['$.meta.etag']),
+        (['$.items[*].updated_at'], ['$.items[id=1].updated_at', '$.items[id=2].updated_at']),
+        (['$.items[id=2]'], ['$.items[id=2].updated_at', '$.items[id=2].v']),
+        (['$.list[*]'], ['$.list[0].etag', '$.list[1].etag']),
+        (['$.**.etag'], ['$.meta.etag', '$.meta.n.etag', '$.list[0].etag', '$.list[1].etag']),
+        (['$.**.n', '$.list[1]'], ['$.meta.n.etag', '$.meta.n.x', '$.list[1].etag']),
+    ],
+)
+def test_ignore_path_wildcards(patterns, ignored, tmp_path):
+    expected = [path for path in IGNORE_ALL if path not in ignored]
+    builder = DiffBuilder(ignore_keys=set(), ignore_paths=set(patterns), match_keys=DEFAULT_MATCH_KEYS, stream_threshold=0)
+    assert [leaf[0] for leaf in leaves(builder.build(IGNORE_OLD, IGNORE_NEW))] == expected
+    (tmp_path / 'old.json').write_text(json.dumps(IGNORE_OLD))
+    (tmp_path / 'new.json').write_text(json.dumps(IGNORE_NEW, indent=1))
+    streamed = builder.build_streaming(JsonSpanReader(tmp_path / 'old.json'), JsonSpanReader(tmp_path / 'new.json'))
+    assert [leaf[0] for leaf in leaves(streamed)] == expected
+
+
+def test_html_report_is_written_in_pieces():
+    root = build(IGNORE_OLD, IGNORE_NEW)
+    renderer = HtmlRenderer(title='t', old_name='a', new_name='b', counts=count_changes(root), strip_html_tags=False, rtl=False)
+    chunks = renderer.render_chunks(root)
+    assert '<span class="node-path">' not in next(chunks)
+    rest = list(chunks)
+    assert len(rest) > len(IGNORE_ALL)
+    assert node_paths(''.join(rest)) == [node.path for node in walk(root)[1:]]
+
+
+def json_diff(tmp_path: Path, *args: str, old: object = None, new: object = None) -> subprocess.CompletedProcess:
+    # Runs the script in tmp_path, after writing old and new there as old.json and new.json.
+    for name, document in (('old.json', old), ('new.json', new)):
+        if document is not None:
+            (tmp_path / name).write_text(json.dumps(document))
+    script = Path(__file__).with_name('json_diff_html.py')
+    return subprocess.run([sys.executable, script, *args], cwd=tmp_path, capture_output=True, text=True)
+
+
+def node_paths(page: str) -> list[str]:
+    return [html.unescape(path) for path in re.findall(r'<span class="node-path">([^<]*)</span>', page)]
+
+
+@pytest.mark.parametrize('mode', ['embed', 'sidecar'])
+def test_lazy_report_holds_every_node(mode, tmp_path, monkeypatch):
+    # Enough changes for several pages, and groups big enough to be paged themselves.
+    old = {'groups': [{'id': i, 'values': list(range(200))} for i in range(4)], 'flat': 1}
+    new = {'groups': [{'id': i, 'values': [value * 2 for value in range(200)]} for i in range(4)], 'flat': 2}
+    assert json_diff(tmp_path, 'old.json', 'new.json', '-o', 'full.html', old=old, new=new).returncode == 1
+    assert json_diff(tmp_path, 'old.json', 'new.json', '-o', 'lazy.html', '--lazy', mode).returncode == 1
+    page = (tmp_path / 'lazy.html').read_text()
+    if mode == 'embed':
+        chunks = re.findall(r'<script type="text/plain" id="diff-chunk-\d+">([^<]*)</script>', page)
+    else:
+        chunks = [re.search(r'"([^"]*)"', path.read_text())[1] for path in (tmp_path / 'lazy_chunks').glob('*.js')]
+    assert len(chunks) > 1
+    pages = [json.loads(gzip.decompress(base64.b64decode(chunk)))['html'] for chunk in chunks]
+    lazy_paths = node_paths(page) + [path for part in pages for path in node_paths(part)]
+    assert sorted(lazy_paths) == sorted(node_paths((tmp_path / 'full.html').read_text()))
+
+
+def apply_patch(document: object, operations: list[dict]) -> object:
+    for operation in operations:
+        tokens = [token.replace('~1', '/').replace('~0', '~') for token in operation['path'].split('/')[1:]]
+        if not tokens:
+            document = operation['value']
+            continue
+        parent = document
+        for token in tokens[:-1]:
+            parent = parent[int(token)] if isinstance(parent, list) else parent[token]
+        last = int(tokens[-1]) if isinstance(parent, list) else tokens[-1]
+        if operation['op'] == 'replace':
+            parent[last] = operation['value']
+        elif operation['op'] == 'remove':
+            del parent[last]
+        elif operation['op'] == 'add':
+            parent.insert(last, operation['value']) if isinstance(parent, list) else parent.__setitem__(last, operation['value'])
+        elif operation['op'] == 'move':
+            source = [token.replace('~1', '/').replace('~0', '~') for token in operation['from'].split('/')[1:]]
+            source_parent = document
+            for token in source[:-1]:
+                source_parent = source_parent[int(token)] if isinstance(source_parent, list) else source_parent[token]
+            parent.insert(last, source_parent.pop(int(source[-1])))
+        else:
+            raise AssertionError(f'unexpected operation {operation}')
+    return document
+
+
+@pytest.mark.parametrize('case', CASES, ids=lambda case: f'seed{case["seed"]}')
+def test_json_patch_round_trip(case):
+    old, new = case['old'], case['new']
+    root = build(old, new)
+    operations = json.loads(''.join(iter_json_patch(root)))
+    assert apply_patch(copy.deepcopy(old), operations) == new
+    assert bool(operations) == bool(count_changes(root).total)
+    records = [json.loads(line) for line in ''.join(iter_ndjson(root)).splitlines()]
+    assert len(records) == count_changes(root).total
+
+
+def test_json_patch_keeps_booleans_apart_from_numbers():
+    old, new = [None, 1.5, 'a', 1], [True, False]
+    operations = json.loads(''.join(iter_json_patch(build(old, new))))
+    assert json.dumps(apply_patch(copy.deepcopy(old), operations)) == json.dumps(new)
+
+
+@pytest.mark.parametrize('output_format', ['jsonpatch', 'ndjson', 'summary'])
+def test_machine_readable_formats(output_format, tmp_path):
+    result = json_diff(tmp_path, 'old.json', 'new.json', '-f', output_format, '-o', '-', old=IGNORE_OLD, new=IGNORE_NEW)
+    assert result.returncode == 1
+    if output_format == 'jsonpatch':
+        assert apply_patch(copy.deepcopy(IGNORE_OLD), json.loads(result.stdout)) == IGNORE_NEW
+    elif output_format == 'ndjson':
+        assert [json.loads(line)['path'] for line in result.stdout.splitlines()] == IGNORE_ALL
+    else:
+        assert json.loads(result.stdout)['total'] == len(IGNORE_ALL)
+
+
+def write_tree(root: Path, files: dict[str, str]) -> None:
+    for name, text in files.items():
+        (root / name).parent.mkdir(parents=True, exist_ok=True)
+        (root / name).write_text(text)
+
+
+@pytest.mark.parametrize('jobs', ['1', '2'])
+def test_batch_mode(jobs, tmp_path):
+    write_tree(tmp_path / 'a', {'same.json': '{"x": 1}', 'sub/changed.json': '[1, 2]', 'gone.json': '1', 'bad.json': '{'})
+    write_tree(tmp_path / 'b', {'same.json': '{ "x" : 1 }', 'sub/changed.json': '[1, 3]', 'new.json': '2', 'bad.json': '{}'})
+    result = json_diff(tmp_path, 'a', 'b', '-o', 'out', '-j', jobs, '-f', 'ndjson')
+    assert result.returncode == 1
+    summary = json.loads((tmp_path / 'out' / 'summary.json').read_text())
+    assert summary['pairs'] == 5 and summary['total'] == 1
+    assert summary['files'] == {'identical': 1, 'changed': 1, 'added': 1, 'deleted': 1, 'error': 1}
+    assert [json.loads(line)['path'] for line in (tmp_path / 'out' / 'sub' / 'changed.diff.ndjson').read_text().splitlines()] == ['$[1]']
+    index = (tmp_path / 'out' / 'index.html').read_text()
+    assert 'href="sub/changed.diff.ndjson"' in index and 'bad.json' in index
+
+
+def test_batch_manifest(tmp_path):
+    write_tree(tmp_path, {'p/1.json': '[1]', 'p/2.json': '[2]', 'p/3.json': '[3]'})
+    (tmp_path / 'pairs.tsv').write_text('# old, new, name\np/1.json\tp/2.json\tfirst\np/1.json\tp/1.json\np/2.json\tp/3.json\tfirst\n')
+    assert json_diff(tmp_path, '--manifest', 'pairs.tsv', '-o', 'out').returncode == 1
+    summary = json.loads((tmp_path / 'out' / 'summary.json').read_text())
+    assert summary['files']['changed'] == 2 and summary['files']['identical'] == 1
+    assert (tmp_path / 'out' / 'first.diff.html').exists() and (tmp_path / 'out' / 'first-2.diff.html').exists()
+    (tmp_path / 'pairs.tsv').write_text('p/1.json\n')
+    assert 'expected old<TAB>new' in json_diff(tmp_path, '--manifest', 'pairs.tsv').stderr
+
+
+@pytest.mark.parametrize('stream', [[], ['--stream']])
+def test_identical_bytes_skip_the_diff(stream, tmp_path):
+    write_tree(tmp_path, {'old.json': '{"a": [1, 2]}', 'new.json': '{"a": [1, 2]}'})
+    result = json_diff(tmp_path, 'old.json', 'new.json', '-f', 'summary', '-o', '-', '--stats-json', 'stats.json', *stream)
+    assert result.returncode == 0 and json.loads(result.stdout)['total'] == 0
+    assert json.loads((tmp_path / 'stats.json').read_text())['shortcut'] == 'identical bytes'
+    # Identical bytes are still checked to be JSON.
+    write_tree(tmp_path, {'old.json': '{"a": [1, 2]', 'new.json': '{"a": [1, 2]'})
+    result = json_diff(tmp_path, 'old.json', 'new.json', *stream)
+    assert result.returncode == 1 and 'Invalid JSON' in result.stderr
+
+
+def segments(fragment: str, kinds: str) -> str:
+    return ''.join(html.unescape(text) for text in re.findall(rf'<span class="seg (?:{kinds})">([^<]*)</span>', fragment))
+
+
+def test_string_diff(monkeypatch):
+    old, new = 'the <b>quick</b> brown fox\nline two', 'the slow brown fox\nline 2'
+    inline, left, right = diff_string_html(old, new, strip_html_tags=False)
+    assert segments(left, 'equal|delete') == old and segments(right, 'equal|insert') == new
+    assert segments(right, 'insert') == 'slow2'
+    assert segments(diff_string_html(old, new, strip_html_tags=True)[1], 'delete') == 'quicktwo'
+    # Past STRING_DIFF_MAX_TOKENS the strings are compared a line at a time.
+    monkeypatch.setattr(json_diff_html, 'STRING_DIFF_MAX_TOKENS', 4)
+    diff_string_html.cache_clear()
+    left, right = diff_string_html(old, new, strip_html_tags=False)[1:]
+    assert segments(left, 'delete') == old and segments(right, 'insert') == new
+    diff_string_html.cache_clear()
+
+
+def test_string_lru_cache_is_bounded_by_length():
+    calls = []
+    cached = StringLruCache(lambda text: calls.append(text) or text.upper(), max_chars=20)
+    assert [cached(text) for text in ('abcd', 'efgh', 'abcd')] == ['ABCD', 'EFGH', 'ABCD']
+    assert calls == ['abcd', 'efgh'] and (cached.hits, cached.misses, cached.chars) == (1, 2, 16)
+    cached('ijkl')  # Evicts efgh, the least recently used.
+    cached('abcd')
+    cached('efgh')
+    assert calls == ['abcd', 'efgh', 'ijkl', 'efgh'] and cached.chars <= 20
+    cached('x' * 11)  # Too long to keep.
+    assert len(cached) == 2
+
+
+@pytest.mark.parametrize('shape', sorted(json_diff_bench.DOCUMENT_SHAPES))
+def test_bench_document_shapes(shape):
+    make = json_diff_bench.DOCUMENT_SHAPES[shape]
+    assert make(random.Random(3), 200) == make(random.Random(3), 200)
+    case = json_diff_bench.run_document_case(shape, 200, 3, 'auto')
+    assert case['changes'] > 0 and set(case['seconds']) == set(json_diff_bench.PHASES)
+
+
+@pytest.mark.parametrize('shape', sorted(json_diff_bench.ARRAY_SHAPES))
+def test_bench_array_shapes(shape):
+    make = json_diff_bench.ARRAY_SHAPES[shape]
+    old, new = make(random.Random(3), 500)
+    assert (old, new) == make(random.Random(3), 500) and old != new
+
+
+def test_bench_documents_compare(tmp_path):
+    script = Path(__file__).with_name('json_diff_bench.py')
+    command = [sys.executable, script, 'documents', '--sizes', '100', '--shapes', 'keyed-array']
+    subprocess.run([*command, '-o', 'first.json'], cwd=tmp_path, check=True, capture_output=True)
+    result = subprocess.run([*command, '--compare', 'first.json'], cwd=tmp_path, check=True, capture_output=True, text=True)
+    assert 'vs base' in result.stdout and result.stdout.rstrip().endswith('x')
+    assert json.loads((tmp_path / 'first.json').read_text())['results'][0]['shape'] == 'keyed-array'
+
+
+def test_stats_and_profile(tmp_path):
+    old = {'rows': [{'sku': f's{i}', 'v': i} for i in range(50)], 'list': list(range(20))}
+    new = {'rows': [{'sku': f's{i}', 'v': -i} for i in range(50)], 'list': list(range(1, 21))}
+    result = json_diff(tmp_path, 'old.json', 'new.json', '--stats', '--stats-json', 'stats.json', '--profile', 'run.prof', old=old, new=new)
+    assert result.returncode == 1
+    assert 'inferred key sku' in result.stderr and 'run.prof' in result.stderr
+    report = json.loads((tmp_path / 'stats.json').read_text())
+    assert {'parse', 'build', 'render', 'total'} <= set(report['phases']) and report['shortcut'] is None
+    assert report['arrays']['aligned'] == 2
+    assert [(entry['path'], entry['aligned_by']) for entry in report['arrays']['largest']] == [
+        ('$.rows', 'inferred key sku'),
+        ('$.list', 'position'),
+    ]
+    assert (report['nodes']['modified'], report['nodes']['added'], report['nodes']['deleted']) == (49, 1, 1)
+    assert pstats.Stats(str(tmp_path / 'run.prof')).total_calls > 0
+
+
+def test_base_merge_cli(tmp_path):
+    write_tree(tmp_path, {
+        'base.json': '{"a": 1, "b": 1, "c": [{"id": 1, "v": 1}]}',
+        'ours.json': '{"a": 2, "b": 1, "c": [{"id": 1, "v": 2}]}',
+        'theirs.json': '{"a": 1, "b": 3, "c": [{"id": 1, "v": 1}, {"id": 2, "v": 1}]}',
+    })
+    result = json_diff(tmp_path, 'ours.json', 'theirs.json', '--base', 'base.json', '-f', 'ndjson', '-o', '-')
+    assert result.returncode == 0
+    merged = json.loads((tmp_path / 'ours__merge__theirs.merged.json').read_text())
+    assert merged == {'a': 2, 'b': 3, 'c': [{'id': 1, 'v': 2}, {'id': 2, 'v': 1}]}
+    assert [json.loads(line)['path'] for line in result.stdout.splitlines()[1:]] == ['$.a', '$.b', '$.c[id=1].v', '$.c[id=2]']
+
+    (tmp_path / 'theirs.json').write_text('{"a": 3, "b": 1, "c": []}')
+    result = json_diff(tmp_path, 'ours.json', 'theirs.json', '--base', 'base.json', '--merged', 'out.json', '-o', 'report.html')
+    assert result.returncode == 1
+    assert 'Conflict at $.a' in result.stderr and 'Conflict at $.c[id=1]' in result.stderr
+    assert json.loads((tmp_path / 'out.json').read_text()) == json.loads((tmp_path / 'ours.json').read_text())
+    assert 'conflicts' in (tmp_path / 'report.html').read_text()
+
+
+def test_cache_dir(tmp_path):
+    write_tree(tmp_path, {'a.json': '{"x": 1, "y": [1, 2]}', 'b.json': '{"x": 2, "y": [1, 2]}', 'c.json': '{"y": [1,2], "x": 1}'})
+
+    def run(old: str, new: str, *args: str) -> tuple[int, str | None, str]:
+        result = json_diff(tmp_path, old, new, '--cache-dir', 'cache', '--stats-json', 'stats.json', '-o', 'out', *args)
+        shortcut = json.loads((tmp_path / 'stats.json').read_text())['shortcut']
+        return result.returncode, shortcut, (tmp_path / 'out').read_text()
+
+    first = run('a.json', 'b.json')
+    assert first[:2] == (1, None)
+    assert run('a.json', 'b.json') == (1, 'report cache', first[2])
+    assert run('a.json', 'b.json', '--ignore-key', 'y')[:2] == (1, None)
+    # c.json is a.json reformatted: equal once both have been parsed, and from then on without parsing.
+    assert run('a.json', 'c.json')[:2] == (0, None)
+    assert run('c.json', 'a.json', '-f', 'summary')[:2] == (0, 'canonical digest cache')
+
+
+def test_diff_cache_evicts_least_recently_used(tmp_path):
+    cache = json_diff_html.DiffCache(tmp_path)
+    for key in (b'a', b'b', b'c'):
+        cache.put_report(key, Counts(modified=1), b'x' * 10, max_bytes=25)
+        time.sleep(0.01)
+    assert cache.get_report(b'a') is None
+    assert cache.get_report(b'b') == (Counts(modified=1), b'x' * 10)
+    time.sleep(0.01)
+    cache.put_report(b'd', Counts(), b'y' * 10, max_bytes=25)
+    assert cache.get_report(b'c') is None and cache.get_report(b'b') is not None
+
+
+def test_reindex_matches_a_fresh_diff():
+    builder = DiffBuilder(ignore_keys=set(), ignore_paths=set(), match_keys=DEFAULT_MATCH_KEYS)
+    documents = [None, None]
+    for number, case in enumerate(CASES[:30]):
+        # Alternate which side changes, as --watch does when one file is saved.
+        side = number % 2
+        document = copy.deepcopy(case['new'] if side else case['old'])
+        builder.reindex(documents[side], document)
+        documents[side] = document
+        if number:
+            assert leaves(builder.diff_indexed(*documents)) == leaves(build(*documents))
+
+
+def wait_for(condition: Callable[[], bool], timeout: float = 20) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.05)
+
+
+def test_watch_rewrites_the_report(tmp_path):
+    write_tree(tmp_path, {'old.json': '{"a": 1}', 'new.json': '{"a": 2}'})
+    report = tmp_path / 'out.ndjson'
+    script = Path(__file__).with_name('json_diff_html.py')
+    process = subprocess.Popen(
+        [sys.executable, script, 'old.json', 'new.json', '--watch', '-f', 'ndjson', '-o', report.name],
+        cwd=tmp_path, stderr=subprocess.PIPE, text=True,
+    )
+    try:
+        wait_for(report.exists)
+        assert [json.loads(line)['path'] for line in report.read_text().splitlines()] == ['$.a']
+        # A half-written file keeps the last report; the next good version replaces it.
+        (tmp_path / 'new.json').write_text('{"a": ')
+        time.sleep(1.5)
+        (tmp_path / 'new.json').write_text('{"a": 1, "b": 2}')
+        wait_for(lambda: '$.b' in report.read_text())
+        assert [json.loads(line)['path'] for line in report.read_text().splitlines()] == ['$.b']
+    finally:
+        process.send_signal(signal.SIGINT)
+        _, stderr = process.communicate(timeout=20)
+    assert process.returncode == 0
+    assert 'Invalid JSON' in stderr and '1 changes' in stderr
+
+
+def test_tokens_keep_booleans_apart_from_numbers():
+    hasher = SubtreeHasher(set())
+    tokens = [hasher.token(value) for value in (1, 1.0, True, 0, False, '1', [1], [True], {'a': 1}, {'a': 1.0})]
+    assert len(set(tokens)) == len(tokens)
+    # true lines up with true rather than with the 1 before it.
+    assert leaves(build([1, 2, True], [True, 1, 2])) == [['$[0]', 'added', 'null', 'true', False], ['$[2]', 'deleted', 'true', 'null', False]]
+    assert leaves(build([1.0, [1]], [1, [1.0]])) == []
+
+
+def lcs_length(a: list, b: list) -> int:
+    row = [0] * (len(b) + 1)
+    for x in a:
+        previous = 0
+        for j, y in enumerate(b):
+            previous, row[j + 1] = row[j + 1], previous + 1 if x == y else max(row[j + 1], row[j])
+    return row[-1]
+
+
+@pytest.mark.parametrize('algorithm', ARRAY_ALGORITHMS)
+@pytest.mark.parametrize('seed', range(40))
+def test_align_sequences(algorithm, seed):
+    rng = random.Random(seed)
+    a = [rng.choice('abcde') for _ in range(rng.randint(0, 40))]
+    b = [rng.choice('abcde') if rng.random() < 0.3 else item for item in a if rng.random() < 0.8]
+    b[rng.randint(0, len(b)):0] = rng.choices('abcxy', k=rng.randint(0, 5))
+    opcodes = align_sequences(a, b, algorithm)
+    rebuilt, i, j, equal = [], 0, 0, 0
+    for tag, i1, i2, j1, j2 in opcodes:
+        assert (i1, j1) == (i, j)
+        if tag == 'equal':
+            assert a[i1:i2] == b[j1:j2]
+            equal += i2 - i1
+        rebuilt += b[j1:j2]
+        i, j = i2, j2
+    assert (i, j) == (len(a), len(b)) and rebuilt == b
+    if algorithm == 'myers':
+        assert equal == lcs_length(a, b)
+
+
+ROWS = [{'sku': f's{i}', 'name': f'item {i}', 'qty': i} for i in range(6)]
+
+
+def test_inferred_key_reports_moved_row():
+    new = ROWS[1:4] + ROWS[:1] + ROWS[4:]
+    node = build({'rows': ROWS}, {'rows': new})
+    moved = [leaf for leaf in leaves(node) if leaf[4]]
+    assert [leaf[1] for leaf in moved] == ['moved'] * 4
+    assert all(leaf[1] == 'moved' for leaf in leaves(node))
+    assert node.children[0].match_key == 'sku'
+
+
+def test_inferred_key_reports_renamed_row():
+    new = [dict(row) for row in ROWS]
+    new[2]['name'] = 'renamed'
+    new.insert(0, {'sku': 'new', 'name': 'front', 'qty': 9})
+    found = [(path, kind) for path, kind, *_ in leaves(build({'rows': ROWS}, {'rows': new}))]
+    assert ('$.rows[sku="new"]', 'added') in found
+    assert ('$.rows[sku="s2"].name', 'modified') in found
+
+
+def test_no_key_is_inferred_when_most_rows_changed_identity():
+    new = [{key: f'{value}x' for key, value in row.items()} if row['qty'] < 4 else row for row in ROWS]
+    node = build({'rows': ROWS}, {'rows': new})
+    assert node.children[0].match_key is None
+    assert {kind for _, kind, *_ in leaves(node)} == {'modified'}
+
+
+def test_no_infer_match_key_diffs_by_position():
+    new = ROWS[1:] + ROWS[:1]
+    kinds = {kind for _, kind, *_ in leaves(build({'rows': ROWS}, {'rows': new}, infer_match_keys=False))}
+    assert 'moved' not in kinds
+
+
+def merge(base: object, ours: object, theirs: object) -> tuple[object, list]:
+    merged, conflicts, _ = DiffBuilder(ignore_keys=set(), ignore_paths=set(), match_keys=DEFAULT_MATCH_KEYS).merge(base, ours, theirs)
+    return merged, conflicts
+
+
+def test_merge_places_new_items_after_their_predecessor():
+    base = [{'id': i} for i in range(4)]
+    ours = [{'id': 0}, {'id': 'a'}, {'id': 1}, {'id': 2}, {'id': 3}]
+    theirs = [{'id': 'b'}, {'id': 0}, {'id': 1}, {'id': 3}, {'id': 'c'}, {'id': 'd'}]
+    merged, conflicts = merge({'rows': base}, {'rows': ours}, {'rows': theirs})
+    assert [item['id'] for item in merged['rows']] == ['b', 0, 'a', 1, 3, 'c', 'd']
+    assert conflicts == []
+
+
+def test_merge_keeps_the_reordered_side():
+    base = [{'id': i, 'v': i} for i in range(5)]
+    ours = [dict(item, v=-item['v']) if item['id'] == 2 else item for item in base]
+    theirs = base[::-1] + [{'id': 9, 'v': 9}]
+    merged, _ = merge(base, ours, theirs)
+    assert [(item['id'], item['v']) for item in merged] == [(4, 4), (3, 3), (2, -2), (1, 1), (0, 0), (9, 9)]
+
+
+# The generator behind the baseline cases.
+WORDS = 'alpha beta gamma delta <p>eps</p> zeta eta theta iota kappa lambda mu'.split()
+
+
+def random_scalar(rng: random.Random) -> object:
+    choice = rng.random()
+    if choice < 0.3:
+        return rng.randint(2, 20)
+    if choice < 0.6:
+        return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(0, 6)))
+    if choice < 0.7:
+        return rng.random() < 0.5
+    if choice < 0.8:
+        return None
+    return round(rng.random() * 10, 2)
+
+
+def random_value(rng: random.Random, depth: int) -> object:
+    choice = rng.random()
+    if depth > 3 or choice < 0.4:
+        return random_scalar(rng)
+    if choice < 0.65:
+        return {f'k{rng.randint(0, 8)}': random_value(rng, depth + 1) for _ in range(rng.randint(0, 6))}
+    if choice < 0.8:
+        ids = rng.sample(range(50), rng.randint(0, 8))
+        return [{'id': i, 'v': random_value(rng, depth + 1), 'n': rng.randint(0, 3)} for i in ids]
+    return [random_value(rng, depth + 1) for _ in range(rng.randint(0, 8))]
+
+
+def mutate(rng: random.Random, value: object, depth: int = 0) -> object:
+    if rng.random() < 0.1:
+        return random_value(rng, depth)
+    if isinstance(value, dict):
+        value = dict(value)
+        for key in list(value):
+            choice = rng.random()
+            if choice < 0.1:
+                del value[key]
+            elif choice < 0.5:
+                value[key] = mutate(rng, value[key], depth + 1)
+        if rng.random() < 0.3:
+            value[f'k{rng.randint(0, 12)}'] = random_value(rng, depth + 1)
+        return value
+    if isinstance(value, list):
+        value = [mutate(rng, item, depth + 1) if rng.random() < 0.4 else item for item in value]
+        if value and rng.random() < 0.3:
+            del value[rng.randrange(len(value))]
+        if rng.random() < 0.3:
+            item = copy.deepcopy(value[0]) if value and rng.random() < 0.5 else random_value(rng, depth + 1)
+            value.insert(rng.randint(0, len(value)), item)
+        if len(value) > 1 and rng.random() < 0.3:
+            i, j = rng.randrange(len(value)), rng.randrange(len(value))
+            value[i], value[j] = value[j], value[i]
+        if value and all(isinstance(item, dict) and 'id' in item for item in value):
+            # Keyed arrays keep their ids unique (a mutated id may be any JSON value).
+            unique = {json.dumps(item['id'], sort_keys=True): item for item in reversed(value)}
+            value = [item for item in value if unique.get(json.dumps(item['id'], sort_keys=True)) is item]
+        return value
+    return random_scalar(rng) if rng.random() < 0.5 else value
+
+
+def random_pair(seed: int) -> tuple[dict, dict]:
+    rng = random.Random(seed)
+    old = {f'top{i}': random_value(rng, 1) for i in range(rng.randint(1, 8))}
+    new = mutate(rng, old)
+    return old, new if isinstance(new, dict) else old
+
+
+def write_baseline(baseline_source: str, count: int = 100) -> None:
+    spec = importlib.util.spec_from_file_location('json_diff_html_baseline', baseline_source)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    cases = []
+    for seed in range(count):
+        old, new = random_pair(seed)
+        cases.append({'seed': seed, 'old': old, 'new': new, 'leaves': leaves(build(copy.deepcopy(old), copy.deepcopy(new), module))})
+    BASELINE.parent.mkdir(exist_ok=True)
+    BASELINE.write_text('[\n' + ',\n'.join(json.dumps(case, separators=(',', ':')) for case in cases) + '\n]\n')
+
+
+if __name__ == '__main__':
+    write_baseline(sys.argv[1])
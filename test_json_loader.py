@@ -0,0 +1,35 @@
+import pytest
+
+import json_loader
+from json_loader import has_long_integer, load_path, loads
+
+LONG = '12345678901234567890'
+
+
+@pytest.mark.parametrize(
+    ('text', 'expected'),
+    [
+        (f'[{LONG}]', True), (f'{{"a": -{LONG}1}}', True), (f'"{LONG}"', True), (f'[1.{LONG}]', False),
+        (f'[1e{LONG}]', False), (f'[1E-{LONG}]', False), (f'[1e+{LONG}]', False), (f'[{LONG[:-1]}]', False),
+    ],
+)
+@pytest.mark.parametrize('chunk', [1, 3, 7, 1 << 20])
+def test_has_long_integer(text, expected, chunk, monkeypatch):
+    monkeypatch.setattr(json_loader, 'SCAN_CHUNK', chunk)
+    assert has_long_integer(text) is expected
+    assert has_long_integer(memoryview(text.encode())) is expected
+
+
+def test_long_fraction_run_across_chunks(monkeypatch):
+    # A run longer than a chunk must not be mistaken for one that starts a number.
+    monkeypatch.setattr(json_loader, 'SCAN_CHUNK', 4)
+    assert not has_long_integer(f'[0.{LONG * 3}]')
+
+
+def test_long_integers_keep_their_value(tmp_path):
+    text = f'{{"id": {LONG}, "big": -{LONG}{LONG}, "x": 1.5}}'
+    expected = {'id': int(LONG), 'big': -int(LONG * 2), 'x': 1.5}
+    assert loads(text) == expected
+    path = tmp_path / 'big.json'
+    path.write_text(text)
+    assert load_path(path) == expected
@@ -0,0 +1,276 @@
+import json
+import random
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+import repl_engine
+from repl_engine import (
+    apply_repls,
+    apply_repls_sequential,
+    cached_plan,
+    compile_repls,
+    line_local,
+    load_rules,
+    make_plan,
+    make_rule,
+    parse_pattern,
+    splice_edits,
+    stream_repls,
+)
+
+ALPHABET = 'abcdeXY19é€😀 -. \n'
+REGEXES = [
+    r'Y+', r'(X)(-)', r'[de]+', r'\.', r'(?<=a)Y', r'\bX', r'a+', r'b[cd]', r'X|Y', r'\bab', r'^a', r'd$',
+    r'(?m)^a', r'(?m)d$', r'[a-c]{2}', r'(?s)a.', r'\w+', r'-?', r'(?<=a)b', r'(a)\1', r'c(?=d)', r'\d',
+    r'[XY]+-', r'a\nb', r'é+', r'[€-😀]', r'[^a\n]', r'(?i)x', r'\W', r'\s?e', r'\Z', r'\A.',
+]
+REPLACEMENTS = ['', 'Z', r'<\g<0>>', 'q', '\n', 'é']
+# Syntax only `regex` understands, which the analysis must leave alone.
+REGEX_ONLY = [
+    r'[[:digit:]]', r'[[:space:]]+', r'[[:alpha:]][[:digit:]]', r'(?:ab){e<=1}', r'\p{L}', r'\p{N}+', r'\X',
+    r'[[a-c]--b]', r'(?<name>a)b', r'(?|(a)|(b))', r'a\K.', r'\m\w', r'(?V1)[\w--\d]',
+]
+
+
+def random_case(seed: int) -> tuple[list[tuple[int, str, str]], str]:
+    rng = random.Random(seed)
+
+    def word(low: int, high: int) -> str:
+        return ''.join(rng.choice(ALPHABET.replace('\n', '')) for _ in range(rng.randint(low, high)))
+
+    rules = [
+        (1, rng.choice(REGEXES), rng.choice(REPLACEMENTS)) if rng.random() < 0.4 else (0, word(1, 3), word(0, 3))
+        for _ in range(rng.randint(1, 12))
+    ]
+    text = ''.join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 400)))
+    return rules, text
+
+
+@pytest.fixture(params=[2, 64], ids=['combined', 'default'])
+def thresholds(request, monkeypatch):
+    # With low thresholds even short rule lists go through the combined literal and regex passes.
+    monkeypatch.setattr(repl_engine, 'MIN_AUTOMATON_RULES', request.param)
+    monkeypatch.setattr(repl_engine, 'MIN_DISPATCH_RULES', min(request.param, 3))
+    repl_engine._compile.cache_clear()
+    repl_engine._plan.cache_clear()
+    yield
+    repl_engine._compile.cache_clear()
+    repl_engine._plan.cache_clear()
+
+
+@pytest.mark.parametrize('seed', range(200))
+def test_apply_repls_matches_sequential(seed, thresholds):
+    rules, text = random_case(seed)
+    assert apply_repls(text, rules) == apply_repls_sequential(text, rules)
+
+
+@pytest.mark.parametrize('pattern', REGEX_ONLY)
+def test_regex_only_syntax_is_opaque(pattern):
+    with pytest.raises(ValueError):
+        parse_pattern(pattern)
+    rule = make_rule((1, pattern, 'D'))
+    assert rule.consumes is None and rule.contextual
+
+
+@pytest.mark.parametrize('pattern', REGEX_ONLY)
+def test_regex_only_syntax_gets_its_own_pass(pattern, thresholds):
+    # Each neighbour would share a pass with the pattern if the stdlib's reading of it were used.
+    rules = [(1, pattern, 'D'), (1, 'x', 'y'), (1, 'q', 'r'), (1, ':', ';')]
+    text = '5x q 7\nab: xy\tδ12 abc\n'
+    assert apply_repls(text, rules) == apply_repls_sequential(text, rules)
+    assert len(compile_repls(rules)) >= 2
+
+
+def test_posix_class_is_not_combined(thresholds):
+    rules = [(1, '[[:digit:]]', 'D'), (1, 'x', 'y'), (1, 'q', 'r')]
+    assert apply_repls('5x q 7\n', rules) == 'Dy r D\n'
+
+
+@pytest.mark.parametrize(
+    ('pattern', 'consumes'),
+    [(r'b[cd]', 'bcd'), (r'(X)(-)', 'X-'), (r'[a-c]{2}', 'abc'), (r'\x41|é', 'Aé'), (r'[\]-]+?', ']-')],
+)
+def test_parse_pattern_alphabet(pattern, consumes):
+    assert make_rule((1, pattern, 'Z')).consumes == frozenset(consumes)
+
+
+@pytest.mark.parametrize('seed', range(200))
+def test_stream_repls_matches_sequential(seed, thresholds):
+    rules, text = random_case(seed)
+    rng = random.Random(-seed)
+    chunks = []
+    position = 0
+    while position < len(text):
+        size = rng.randint(1, 30)
+        chunks.append(text[position:position + size])
+        position += size
+    assert ''.join(stream_repls(chunks, rules, overlap=12)) == apply_repls_sequential(text, rules)
+
+
+@pytest.mark.parametrize(
+    ('pattern', 'local'),
+    [
+        (r'\w+', True), (r'(?m)^a', True), (r'(?m:^a)', True), (r'\bx', True), (r'a.', True),
+        (r'^a', False), (r'd$', False), (r'\s', False), (r'[^a]', False), (r'(?s:a.)', False), (r'x*', False),
+        (r'[[:space:]]+', False), (r'[[:alpha:]]', False), (r'\p{L}+', False),
+    ],
+)
+def test_line_local(pattern, local):
+    assert line_local((1, pattern, '')) is local
+
+
+@pytest.mark.parametrize('pattern', REGEX_ONLY)
+def test_regex_only_syntax_streams_like_whole_buffer(pattern):
+    rules = [(1, pattern, ' ')]
+    chunks = ['a\n', '\nb\n', 'c 5x', '\t\n7', 'ab']
+    assert ''.join(stream_repls(chunks, rules)) == apply_repls_sequential(''.join(chunks), rules)
+
+
+def splice(data: bytes, rules: list, counts: list[int] | None = None) -> bytes:
+    parts = []
+    end = 0
+    for start, stop, replacement in splice_edits(data, rules, counts):
+        assert start >= end
+        parts += [data[end:start], replacement]
+        end = stop
+    parts.append(data[end:])
+    return b''.join(parts)
+
+
+@pytest.mark.parametrize('seed', range(200))
+def test_splice_edits_matches_sequential(seed, thresholds, monkeypatch):
+    rules, text = random_case(seed)
+    rng = random.Random(-seed)
+    monkeypatch.setattr(repl_engine, 'SPLICE_GAP', rng.choice([0, 1, 5, 1 << 16]))
+    monkeypatch.setattr(repl_engine, 'SPLICE_BLOCK', rng.choice([1, 20, 1 << 24]))
+    monkeypatch.setattr(repl_engine, 'MAX_SPLICE_NEEDLES', rng.choice([0, 2, 64]))
+    repl_engine._splice_needles.cache_clear()
+    counts = [0] * len(rules)
+    expected_counts = [0] * len(rules)
+    assert splice(text.encode(), rules, counts).decode() == apply_repls(text, rules, expected_counts)
+    assert counts == expected_counts
+    repl_engine._splice_needles.cache_clear()
+
+
+@pytest.mark.parametrize('pattern', REGEX_ONLY)
+def test_regex_only_syntax_splices_every_line(pattern):
+    rules = [(1, pattern, 'D')]
+    text = 'abc 123\nxyz\n\nδ 7 ab\tb'
+    assert splice(text.encode(), rules).decode() == apply_repls_sequential(text, rules)
+
+
+def test_splice_posix_class():
+    assert splice(b'abc 123\nxyz\n', [(1, '[[:digit:]]', 'D')]) == b'abc DDD\nxyz\n'
+
+
+RULES_TOML = """
+[[rules]]
+pattern = 'a,b'
+replacement = 'c'
+
+[[rules]]
+pattern = '\\d+'
+replacement = 'N'
+regex = true
+"""
+
+
+def test_load_rules(tmp_path):
+    toml = tmp_path / 'rules.toml'
+    toml.write_text(RULES_TOML)
+    as_json = tmp_path / 'rules.json'
+    as_json.write_text('{"rules": [[0, "a,b", "c"], {"pattern": "\\\\d+", "replacement": "N", "regex": true}]}')
+    expected = [(0, 'a,b', 'c'), (1, r'\d+', 'N')]
+    assert load_rules(toml) == load_rules(as_json) == expected
+    bad = tmp_path / 'bad.json'
+    bad.write_text('[{"pattern": 1}]')
+    with pytest.raises(SystemExit, match='rule 1'):
+        load_rules(bad)
+
+
+def run_script(name: str, *args: str, stdin: str = '', cwd: Path | None = None) -> subprocess.CompletedProcess:
+    script = Path(__file__).with_name(name)
+    return subprocess.run([sys.executable, script, *args], input=stdin, capture_output=True, text=True, cwd=cwd)
+
+
+def repl(*args: str, stdin: str) -> subprocess.CompletedProcess:
+    return run_script('repl.py', *args, stdin=stdin)
+
+
+def test_repl_rules_file_and_stats(tmp_path):
+    rules = tmp_path / 'rules.toml'
+    rules.write_text(RULES_TOML)
+    result = repl('-r', str(rules), '0,x,y', '--stats', stdin='a,b 12 x 3\n')
+    assert result.returncode == 0
+    assert result.stdout == 'c N y N\n'
+    hits = [line.split()[0] for line in result.stderr.splitlines()[1:4]]
+    assert hits == ['1', '2', '1']
+    assert repl('-r', str(rules), '0,x,y', stdin='a,b 12 x 3\n').stdout == 'c N y N\n'
+    assert repl('--stats', '--stream', stdin='').returncode == 2
+
+
+def test_cached_plan(tmp_path, monkeypatch):
+    rules = ((True, r'\d+', 'N'), (False, 'a', 'b'), (False, 'c', 'd'))
+    expected = make_plan(rules)
+    assert cached_plan(rules, tmp_path).batches == expected.batches and len(list(tmp_path.glob('*.plan'))) == 1
+    # A second run loads the plan rather than analysing the rules again.
+    monkeypatch.setattr(repl_engine, 'make_plan', None)
+    assert cached_plan(rules, tmp_path).automata == expected.automata
+    monkeypatch.undo()
+    # A damaged entry is rebuilt; old entries beyond CACHE_ENTRIES are dropped.
+    next(tmp_path.glob('*.plan')).write_bytes(b'junk')
+    assert cached_plan(rules, tmp_path).batches == expected.batches
+    monkeypatch.setattr(repl_engine, 'CACHE_ENTRIES', 2)
+    for number in range(4):
+        cached_plan(((False, str(number), ''),), tmp_path)
+    assert len(list(tmp_path.glob('*.plan'))) == 2
+    assert repl('--cache-dir', str(tmp_path / 'cli'), '1,\\d+,N', stdin='a1').stdout == 'aN'
+    assert repl('--cache-dir', str(tmp_path / 'cli'), '1,\\d+,N', stdin='b22').stdout == 'bN'
+    assert len(list((tmp_path / 'cli').glob('*.plan'))) == 1
+
+
+def test_repls_files(tmp_path):
+    (tmp_path / 'rules.toml').write_text(RULES_TOML)
+    tree = tmp_path / 'tree'
+    files = {'a.txt': 'a,b 1\r\nx\r\n', 'sub/b.md': 'no match\n', 'sub/c.txt': '22 a,b\n', '.hidden/d.txt': 'a,b\n'}
+    for name, text in files.items():
+        (tree / name).parent.mkdir(parents=True, exist_ok=True)
+        (tree / name).write_bytes(text.encode())
+    (tree / 'link.txt').symlink_to(tree / 'a.txt')
+    result = run_script('repls.py', '-r', 'rules.toml', '-f', 'tree', '-j', '2', cwd=tmp_path)
+    assert result.returncode == 0, result.stderr
+    assert (tree / 'a.txt').read_bytes() == b'c N\r\nx\r\n'
+    assert (tree / 'sub' / 'c.txt').read_text() == 'N c\n'
+    assert (tree / 'sub' / 'b.md').read_text() == 'no match\n' and (tree / '.hidden' / 'd.txt').read_text() == 'a,b\n'
+    assert (tree / 'link.txt').is_symlink()
+    assert result.stdout.splitlines()[-1] == '2 changed, 1 unchanged, 0 skipped'
+
+    # A file that is not text is reported and skipped, and the run exits 1.
+    (tree / 'sub' / 'e.bin').write_bytes(b'a,b \xff')
+    for mmap in [], ['--mmap']:
+        result = run_script('repls.py', '-r', 'rules.toml', '-f', 'tree/**/*.*', '-j', '1', *mmap, cwd=tmp_path)
+        assert result.returncode == 1
+        assert 'e.bin: skipped' in result.stderr and result.stdout.splitlines()[-1].endswith('1 skipped')
+    assert run_script('repls.py', '-r', 'rules.toml', '-f', 'missing/*', cwd=tmp_path).returncode == 1
+
+
+@pytest.mark.parametrize('mode', [[], ['--stream', '--chunk-size', '3'], ['--mmap']])
+def test_repls_file_modes(mode, tmp_path):
+    text = 'a,b 12\nq 7 a,b\n\n5x\n' * 50
+    rules = [(1, '[[:digit:]]+', 'D'), (0, 'a,b', 'c'), (1, '(?m)^q', 'Q')]
+    (tmp_path / 'rules.json').write_text(json.dumps(rules))
+    (tmp_path / 'in.txt').write_text(text)
+    result = run_script('repls.py', '-r', 'rules.json', 'in.txt', 'out.txt', *mode, cwd=tmp_path)
+    assert result.returncode == 0, result.stderr
+    assert (tmp_path / 'out.txt').read_text() == apply_repls_sequential(text, rules)
+    assert (tmp_path / 'in.txt').read_text() == text
+
+
+@pytest.mark.parametrize('mode', [[], ['--stream', '--chunk-size', '3']])
+def test_repl_modes(mode):
+    text = 'a,b 12\nq 7 a,b\n\n5x\n' * 50
+    result = repl('1,[[:digit:]]+,D', '0,q,Q', *mode, stdin=text)
+    assert result.stdout == apply_repls_sequential(text, [(1, '[[:digit:]]+', 'D'), (0, 'q', 'Q')])